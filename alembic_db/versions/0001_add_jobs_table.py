@@ -0,0 +1,58 @@
+"""Add jobs table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('prompt_id', sa.String(), nullable=False),
+        sa.Column('number', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('workflow_id', sa.String(), nullable=True),
+        sa.Column('create_time', sa.BigInteger(), nullable=True),
+        sa.Column('execution_start_time', sa.BigInteger(), nullable=True),
+        sa.Column('execution_end_time', sa.BigInteger(), nullable=True),
+        sa.Column('execution_duration', sa.BigInteger(), nullable=False),
+        sa.Column('execution_error', sa.JSON(), nullable=True),
+        sa.Column('outputs_count', sa.Integer(), nullable=False),
+        sa.Column('preview_output', sa.JSON(), nullable=True),
+        sa.Column('prompt', sa.JSON(), nullable=True),
+        sa.Column('extra_data', sa.JSON(), nullable=True),
+        sa.Column('outputs_to_execute', sa.JSON(), nullable=True),
+        sa.Column('outputs', sa.JSON(), nullable=True),
+        sa.Column('execution_status', sa.JSON(), nullable=True),
+        sa.Column('meta', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prompt_id'),
+    )
+    op.create_index('ix_jobs_status_create_time', 'jobs', ['status', 'create_time'])
+    op.create_index('ix_jobs_status_execution_duration', 'jobs', ['status', 'execution_duration'])
+    op.create_index('ix_jobs_workflow_id', 'jobs', ['workflow_id'])
+    op.create_index('ix_jobs_create_time', 'jobs', ['create_time'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jobs_create_time', table_name='jobs')
+    op.drop_index('ix_jobs_workflow_id', table_name='jobs')
+    op.drop_index('ix_jobs_status_execution_duration', table_name='jobs')
+    op.drop_index('ix_jobs_status_create_time', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,121 @@
+"""
+Durable storage for finished jobs.
+
+Rows are written by PromptQueue.task_done and read by the /api/jobs routes, the
+filtering, sorting and paging are done by indexed queries.
+"""
+
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+
+from app.database.db import create_session
+from app.database.models import Job
+
+SORT_COLUMNS = {
+    'created_at': Job.create_time,
+    'execution_duration': Job.execution_duration,
+}
+
+SUMMARY_FIELDS = (
+    'status',
+    'create_time',
+    'execution_start_time',
+    'execution_end_time',
+    'execution_error',
+    'outputs_count',
+    'preview_output',
+    'workflow_id',
+)
+
+RECORD_FIELDS = (
+    'number',
+    'prompt',
+    'extra_data',
+    'outputs_to_execute',
+    'outputs',
+    'execution_status',
+    'meta',
+)
+
+
+def _summary(row) -> dict:
+    job = {'id': row.prompt_id, 'priority': row.number}
+    for field in SUMMARY_FIELDS:
+        job[field] = getattr(row, field)
+    return job
+
+
+def _filtered(query, statuses: list[str], workflow_id: Optional[str]):
+    query = query.where(Job.status.in_(statuses))
+    if workflow_id:
+        query = query.where(Job.workflow_id == workflow_id)
+    return query
+
+
+def save_job(prompt_id: str, values: dict):
+    """Insert or replace the row for prompt_id."""
+    with create_session() as session:
+        row = session.scalars(select(Job).where(Job.prompt_id == prompt_id)).first()
+        if row is None:
+            row = Job(prompt_id=prompt_id)
+            session.add(row)
+        for key, value in values.items():
+            setattr(row, key, value)
+        session.commit()
+
+
+def delete_job(prompt_id: str):
+    with create_session() as session:
+        session.execute(delete(Job).where(Job.prompt_id == prompt_id))
+        session.commit()
+
+
+def delete_all_jobs():
+    with create_session() as session:
+        session.execute(delete(Job))
+        session.commit()
+
+
+def get_job_record(prompt_id: str) -> Optional[dict]:
+    """Return the summary and full record fields of a job, or None."""
+    with create_session() as session:
+        row = session.scalars(select(Job).where(Job.prompt_id == prompt_id)).first()
+        if row is None:
+            return None
+        record = _summary(row)
+        for field in RECORD_FIELDS:
+            record[field] = getattr(row, field)
+        return record
+
+
+def count_jobs(statuses: list[str], workflow_id: Optional[str] = None) -> int:
+    with create_session() as session:
+        query = _filtered(select(func.count()).select_from(Job), statuses, workflow_id)
+        return session.scalar(query)
+
+
+def list_jobs(
+    statuses: list[str],
+    workflow_id: Optional[str] = None,
+    sort_by: str = 'created_at',
+    sort_order: str = 'desc',
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> list[dict]:
+    """
+    Return job summaries ordered by sort_by.
+
+    Jobs that compare equal keep the order they finished in, like a stable sort of the
+    history would.
+    """
+    column = SORT_COLUMNS[sort_by]
+    order = column.desc() if sort_order == 'desc' else column.asc()
+    columns = [Job.prompt_id, Job.number] + [getattr(Job, field) for field in SUMMARY_FIELDS]
+    query = _filtered(select(*columns), statuses, workflow_id).order_by(order, Job.id.asc())
+    if offset > 0:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    with create_session() as session:
+        return [_summary(row) for row in session.execute(query)]
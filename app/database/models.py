@@ -1,3 +1,4 @@
+from sqlalchemy import JSON, BigInteger, Column, Index, Integer, String
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +12,35 @@ def to_dict(obj):
         if (val := getattr(obj, field))
     }
 
-# TODO: Define models here
+
+class Job(Base):
+    """A finished prompt, as listed by /api/jobs."""
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, nullable=False, unique=True)
+    number = Column(Integer)
+    status = Column(String, nullable=False)
+    workflow_id = Column(String)
+    create_time = Column(BigInteger)
+    execution_start_time = Column(BigInteger)
+    execution_end_time = Column(BigInteger)
+    execution_duration = Column(BigInteger, nullable=False, default=0)
+    execution_error = Column(JSON)
+    outputs_count = Column(Integer, nullable=False, default=0)
+    preview_output = Column(JSON)
+
+    prompt = Column(JSON)
+    extra_data = Column(JSON)
+    outputs_to_execute = Column(JSON)
+    outputs = Column(JSON)
+    execution_status = Column(JSON)
+    meta = Column(JSON)
+
+    __table_args__ = (
+        Index("ix_jobs_status_create_time", "status", "create_time"),
+        Index("ix_jobs_status_execution_duration", "status", "execution_duration"),
+        Index("ix_jobs_workflow_id", "workflow_id"),
+        Index("ix_jobs_create_time", "create_time"),
+    )
@@ -107,6 +107,8 @@ class LatentPreviewMethod(enum.Enum):
 parser.add_argument("--preview-method", type=LatentPreviewMethod, default=LatentPreviewMethod.NoPreviews, help="Default preview method for sampler nodes.", action=EnumAction)
 
 parser.add_argument("--preview-size", type=int, default=512, help="Sets the maximum preview size for sampler nodes.")
+parser.add_argument("--preview-format", type=str, default="jpeg", choices=["jpeg", "jpeg-low", "webp"], help="Encoding of sampler previews sent over the websocket. jpeg-low trades quality for bandwidth and encode time, webp is only used for clients that support preview metadata and falls back to jpeg for the others.")
+parser.add_argument("--preview-downscale-only", action="store_true", help="Only resize sampler previews that are larger than --preview-size instead of also upscaling smaller ones.")
 
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
@@ -114,6 +116,16 @@ cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU cachi
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
 
+parser.add_argument("--prompt-workers", type=int, default=1, metavar="NUM_WORKERS", help="Number of prompts executed at the same time. Each worker has its own executor and caches and is bound to its own GPU, so there is at most one worker per GPU and a machine with a single GPU or no GPU runs one prompt at a time. Queued prompts that use the same model files as a worker's last prompt are routed to it.")
+parser.add_argument("--parallel-cpu-nodes", nargs='?', const=4, type=int, default=0, metavar="NUM_THREADS", help="Run independent thread safe CPU nodes (image, audio and video loading) on a pool of worker threads so they overlap with each other and with GPU work. GPU nodes stay serialized. Default pool size when enabled is 4.")
+parser.add_argument("--async-image-save", action="store_true", help="Let the save and preview image nodes return while their PNG files are still being encoded and written so the rest of the workflow keeps running. A prompt is only reported as finished once its files are written, and fails if one of them could not be.")
+parser.add_argument("--state-dict-cache-size", type=float, default=4.0, metavar="GB", help="Size of the process wide cache of LoRA, embedding, controlnet, style and upscale model files so each file is only read once when several nodes or prompts use it. Files that are still in use are kept even when the cache is full. 0 disables it.")
+parser.add_argument("--patched-weight-cache-size", type=float, default=0.0, metavar="GB", help="Size of the pinned RAM cache of model weights with LoRAs and other patches applied, so reloading a model with the same patches at the same strengths doesn't merge them again. Models whose patched weights don't fit aren't cached. Disabled by default.")
+parser.add_argument("--prefetch-models", action="store_true", help="While a node runs, load the models of the nodes after it into free VRAM on a background thread. Models are only loaded when they fit without unloading anything.")
+parser.add_argument("--cache-disk", type=str, default=None, metavar="PATH", help="Spill serializable node outputs (conditioning, latents, images) to this directory as a second cache tier so fresh processes can reuse them. Can point at a shared volume.")
+parser.add_argument("--conditioning-cache-size", type=float, default=0.5, metavar="GB", help="Size of the RAM cache of text encoder outputs, so a prompt encoded with the same text encoder and LoRAs is not encoded again even when the node cache misses. With --cache-disk they are also stored in its conditioning subdirectory, which --cache-disk-size limits separately. 0 disables the RAM cache.")
+parser.add_argument("--cache-disk-size", type=float, default=10.0, metavar="GB", help="Maximum size of the --cache-disk directory in GB. Least recently used entries are removed first.")
+
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
 attn_group.add_argument("--use-quad-cross-attention", action="store_true", help="Use the sub-quadratic cross attention optimization . Ignored when xformers is used.")
@@ -265,6 +265,23 @@ class ComfyNodeABC(ABC):
 
     Comfy Docs: https://docs.comfy.org/custom-nodes/backend/server_overview#output-node
     """
+    THREAD_SAFE: bool
+    """Flags this node as doing no GPU work and being safe to run on a worker thread.
+
+    When ComfyUI is started with ``--parallel-cpu-nodes``, the node's ``FUNCTION`` runs on a thread pool so independent
+    branches of the graph (e.g. several image or audio loads) overlap instead of running one after another.  Usage::
+
+        THREAD_SAFE = True
+    """
+    BATCH_LIST_INPUTS: tuple[str, ...]
+    """Names the inputs that can be stacked along the batch dimension (IMAGE, MASK, LATENT or CONDITIONING).
+
+    When the node receives lists, it is called once with the list elements of these inputs stacked, instead of once
+    per element, and its outputs are split back along the batch dimension.  All other inputs must be the same for
+    every element, otherwise the node runs per element as usual.  Usage::
+
+        BATCH_LIST_INPUTS = ("samples",)
+    """
     INPUT_IS_LIST: bool
     """A flag indicating if this node implements the additional code necessary to deal with OUTPUT_IS_LIST nodes.
 
@@ -0,0 +1,348 @@
+"""
+Cache of text encoder outputs.
+
+CLIP.encode_from_tokens looks its outputs up here before running the text encoder, so prompts
+that show up again (negative prompts, style preambles) are only encoded once even when the node
+output cache misses. Entries are keyed by a digest of the tokens, the clip layer, the files the
+text encoder was loaded from (name, size and modification time) and the patches applied to it.
+The weights themselves are never read for this. Text encoders that weren't loaded from files, or
+have hooks, object patches or wrappers, are never cached.
+
+Entries are kept in RAM up to --conditioning-cache-size. With --cache-disk they are also written
+as safetensors files to its conditioning subdirectory by a background thread, where other
+processes can pick them up. Only then are the tensors of the patches hashed, so the same LoRA
+gives the same key in every process; otherwise the patches are identified by the patches_uuid of
+the model patcher.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import comfy.utils
+from comfy.cli_args import args
+from comfy.quant_ops import QuantizedTensor
+from comfy.weight_adapter import WeightAdapterBase
+
+FORMAT_VERSION = 3
+# Patch tensors are hashed this many bytes at a time, so big ones aren't copied to the CPU all at once
+FINGERPRINT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class Uncacheable(Exception):
+    pass
+
+
+def _has_entries(value):
+    if isinstance(value, dict):
+        return any(_has_entries(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0
+    return value is not None
+
+
+class ConditioningCache:
+    def __init__(self, max_size, directory=None, max_disk_size=0):
+        self.max_size = max_size
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        self.lock = threading.RLock()
+        #digest -> (outputs, nbytes)
+        self.entries = OrderedDict()
+        self.size = 0
+        #id(tensor) -> (tensor ref, version, fingerprint)
+        self.fingerprints = {}
+        self.model_fingerprints = weakref.WeakKeyDictionary()
+        self.disk_index = None
+        #digest -> future of the background write
+        self.pending = {}
+        self.writer = None
+
+    def enabled(self):
+        return self.max_size > 0 or self.directory is not None
+
+    def _tensor_fingerprint(self, tensor):
+        memo = self.fingerprints.get(id(tensor))
+        if memo is not None and memo[0]() is tensor and memo[1] == tensor._version:
+            return memo[2]
+
+        h = hashlib.sha256()
+        if isinstance(tensor, QuantizedTensor):
+            h.update(str(tensor._layout_type).encode("utf-8"))
+            h.update(self._tensor_fingerprint(tensor._qdata).encode("utf-8"))
+            for k in sorted(tensor._layout_params):
+                h.update(k.encode("utf-8"))
+                self._update(h, tensor._layout_params[k])
+        elif type(tensor) in (torch.Tensor, torch.nn.Parameter):
+            # The whole content is hashed: patches that only differ in a few values must not share entries.
+            # Fingerprints are memoized per tensor, so each patch is only hashed once.
+            t = tensor.detach().reshape(-1)
+            h.update("{}{}".format(tensor.dtype, tuple(tensor.shape)).encode("utf-8"))
+            chunk = max(1, FINGERPRINT_CHUNK_SIZE // max(t.element_size(), 1))
+            for start in range(0, t.numel(), chunk):
+                h.update(t[start:start + chunk].to("cpu").contiguous().view(torch.uint8).numpy())
+        else:
+            raise Uncacheable()
+        fingerprint = h.hexdigest()
+
+        key = id(tensor)
+        try:
+            ref = weakref.ref(tensor, lambda _: self.fingerprints.pop(key, None))
+        except TypeError:
+            return fingerprint
+        self.fingerprints[key] = (ref, tensor._version, fingerprint)
+        return fingerprint
+
+    def _update(self, h, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            h.update("{}:{!r};".format(type(value).__name__, value).encode("utf-8"))
+        elif isinstance(value, torch.Tensor):
+            h.update("T{};".format(self._tensor_fingerprint(value)).encode("utf-8"))
+        elif isinstance(value, (torch.dtype, torch.device)):
+            h.update("{};".format(value).encode("utf-8"))
+        elif isinstance(value, (list, tuple)):
+            h.update("[{};".format(len(value)).encode("utf-8"))
+            for v in value:
+                self._update(h, v)
+        elif isinstance(value, dict):
+            h.update("{{{};".format(len(value)).encode("utf-8"))
+            for k in sorted(value, key=str):
+                self._update(h, k)
+                self._update(h, value[k])
+        elif isinstance(value, WeightAdapterBase):
+            h.update("{};".format(type(value).__name__).encode("utf-8"))
+            self._update(h, value.weights)
+        else:
+            raise Uncacheable()
+
+    def set_model_source(self, model, files, options=None):
+        """
+        Records the files the weights of the text encoder model were loaded from, and the options they
+        were loaded with. Outputs of text encoders without a source are not cached.
+        """
+        try:
+            h = hashlib.sha256(type(model).__name__.encode("utf-8"))
+            for f in files:
+                stat = os.stat(f)
+                self._update(h, [os.path.basename(f), stat.st_size, stat.st_mtime_ns])
+            self._update(h, options)
+        except (OSError, Uncacheable):
+            self.model_fingerprints.pop(model, None)
+            return
+        self.model_fingerprints[model] = h.hexdigest()
+
+    def _model_fingerprint(self, patcher):
+        fingerprint = self.model_fingerprints.get(patcher.model)
+        if fingerprint is None:
+            raise Uncacheable()
+        return fingerprint
+
+    def forget_model(self, model):
+        """Has to be called when the weights of a text encoder are changed in place, like by load_sd."""
+        self.model_fingerprints.pop(model, None)
+
+    def patcher_digest(self, patcher):
+        """
+        Returns a digest of the source files of the model of patcher and the patches on it, or None if the
+        source is unknown or it has hooks, wrappers or other patches that can't be compared.
+        """
+        if (patcher.forced_hooks is not None or _has_entries(patcher.hook_patches) or _has_entries(patcher.object_patches)
+                or _has_entries(patcher.weight_wrapper_patches) or _has_entries(patcher.wrappers) or _has_entries(patcher.callbacks)
+                or _has_entries(patcher.injections) or _has_entries(patcher.model_options)):
+            return None
+        try:
+            h = hashlib.sha256(self._model_fingerprint(patcher).encode("utf-8"))
+            if self.directory is None and len(patcher.patches) > 0:
+                self._update(h, str(patcher.patches_uuid))
+                return h.hexdigest()
+            for k in sorted(patcher.patches):
+                self._update(h, k)
+                for strength_patch, patch, strength_model, offset, function in patcher.patches[k]:
+                    if function is not None:
+                        raise Uncacheable()
+                    self._update(h, [strength_patch, patch, strength_model, offset])
+        except Uncacheable:
+            return None
+        return h.hexdigest()
+
+    def make_key(self, clip, tokens, unprojected):
+        """Returns the digest for the outputs of clip for tokens, or None if they can't be cached."""
+        if not self.enabled():
+            return None
+        digest = self.patcher_digest(clip.patcher)
+        if digest is None:
+            return None
+        try:
+            h = hashlib.sha256("v{};".format(FORMAT_VERSION).encode("utf-8"))
+            h.update(digest.encode("utf-8"))
+            self._update(h, [clip.layer_idx, bool(unprojected)])
+            self._update(h, tokens)
+        except Uncacheable:
+            return None
+        return h.hexdigest()
+
+    def get(self, digest):
+        if digest is None:
+            return None
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                self.entries.move_to_end(digest)
+                return dict(entry[0])
+        outputs = self._load(digest)
+        if outputs is not None:
+            self._put_memory(digest, outputs)
+            return dict(outputs)
+        return None
+
+    def put(self, digest, outputs):
+        if digest is None:
+            return
+        self._put_memory(digest, outputs)
+        self._store(digest, outputs)
+
+    def _put_memory(self, digest, outputs):
+        nbytes = sum(v.nbytes for v in outputs.values() if isinstance(v, torch.Tensor))
+        if self.max_size <= 0 or nbytes > self.max_size:
+            return
+        with self.lock:
+            if digest in self.entries:
+                return
+            self.entries[digest] = (dict(outputs), nbytes)
+            self.size += nbytes
+            while self.size > self.max_size:
+                _, (_, dropped) = self.entries.popitem(last=False)
+                self.size -= dropped
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + ".safetensors")
+
+    def _scan(self):
+        if self.disk_index is not None:
+            return
+        self.disk_index = OrderedDict()
+        files = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".safetensors"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name[:-len(".safetensors")], stat.st_size))
+        except OSError as e:
+            logging.warning("Could not read the conditioning cache directory {}: {}".format(self.directory, e))
+        for _, digest, size in sorted(files):
+            self.disk_index[digest] = size
+
+    def _load(self, digest):
+        if self.directory is None:
+            return None
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            sd, metadata = comfy.utils.load_torch_file(path, return_metadata=True)
+            outputs = json.loads(metadata["values"])
+            outputs.update(sd)
+        except Exception as e:
+            logging.warning("Dropping unreadable conditioning cache entry {}: {}".format(path, e))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        with self.lock:
+            self._scan()
+            self.disk_index[digest] = os.path.getsize(path)
+            self.disk_index.move_to_end(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return outputs
+
+    def _store(self, digest, outputs):
+        if self.directory is None:
+            return
+        tensors = {}
+        values = {}
+        for k, v in outputs.items():
+            if isinstance(v, torch.Tensor):
+                if type(v) is not torch.Tensor:
+                    return
+                tensors[k] = v.detach()
+            else:
+                values[k] = v
+        try:
+            metadata = {"values": json.dumps(values)}
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            self._scan()
+            if digest in self.disk_index or digest in self.pending:
+                return
+            self.pending[digest] = self._get_writer().submit(self._write, digest, tensors, metadata)
+
+    def _get_writer(self):
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comfy_conditioning_cache")
+        return self.writer
+
+    def _write(self, digest, tensors, metadata):
+        path = self._path(digest)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            seen_storage = set()
+            for k, v in tensors.items():
+                v = v.to("cpu").contiguous()
+                # safetensors refuses tensors that share memory, like a pooled output sliced from cond
+                ptr = v.untyped_storage().data_ptr()
+                if ptr in seen_storage:
+                    v = v.clone()
+                seen_storage.add(ptr)
+                tensors[k] = v
+            comfy.utils.save_torch_file(tensors, tmp_path, metadata=metadata)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning("Failed to write conditioning cache entry {}: {}".format(path, e))
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            with self.lock:
+                self.pending.pop(digest, None)
+            return
+        with self.lock:
+            self.pending.pop(digest, None)
+            self.disk_index[digest] = os.path.getsize(path)
+            total = sum(self.disk_index.values())
+            while total > self.max_disk_size and len(self.disk_index) > 0:
+                old, size = self.disk_index.popitem(last=False)
+                total -= size
+                try:
+                    os.remove(self._path(old))
+                except OSError:
+                    pass
+
+    def flush(self):
+        """Waits for the entries queued by put() to be written to disk."""
+        with self.lock:
+            pending = list(self.pending.values())
+        for future in pending:
+            future.result()
+
+conditioning_cache = ConditioningCache(int(args.conditioning_cache_size * (1024 ** 3)),
+                                       None if args.cache_disk is None else os.path.join(args.cache_disk, "conditioning"),
+                                       int(args.cache_disk_size * (1024 ** 3)))
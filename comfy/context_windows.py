@@ -103,10 +103,14 @@ class ContextFuseMethod:
     name: str
     func: Callable
 
+# resized conds kept per sampling run before starting over, for schedules that shift their windows every step
+MAX_CACHED_WINDOW_CONDS = 1024
+
 ContextResults = collections.namedtuple("ContextResults", ['window_idx', 'sub_conds_out', 'sub_conds', 'window'])
 class IndexListContextHandler(ContextHandlerABC):
     def __init__(self, context_schedule: ContextSchedule, fuse_method: ContextFuseMethod, context_length: int=1, context_overlap: int=0, context_stride: int=1,
-                 closed_loop: bool=False, dim:int=0, freenoise: bool=False, cond_retain_index_list: list[int]=[], split_conds_to_windows: bool=False):
+                 closed_loop: bool=False, dim:int=0, freenoise: bool=False, cond_retain_index_list: list[int]=[], split_conds_to_windows: bool=False,
+                 window_batch_size: int=1):
         self.context_schedule = context_schedule
         self.fuse_method = fuse_method
         self.context_length = context_length
@@ -118,6 +122,8 @@ class IndexListContextHandler(ContextHandlerABC):
         self.freenoise = freenoise
         self.cond_retain_index_list = [int(x.strip()) for x in cond_retain_index_list.split(",")] if cond_retain_index_list else []
         self.split_conds_to_windows = split_conds_to_windows
+        # max number of windows run in one forward pass; only used when windows are not on the batch dim
+        self.window_batch_size = window_batch_size
 
         self.callbacks = {}
 
@@ -204,6 +210,24 @@ class IndexListContextHandler(ContextHandlerABC):
             resized_cond.append(resized_actual_cond)
         return resized_cond
 
+    def get_cached_resized_cond(self, cond_in: list[dict], x_in: torch.Tensor, window: IndexListContextWindow, model_options: dict[str], device=None) -> list:
+        """
+        get_resized_cond, reused across the steps of a sampling run; the conds are the same objects on every step
+        and most schedules give the same windows. Kept in the per sampling run model_options.
+        """
+        if cond_in is None or len(self.callbacks.get(IndexListCallbacks.RESIZE_COND_ITEM, {})) > 0:
+            return self.get_resized_cond(cond_in, x_in, window, device)
+        cache = model_options.setdefault("context_window_conds", {})
+        key = (id(cond_in), tuple(window.index_list), x_in.size(self.dim), device)
+        entry = cache.get(key, None)
+        if entry is not None and entry[0] is cond_in:
+            return entry[1]
+        if len(cache) >= MAX_CACHED_WINDOW_CONDS:
+            cache.clear()
+        resized = self.get_resized_cond(cond_in, x_in, window, device)
+        cache[key] = (cond_in, resized)
+        return resized
+
     def set_step(self, timestep: torch.Tensor, model_options: dict[str]):
         mask = torch.isclose(model_options["transformer_options"]["sample_sigmas"], timestep[0], rtol=0.0001)
         matches = torch.nonzero(mask)
@@ -232,8 +256,14 @@ class IndexListContextHandler(ContextHandlerABC):
         for callback in comfy.patcher_extension.get_all_callbacks(IndexListCallbacks.EXECUTE_START, self.callbacks):
             callback(self, model, x_in, conds, timestep, model_options)
 
-        for enum_window in enumerated_context_windows:
-            results = self.evaluate_context_windows(calc_cond_batch, model, x_in, conds, timestep, [enum_window], model_options)
+        for window_batch in self.get_window_batches(model, x_in, conds, enumerated_context_windows):
+            results = None
+            if len(window_batch) > 1:
+                results = self.evaluate_context_windows_batched(calc_cond_batch, model, x_in, conds, timestep, window_batch, model_options)
+            if results is None:
+                results = []
+                for enum_window in window_batch:
+                    results += self.evaluate_context_windows(calc_cond_batch, model, x_in, conds, timestep, [enum_window], model_options)
             for result in results:
                 self.combine_context_window_results(x_in, result.sub_conds_out, result.sub_conds, result.window, result.window_idx, len(enumerated_context_windows), timestep,
                                             conds_final, counts_final, biases_final)
@@ -268,7 +298,7 @@ class IndexListContextHandler(ContextHandlerABC):
             # get subsections of x, timestep, conds
             sub_x = window.get_tensor(x_in, device)
             sub_timestep = window.get_tensor(timestep, device, dim=0)
-            sub_conds = [self.get_resized_cond(cond, x_in, window, device) for cond in conds]
+            sub_conds = [self.get_cached_resized_cond(cond, x_in, window, model_options, device) for cond in conds]
 
             sub_conds_out = calc_cond_batch(model, sub_conds, sub_x, sub_timestep, model_options)
             if device is not None:
@@ -277,6 +307,117 @@ class IndexListContextHandler(ContextHandlerABC):
             results.append(ContextResults(window_idx, sub_conds_out, sub_conds, window))
         return results
 
+    def get_window_batches(self, model: BaseModel, x_in: torch.Tensor, conds, enumerated_context_windows: list[tuple[int, IndexListContextWindow]]) -> list[list[tuple[int, IndexListContextWindow]]]:
+        """
+        Groups consecutive windows of the same length into batches of as many as window_batch_size allows and fit in
+        memory. Windows on the batch dim (dim 0) are never batched, the batch is the frames of the window there.
+        """
+        if self.window_batch_size <= 1 or self.dim == 0:
+            return [[enum_window] for enum_window in enumerated_context_windows]
+        conds_count = max(1, len([c for c in conds if c is not None]))
+        free_memory = comfy.model_management.get_free_memory(x_in.device)
+        fits = {}
+
+        def max_batch(context_length):
+            if context_length not in fits:
+                shape = list(x_in.shape)
+                shape[self.dim] = context_length
+                count = self.window_batch_size
+                while count > 1 and model.memory_required([count * conds_count * shape[0]] + shape[1:]) * 1.5 >= free_memory:
+                    count -= 1
+                fits[context_length] = count
+            return fits[context_length]
+
+        batches = []
+        for enum_window in enumerated_context_windows:
+            length = enum_window[1].context_length
+            if len(batches) > 0 and batches[-1][0][1].context_length == length and len(batches[-1]) < max_batch(length):
+                batches[-1].append(enum_window)
+            else:
+                batches.append([enum_window])
+        return batches
+
+    def merge_window_conds(self, window_conds: list[list[dict]], batch_size: int) -> list[dict]:
+        """
+        Stacks the resized conds of several windows along the batch dim, the same way _calc_cond_batch stacks conds.
+        Returns None if they can't be, like when they have controlnets or masks that only know about one window.
+        """
+        if any(len(c) != len(window_conds[0]) for c in window_conds):
+            return None
+        merged = []
+        for entries in zip(*window_conds):
+            first = entries[0]
+            if any(k in first for k in ("control", "gligen", "mask", "area")):
+                return None
+            if any(e.keys() != first.keys() or e["model_conds"].keys() != first["model_conds"].keys() for e in entries):
+                return None
+            model_conds = {}
+            for k in first["model_conds"]:
+                processed = [e["model_conds"][k].process_cond(batch_size=batch_size, area=None) for e in entries]
+                if not all(processed[0].can_concat(p) for p in processed[1:]):
+                    return None
+                model_conds[k] = processed[0]._copy_with(processed[0].concat(processed[1:]))
+            merged_entry = first.copy()
+            merged_entry["model_conds"] = model_conds
+            merged.append(merged_entry)
+        return merged
+
+    def evaluate_context_windows_batched(self, calc_cond_batch: Callable, model: BaseModel, x_in: torch.Tensor, conds, timestep: torch.Tensor, enumerated_context_windows: list[tuple[int, IndexListContextWindow]],
+                                         model_options, device=None, first_device=None):
+        """
+        Runs several windows of the same length as one batch. The results are the same as running them one by one
+        with evaluate_context_windows, or None if the conds of the windows can't be stacked or the windows are to run
+        on another device. During the batched call transformer_options has no context_window, the windows of the
+        batch are in context_windows in batch order.
+        """
+        if device is not None:
+            # Windows split across devices are moved one by one by evaluate_context_windows
+            return None
+        comfy.model_management.throw_exception_if_processing_interrupted()
+        windows = [window for _, window in enumerated_context_windows]
+        sub_conds = [[self.get_cached_resized_cond(cond, x_in, window, model_options) for cond in conds] for window in windows]
+        batch_size = x_in.shape[0]
+
+        cache = model_options.setdefault("context_window_conds", {})
+        key = ("batch", tuple(tuple(window.index_list) for window in windows), tuple(id(c) for c in conds), x_in.size(self.dim))
+        entry = cache.get(key, None)
+        if entry is not None and all(a is b for a, b in zip(entry[0], conds)):
+            merged_conds = entry[1]
+        else:
+            merged_conds = []
+            for i in range(len(conds)):
+                if conds[i] is None:
+                    merged_conds.append(None)
+                    continue
+                merged = self.merge_window_conds([c[i] for c in sub_conds], batch_size)
+                if merged is None:
+                    return None
+                merged_conds.append(merged)
+            if len(self.callbacks.get(IndexListCallbacks.RESIZE_COND_ITEM, {})) == 0:
+                if len(cache) >= MAX_CACHED_WINDOW_CONDS:
+                    cache.clear()
+                cache[key] = (list(conds), merged_conds)
+
+        for window_idx, window in enumerated_context_windows:
+            for callback in comfy.patcher_extension.get_all_callbacks(IndexListCallbacks.EVALUATE_CONTEXT_WINDOWS, self.callbacks):
+                callback(self, model, x_in, conds, timestep, model_options, window_idx, window, model_options, None, None)
+
+        # no single window describes the batch, consumers of context_window must not see just one of them
+        model_options["transformer_options"].pop("context_window", None)
+        model_options["transformer_options"]["context_windows"] = windows
+        try:
+            sub_x = torch.cat([window.get_tensor(x_in) for window in windows])
+            sub_timestep = torch.cat([window.get_tensor(timestep, dim=0) for window in windows])
+            conds_out = calc_cond_batch(model, merged_conds, sub_x, sub_timestep, model_options)
+        finally:
+            model_options["transformer_options"].pop("context_windows", None)
+
+        results: list[ContextResults] = []
+        for w, (window_idx, window) in enumerate(enumerated_context_windows):
+            sub_conds_out = [out[w * batch_size:(w + 1) * batch_size] for out in conds_out]
+            results.append(ContextResults(window_idx, sub_conds_out, sub_conds[w], window))
+        return results
+
 
     def combine_context_window_results(self, x_in: torch.Tensor, sub_conds_out, sub_conds, window: IndexListContextWindow, window_idx: int, total_windows: int, timestep: torch.Tensor,
                                     conds_final: list[torch.Tensor], counts_final: list[torch.Tensor], biases_final: list[torch.Tensor]):
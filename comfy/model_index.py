@@ -0,0 +1,111 @@
+"""
+Index of the safetensors headers of model files.
+
+Reading the tensor names, shapes, dtypes and __metadata__ of a model only needs the header of
+the file, which the index parses once and keeps in memory and in a small JSON file per model
+under the cache system user directory. Files are only indexed when their metadata is first looked
+up. Entries are invalidated by the mtime and size of the file, so a model that gets replaced is
+parsed again on its next lookup.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import comfy.utils
+import folder_paths
+
+INDEX_FORMAT_VERSION = 1
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+
+def read_safetensors_index(path):
+    """Parses the header of a safetensors file into {"tensors": {name: [dtype, shape]}, "metadata": ...}, or None."""
+    header = comfy.utils.safetensors_header(path, max_size=MAX_HEADER_SIZE)
+    if header is None:
+        return None
+    header = json.loads(header)
+    metadata = header.pop("__metadata__", None)
+    tensors = {name: [info["dtype"], info["shape"]] for name, info in header.items()}
+    return {"tensors": tensors, "metadata": metadata}
+
+
+class ModelIndex:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        #real path -> (mtime_ns, size, entry)
+        self.entries = {}
+
+    def _index_file(self, path):
+        return os.path.join(self.directory, hashlib.sha256(path.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_persisted(self, path, stamp):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._index_file(path), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_FORMAT_VERSION or data.get("path") != path or [data.get("mtime_ns"), data.get("size")] != list(stamp):
+            return None
+        return data.get("entry")
+
+    def _persist(self, path, stamp, entry):
+        if self.directory is None:
+            return
+        data = {"version": INDEX_FORMAT_VERSION, "path": path, "mtime_ns": stamp[0], "size": stamp[1], "entry": entry}
+        index_file = self._index_file(path)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_file = "{}.{}.tmp".format(index_file, threading.get_ident())
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_file, index_file)
+        except OSError as e:
+            logging.debug("Could not write model index {}: {}".format(index_file, e))
+
+    def get(self, path):
+        """Returns the index entry of a safetensors file, or None if it isn't one or can't be read."""
+        if not path.lower().endswith((".safetensors", ".sft")):
+            return None
+        path = os.path.realpath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.entries.get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached[2]
+
+        entry = self._load_persisted(path, stamp)
+        if entry is None:
+            try:
+                entry = read_safetensors_index(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.warning("Could not read the header of {}: {}".format(path, e))
+                return None
+            if entry is None:
+                return None
+            self._persist(path, stamp, entry)
+        with self.lock:
+            self.entries[path] = (stamp[0], stamp[1], entry)
+        return entry
+
+    def get_metadata(self, path):
+        entry = self.get(path)
+        return None if entry is None else entry["metadata"]
+
+
+_model_index = None
+
+def get_model_index():
+    global _model_index
+    if _model_index is None:
+        _model_index = ModelIndex(os.path.join(folder_paths.get_system_user_directory("cache"), "model_index"))
+    return _model_index
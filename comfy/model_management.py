@@ -27,6 +27,9 @@ import platform
 import weakref
 import gc
 import os
+import threading
+import contextvars
+import functools
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -188,6 +191,32 @@ def get_torch_device():
         else:
             return torch.device(torch.cuda.current_device())
 
+def get_torch_device_count():
+    if directml_enabled or cpu_state != CPUState.GPU:
+        return 1
+    if is_intel_xpu():
+        return torch.xpu.device_count()
+    elif is_ascend_npu():
+        return torch.npu.device_count()
+    elif is_mlu():
+        return torch.mlu.device_count()
+    else:
+        return torch.cuda.device_count()
+
+def set_current_thread_device(index):
+    """Binds the calling thread to device number index, get_torch_device() will return it from then on."""
+    if directml_enabled or cpu_state != CPUState.GPU:
+        return get_torch_device()
+    if is_intel_xpu():
+        torch.xpu.set_device(index)
+    elif is_ascend_npu():
+        torch.npu.set_device(index)
+    elif is_mlu():
+        torch.mlu.set_device(index)
+    else:
+        torch.cuda.set_device(index)
+    return get_torch_device()
+
 def get_total_memory(dev=None, torch_total_too=False):
     global directml_enabled
     if dev is None:
@@ -581,7 +610,41 @@ def extra_reserved_memory():
 def minimum_inference_memory():
     return (1024 * 1024 * 1024) * 0.8 + extra_reserved_memory()
 
+# Serializes changes to current_loaded_models, the executor prefetches models on a background thread
+model_load_lock = threading.RLock()
+# Notified every time load_models_gpu is done
+models_loaded_condition = threading.Condition(model_load_lock)
+# LoadedModels that prefetch_models is moving to their device without holding model_load_lock
+prefetching_models = []
+
+def wait_for_prefetches(device):
+    """Waits until no model is being prefetched to device, with model_load_lock held."""
+    models_loaded_condition.wait_for(lambda: not any(m.device == device for m in prefetching_models))
+
+def hold_model_load_lock(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with model_load_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+# Models the executor will use again later in the current prompt, per prompt worker thread
+_models_needed_later = threading.local()
+
+def set_models_needed_later(models):
+    """Hints which models are still needed later on, free_memory unloads them after all other models."""
+    _models_needed_later.models = [weakref.ref(m) for m in models]
+
+def is_model_needed_later(model):
+    for ref in getattr(_models_needed_later, "models", ()):
+        m = ref()
+        if m is not None and (m is model or model.is_clone(m)):
+            return True
+    return False
+
+@hold_model_load_lock
 def free_memory(memory_required, device, keep_loaded=[]):
+    wait_for_prefetches(device)
     cleanup_models_gc()
     unloaded_model = []
     can_unload = []
@@ -591,7 +654,7 @@ def free_memory(memory_required, device, keep_loaded=[]):
         shift_model = current_loaded_models[i]
         if shift_model.device == device:
             if shift_model not in keep_loaded and not shift_model.is_dead():
-                can_unload.append((-shift_model.model_offloaded_memory(), sys.getrefcount(shift_model.model), shift_model.model_memory(), i))
+                can_unload.append((is_model_needed_later(shift_model.model), -shift_model.model_offloaded_memory(), sys.getrefcount(shift_model.model), shift_model.model_memory(), i))
                 shift_model.currently_used = False
 
     for x in sorted(can_unload):
@@ -618,7 +681,10 @@ def free_memory(memory_required, device, keep_loaded=[]):
                 soft_empty_cache()
     return unloaded_models
 
+@hold_model_load_lock
 def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+    for m in models:
+        wait_for_prefetches(m.load_device)
     cleanup_models_gc()
     global vram_state
 
@@ -703,8 +769,57 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
 
         loaded_model.model_load(lowvram_model_memory, force_patch_weights=force_patch_weights)
         current_loaded_models.insert(0, loaded_model)
+    models_loaded_condition.notify_all()
     return
 
+def is_model_loaded(model):
+    return any(m.model is not None and m.model.is_clone(model) for m in current_loaded_models)
+
+PREFETCH_RESERVED_MEMORY_RATIO = 0.2
+
+def prefetch_models(models):
+    """
+    Loads models ahead of the node that uses them, but only into free memory: nothing gets
+    unloaded and enough memory stays free for inference, so the node currently running isn't
+    slowed down. Returns the number of models that were loaded.
+
+    model_load_lock is only held to check the free memory and register the model, the weights
+    are moved without it so models on other devices can be loaded meanwhile. Loading or freeing
+    memory on the same device waits for the prefetch to be done.
+    """
+    count = 0
+    for model in models:
+        device = model.load_device
+        if is_device_cpu(device) or vram_state in (VRAMState.NO_VRAM, VRAMState.DISABLED):
+            continue
+        loaded_model = LoadedModel(model)
+        with model_load_lock:
+            # Clones are swapped in by load_models_gpu when they are actually used
+            if is_model_loaded(model) or any(m.model.is_clone(model) for m in prefetching_models):
+                continue
+            reserved = max(minimum_inference_memory(), get_total_memory(device) * PREFETCH_RESERVED_MEMORY_RATIO)
+            reserved += sum(m.model_memory_required(device) for m in prefetching_models if m.device == device)
+            if get_free_memory(device) - loaded_model.model_memory_required(device) < reserved:
+                continue
+            prefetching_models.append(loaded_model)
+        logging.debug(f"Prefetching {model.model.__class__.__name__}")
+        loaded = False
+        try:
+            loaded_model.model_load()
+            loaded = True
+        except Exception as e:
+            logging.warning("Prefetching {} failed: {}".format(model.model.__class__.__name__, e))
+            model.detach()
+        finally:
+            with model_load_lock:
+                prefetching_models.remove(loaded_model)
+                if loaded:
+                    loaded_model.currently_used = False
+                    current_loaded_models.insert(0, loaded_model)
+                    count += 1
+                models_loaded_condition.notify_all()
+    return count
+
 def load_model_gpu(model):
     return load_models_gpu([model])
 
@@ -1552,22 +1667,61 @@ class InterruptProcessingException(Exception):
 interrupt_processing_mutex = threading.RLock()
 
 interrupt_processing = False
-def interrupt_current_processing(value=True):
+# Prompt run by the current prompt worker, interrupts are scoped to it
+current_interrupt_prompt = contextvars.ContextVar("current_interrupt_prompt", default=None)
+# prompt id -> interrupt flag, for the prompts the prompt workers are running
+running_prompt_interrupts = {}
+
+def set_interrupt_prompt(prompt_id):
+    """Called by a prompt worker when it starts running prompt_id, or with None once it is done."""
+    global interrupt_processing
+    with interrupt_processing_mutex:
+        previous = current_interrupt_prompt.get()
+        if previous is not None:
+            running_prompt_interrupts.pop(previous, None)
+        if prompt_id is not None:
+            running_prompt_interrupts[prompt_id] = False
+            # Prompt workers only read the flags of their prompts, an interrupt sent while idle
+            # must not stay latched for code outside of a prompt
+            interrupt_processing = False
+    current_interrupt_prompt.set(prompt_id)
+
+def interrupt_current_processing(value=True, prompt_id=None):
+    """
+    Sets the interrupt flag of prompt_id. Without prompt_id, a prompt worker sets the flag of its own
+    prompt and any other thread sets the flags of every running prompt.
+    """
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        if prompt_id is None:
+            prompt_id = current_interrupt_prompt.get()
+        if prompt_id is not None:
+            if prompt_id in running_prompt_interrupts:
+                running_prompt_interrupts[prompt_id] = value
+            return
         interrupt_processing = value
+        for k in running_prompt_interrupts:
+            running_prompt_interrupts[k] = value
 
 def processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        prompt_id = current_interrupt_prompt.get()
+        if prompt_id is not None and prompt_id in running_prompt_interrupts:
+            return running_prompt_interrupts[prompt_id]
         return interrupt_processing
 
 def throw_exception_if_processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        if interrupt_processing:
+        prompt_id = current_interrupt_prompt.get()
+        if prompt_id is not None and prompt_id in running_prompt_interrupts:
+            if running_prompt_interrupts[prompt_id]:
+                running_prompt_interrupts[prompt_id] = False
+                raise InterruptProcessingException()
+        elif interrupt_processing:
             interrupt_processing = False
             raise InterruptProcessingException()
@@ -32,6 +32,7 @@ import comfy.float
 import comfy.hooks
 import comfy.lora
 import comfy.model_management
+import comfy.patched_weights
 import comfy.patcher_extension
 import comfy.utils
 from comfy.comfy_types import UnetWrapperFunction
@@ -233,6 +234,7 @@ class ModelPatcher:
         self.weight_inplace_update = weight_inplace_update
         self.force_cast_weights = False
         self.patches_uuid = uuid.uuid4()
+        self.patched_weights_size_cache = None
         self.parent = None
         self.pinned = set()
 
@@ -611,6 +613,16 @@ class ModelPatcher:
                         sd.pop(k)
             return sd
 
+    def patched_weights_size(self):
+        """Size in bytes of the weights that have patches."""
+        if self.patched_weights_size_cache is None or self.patched_weights_size_cache[0] != self.patches_uuid:
+            size = 0
+            for k in self.patches:
+                weight, _, _ = get_key_weight(self.model, k)
+                size += weight.nelement() * weight.element_size()
+            self.patched_weights_size_cache = (self.patches_uuid, size)
+        return self.patched_weights_size_cache[1]
+
     def patch_weight_to_device(self, key, device_to=None, inplace_update=False):
         if key not in self.patches:
             return
@@ -621,17 +633,26 @@ class ModelPatcher:
         if key not in self.backup:
             self.backup[key] = collections.namedtuple('Dimension', ['weight', 'inplace_update'])(weight.to(device=self.offload_device, copy=inplace_update), inplace_update)
 
-        temp_dtype = comfy.model_management.lora_compute_dtype(device_to)
-        if device_to is not None:
-            temp_weight = comfy.model_management.cast_to_device(weight, device_to, temp_dtype, copy=True)
-        else:
-            temp_weight = weight.to(temp_dtype, copy=True)
-        if convert_func is not None:
-            temp_weight = convert_func(temp_weight, inplace=True)
+        cache_key = None
+        if not inplace_update: # in place updates change the base weight, they could never hit
+            cache_key = comfy.patched_weights.patched_weight_cache.make_key(self.model, key, weight, self.patches[key], set_func is None,
+                                                                           model_patched_size=self.patched_weights_size())
+        out_weight = comfy.patched_weights.patched_weight_cache.get(cache_key, self.model, weight, device_to)
+        if out_weight is None:
+            temp_dtype = comfy.model_management.lora_compute_dtype(device_to)
+            if device_to is not None:
+                temp_weight = comfy.model_management.cast_to_device(weight, device_to, temp_dtype, copy=True)
+            else:
+                temp_weight = weight.to(temp_dtype, copy=True)
+            if convert_func is not None:
+                temp_weight = convert_func(temp_weight, inplace=True)
+
+            out_weight = comfy.lora.calculate_weight(self.patches[key], temp_weight, key)
+            if set_func is None:
+                out_weight = comfy.float.stochastic_rounding(out_weight, weight.dtype, seed=string_to_seed(key))
+            comfy.patched_weights.patched_weight_cache.put(cache_key, self.model, out_weight)
 
-        out_weight = comfy.lora.calculate_weight(self.patches[key], temp_weight, key)
         if set_func is None:
-            out_weight = comfy.float.stochastic_rounding(out_weight, weight.dtype, seed=string_to_seed(key))
             if inplace_update:
                 comfy.utils.copy_to_param(self.model, key, out_weight)
             else:
@@ -0,0 +1,143 @@
+"""
+Cache of weights with their patches (LoRAs, model merges) applied.
+
+ModelPatcher.patch_weight_to_device merges the patches of a weight every time a model is loaded.
+The merged weights are kept here on the CPU, pinned when possible so they copy back to the GPU
+quickly, and reused when the same base weight gets the same patches at the same strengths again,
+like when switching back and forth between a few LoRA stacks.
+
+Entries are keyed on the model, the name, storage and version of the base weight and on the
+identity of the patch tensors, which the cache keeps alive so their ids can't be reused. Those
+tensors count toward the size of the cache, once however many entries share them. Models whose
+patched weights don't all fit are skipped: loading them would only evict everything else. The
+weight itself is rewrapped in a new Parameter every time a model is unpatched, so the cache only
+holds a weak reference to the model and drops its entries when the model goes away. Patches that aren't
+plain tensors or weight adapters, or that come with a function, are never cached.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import torch
+
+import comfy.model_management
+from comfy.cli_args import args
+from comfy.weight_adapter import WeightAdapterBase
+
+
+class Uncacheable(Exception):
+    pass
+
+
+def _signature(value, refs):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, torch.Tensor):
+        refs.append(value)
+        return ("tensor", id(value), value._version)
+    if isinstance(value, (tuple, list)):
+        return tuple(_signature(v, refs) for v in value)
+    if isinstance(value, WeightAdapterBase):
+        refs.append(value)
+        return (type(value).__name__, _signature(value.weights, refs))
+    raise Uncacheable()
+
+
+def patches_signature(patches, refs):
+    """Builds a hashable signature of a ModelPatcher patch list, raises Uncacheable if it can't."""
+    out = []
+    for strength_patch, patch, strength_model, offset, function in patches:
+        if function is not None:
+            raise Uncacheable()
+        out.append((strength_patch, _signature(patch, refs), strength_model, _signature(offset, refs)))
+    return tuple(out)
+
+
+class PatchedWeightCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        #key -> [cpu weight, pinned, patch refs, model ref]
+        self.entries = OrderedDict()
+        #id of a patch tensor kept alive by the entries -> number of entries referencing it
+        self.ref_counts = {}
+        self.size = 0
+
+    def make_key(self, model, name, weight, patches, variant, model_patched_size=0):
+        """
+        Returns the cache key for the weight called name in model with patches applied, or None if it can't be cached.
+        model_patched_size is the size of all the patched weights of the model.
+        """
+        if self.max_size <= 0 or model_patched_size > self.max_size:
+            return None
+        refs = []
+        try:
+            signature = patches_signature(patches, refs)
+        except Uncacheable:
+            return None
+        return (id(model), name, weight.device, weight.data_ptr(), weight._version, weight.dtype, variant, signature), refs
+
+    def get(self, cache_key, model, weight, device):
+        if cache_key is None:
+            return None
+        key, _ = cache_key
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[3]() is not model:
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            cached = entry[0]
+        return cached.to(device=device if device is not None else weight.device, copy=True, non_blocking=entry[1])
+
+    def put(self, cache_key, model, out_weight):
+        if cache_key is None:
+            return
+        key, refs = cache_key
+        refs = list({id(r): r for r in refs if isinstance(r, torch.Tensor)}.values())
+        nbytes = out_weight.nelement() * out_weight.element_size()
+        if nbytes + sum(r.nbytes for r in refs) > self.max_size:
+            return
+        stored = out_weight.to("cpu", copy=True).contiguous()
+        pinned = comfy.model_management.pin_memory(stored)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = [stored, pinned, refs, weakref.ref(model, lambda _: self._forget(key))]
+            self.size += nbytes
+            for r in refs:
+                count = self.ref_counts.get(id(r), 0)
+                if count == 0:
+                    self.size += r.nbytes
+                self.ref_counts[id(r)] = count + 1
+            while self.size > self.max_size and len(self.entries) > 0:
+                self._drop(next(iter(self.entries)))
+
+    def _forget(self, key):
+        # The model is gone, its id can be reused by another one
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        if entry[1]:
+            comfy.model_management.unpin_memory(entry[0])
+        self.size -= entry[0].nelement() * entry[0].element_size()
+        for r in entry[2]:
+            count = self.ref_counts.pop(id(r)) - 1
+            if count == 0:
+                self.size -= r.nbytes
+            else:
+                self.ref_counts[id(r)] = count
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._drop(key)
+
+
+patched_weight_cache = PatchedWeightCache(int(args.patched_weight_cache_size * (1024 ** 3)))
@@ -213,18 +213,116 @@ def _calc_cond_batch_outer(model: BaseModel, conds: list[list[dict]], x_in: torc
     )
     return executor.execute(model, conds, x_in, timestep, model_options)
 
+def _cond_batches(model: BaseModel, to_run: list[tuple[tuple,int]], x_in: torch.Tensor):
+    # returns the batches to run as lists of indices into to_run
+    remaining = list(range(len(to_run)))
+    batches = []
+    while len(remaining) > 0:
+        first = to_run[remaining[0]]
+        first_shape = first[0][0].shape
+        to_batch_temp = []
+        for x in remaining:
+            if can_concat_cond(to_run[x][0], first[0]):
+                to_batch_temp += [x]
+
+        to_batch_temp.reverse()
+        to_batch = to_batch_temp[:1]
+
+        free_memory = model_management.get_free_memory(x_in.device)
+        for i in range(1, len(to_batch_temp) + 1):
+            batch_amount = to_batch_temp[:len(to_batch_temp)//i]
+            input_shape = [len(batch_amount) * first_shape[0]] + list(first_shape)[1:]
+            cond_shapes = collections.defaultdict(list)
+            for tt in batch_amount:
+                for k, v in to_run[tt][0].conditioning.items():
+                    cond_shapes[k].append(v.size())
+
+            if model.memory_required(input_shape, cond_shapes=cond_shapes) * 1.5 < free_memory:
+                to_batch = batch_amount
+                break
+
+        batches.append(to_batch)
+        remaining = [x for x in remaining if x not in to_batch]
+    return batches
+
+def _cond_batch_plan_key(hooked_to_run: dict[comfy.hooks.HookGroup,list[tuple[tuple,int]]], x_in: torch.Tensor):
+    key = [tuple(x_in.shape), x_in.dtype, x_in.device]
+    for hooks, to_run in hooked_to_run.items():
+        key.append(hooks)
+        if hooks is not None:
+            key.append(tuple(id(hook.hook_keyframe._current_keyframe) for hook in hooks.hooks))
+        # control and patches are batched by identity, record which entries share them
+        shared = {}
+        for x, (p, i) in enumerate(to_run):
+            key.append((i, p.uuid, tuple(p.input_x.shape), None if p.area is None else tuple(p.area),
+                        None if p.control is None else shared.setdefault(id(p.control), x),
+                        None if p.patches is None else shared.setdefault(id(p.patches), x),
+                        tuple((k, tuple(v.size())) for k, v in p.conditioning.items())))
+    return tuple(key)
+
+class CondBatchPlan:
+    """
+    Batching decisions and output buffers of _calc_cond_batch, kept for one sampling run in
+    model_options["cond_batch_plan"].
+
+    Which conds get batched together and how many of them fit in memory only changes when the active
+    conds, their areas or the hook keyframes do, so it is worked out once and reused on the following
+    steps. The accumulators are zeroed in place instead of being allocated on every step.
+    """
+    MAX_PLANS = 16
+
+    def __init__(self):
+        self.batches = {}
+        self.accumulators = {}
+
+    def get_batches(self, model: BaseModel, hooked_to_run: dict[comfy.hooks.HookGroup,list[tuple[tuple,int]]], x_in: torch.Tensor):
+        key = _cond_batch_plan_key(hooked_to_run, x_in)
+        batches = self.batches.get(key, None)
+        if batches is not None:
+            for to_run, hook_batches in zip(hooked_to_run.values(), batches):
+                for to_batch in hook_batches:
+                    first = to_run[to_batch[-1]][0]
+                    if not all(can_concat_cond(to_run[x][0], first) for x in to_batch):
+                        batches = None
+                        break
+                if batches is None:
+                    break
+        if batches is None:
+            batches = [_cond_batches(model, to_run, x_in) for to_run in hooked_to_run.values()]
+            if len(self.batches) >= self.MAX_PLANS:
+                self.batches.clear()
+            self.batches[key] = batches
+        return batches
+
+    def acquire_accumulators(self, count: int, x_in: torch.Tensor):
+        key = (count, tuple(x_in.shape), x_in.dtype, x_in.device)
+        out = self.accumulators.pop(key, None)
+        if out is None:
+            return [torch.zeros_like(x_in) for _ in range(count)], [torch.full_like(x_in, 1e-37) for _ in range(count)]
+        out_conds, out_counts = out
+        for i in range(count):
+            out_conds[i].zero_()
+            out_counts[i].fill_(1e-37)
+        return out_conds, out_counts
+
+    def release_accumulators(self, out_conds: list[torch.Tensor], out_counts: list[torch.Tensor]):
+        x = out_conds[0]
+        if len(self.accumulators) >= self.MAX_PLANS:
+            self.accumulators.clear()
+        self.accumulators[(len(out_conds), tuple(x.shape), x.dtype, x.device)] = (out_conds, out_counts)
+
 def _calc_cond_batch(model: BaseModel, conds: list[list[dict]], x_in: torch.Tensor, timestep, model_options):
-    out_conds = []
-    out_counts = []
+    plan: CondBatchPlan = model_options.get("cond_batch_plan", None)
+    if plan is None:
+        plan = CondBatchPlan()
+    # taken out of the plan while in use, a nested call gets its own
+    out_conds, out_counts = plan.acquire_accumulators(len(conds), x_in)
     # separate conds by matching hooks
     hooked_to_run: dict[comfy.hooks.HookGroup,list[tuple[tuple,int]]] = {}
     default_conds = []
     has_default_conds = False
 
     for i in range(len(conds)):
-        out_conds.append(torch.zeros_like(x_in))
-        out_counts.append(torch.ones_like(x_in) * 1e-37)
-
         cond = conds[i]
         default_c = []
         if cond is not None:
@@ -247,33 +345,11 @@ def _calc_cond_batch(model: BaseModel, conds: list[list[dict]], x_in: torch.Tens
 
     model.current_patcher.prepare_state(timestep)
 
-    # run every hooked_to_run separately
-    for hooks, to_run in hooked_to_run.items():
-        while len(to_run) > 0:
-            first = to_run[0]
-            first_shape = first[0][0].shape
-            to_batch_temp = []
-            for x in range(len(to_run)):
-                if can_concat_cond(to_run[x][0], first[0]):
-                    to_batch_temp += [x]
-
-            to_batch_temp.reverse()
-            to_batch = to_batch_temp[:1]
-
-            free_memory = model_management.get_free_memory(x_in.device)
-            for i in range(1, len(to_batch_temp) + 1):
-                batch_amount = to_batch_temp[:len(to_batch_temp)//i]
-                input_shape = [len(batch_amount) * first_shape[0]] + list(first_shape)[1:]
-                cond_shapes = collections.defaultdict(list)
-                for tt in batch_amount:
-                    cond = {k: v.size() for k, v in to_run[tt][0].conditioning.items()}
-                    for k, v in to_run[tt][0].conditioning.items():
-                        cond_shapes[k].append(v.size())
-
-                if model.memory_required(input_shape, cond_shapes=cond_shapes) * 1.5 < free_memory:
-                    to_batch = batch_amount
-                    break
+    batches = plan.get_batches(model, hooked_to_run, x_in)
 
+    # run every hooked_to_run separately
+    for (hooks, to_run), hook_batches in zip(hooked_to_run.items(), batches):
+        for to_batch in hook_batches:
             input_x = []
             mult = []
             c = []
@@ -283,7 +359,7 @@ def _calc_cond_batch(model: BaseModel, conds: list[list[dict]], x_in: torch.Tens
             control = None
             patches = None
             for x in to_batch:
-                o = to_run.pop(x)
+                o = to_run[x]
                 p = o[0]
                 input_x.append(p.input_x)
                 mult.append(p.mult)
@@ -341,10 +417,9 @@ def _calc_cond_batch(model: BaseModel, conds: list[list[dict]], x_in: torch.Tens
                     out_c += output[o] * mult[o]
                     out_cts += mult[o]
 
-    for i in range(len(out_conds)):
-        out_conds[i] /= out_counts[i]
-
-    return out_conds
+    out = [out_conds[i] / out_counts[i] for i in range(len(out_conds))]
+    plan.release_accumulators(out_conds, out_counts)
+    return out
 
 def calc_cond_uncond_batch(model, cond, uncond, x_in, timestep, model_options): #TODO: remove
     logging.warning("WARNING: The comfy.samplers.calc_cond_uncond_batch function is deprecated please use the calc_cond_batch one instead.")
@@ -970,6 +1045,7 @@ class CFGGuider:
 
         extra_model_options = comfy.model_patcher.create_model_options_clone(self.model_options)
         extra_model_options.setdefault("transformer_options", {})["sample_sigmas"] = sigmas
+        extra_model_options["cond_batch_plan"] = CondBatchPlan()
         extra_args = {"model_options": extra_model_options, "seed": seed}
 
         executor = comfy.patcher_extension.WrapperExecutor.new_class_executor(
@@ -25,6 +25,7 @@ import math
 import os
 
 import comfy.utils
+import comfy.conditioning_cache
 
 from . import clip_vision
 from . import gligen
@@ -258,35 +259,41 @@ class CLIP:
         return all_cond_pooled
 
     def encode_from_tokens(self, tokens, return_pooled=False, return_dict=False):
-        self.cond_stage_model.reset_clip_options()
+        cache_key = comfy.conditioning_cache.conditioning_cache.make_key(self, tokens, return_pooled == "unprojected")
+        out = comfy.conditioning_cache.conditioning_cache.get(cache_key)
+        if out is None:
+            self.cond_stage_model.reset_clip_options()
 
-        if self.layer_idx is not None:
-            self.cond_stage_model.set_clip_options({"layer": self.layer_idx})
+            if self.layer_idx is not None:
+                self.cond_stage_model.set_clip_options({"layer": self.layer_idx})
 
-        if return_pooled == "unprojected":
-            self.cond_stage_model.set_clip_options({"projected_pooled": False})
+            if return_pooled == "unprojected":
+                self.cond_stage_model.set_clip_options({"projected_pooled": False})
 
-        self.load_model()
-        self.cond_stage_model.set_clip_options({"execution_device": self.patcher.load_device})
-        o = self.cond_stage_model.encode_token_weights(tokens)
-        cond, pooled = o[:2]
-        if return_dict:
+            self.load_model()
+            self.cond_stage_model.set_clip_options({"execution_device": self.patcher.load_device})
+            o = self.cond_stage_model.encode_token_weights(tokens)
+            cond, pooled = o[:2]
             out = {"cond": cond, "pooled_output": pooled}
             if len(o) > 2:
                 for k in o[2]:
                     out[k] = o[2][k]
+            comfy.conditioning_cache.conditioning_cache.put(cache_key, out)
+
+        if return_dict:
             self.add_hooks_to_dict(out)
             return out
 
         if return_pooled:
-            return cond, pooled
-        return cond
+            return out["cond"], out["pooled_output"]
+        return out["cond"]
 
     def encode(self, text):
         tokens = self.tokenize(text)
         return self.encode_from_tokens(tokens)
 
     def load_sd(self, sd, full_model=False):
+        comfy.conditioning_cache.conditioning_cache.forget_model(self.cond_stage_model)
         if full_model:
             return self.cond_stage_model.load_state_dict(sd, strict=False)
         else:
@@ -721,19 +728,33 @@ class VAE:
                 pixels = torch.nn.functional.pad(pixels, (0, self.output_channels - pixels.shape[-1]), mode=mode, value=value)
         return pixels
 
+    def tile_batch_size(self, memory_used):
+        """How many tiles that each need memory_used bytes fit in half the free memory at once."""
+        # memory_used is an estimate, leave room for the tiles being stitched and the allocator's fragmentation
+        free_memory = model_management.get_free_memory(self.device) * 0.5
+        return max(1, int(free_memory / max(1, memory_used)))
+
     def decode_tiled_(self, samples, tile_x=64, tile_y=64, overlap = 16):
+        tile_batch_size = self.tile_batch_size(self.memory_used_decode((1, samples.shape[1], tile_y, tile_x), self.vae_dtype))
         steps = samples.shape[0] * comfy.utils.get_tiled_scale_steps(samples.shape[3], samples.shape[2], tile_x, tile_y, overlap)
         steps += samples.shape[0] * comfy.utils.get_tiled_scale_steps(samples.shape[3], samples.shape[2], tile_x // 2, tile_y * 2, overlap)
         steps += samples.shape[0] * comfy.utils.get_tiled_scale_steps(samples.shape[3], samples.shape[2], tile_x * 2, tile_y // 2, overlap)
-        pbar = comfy.utils.ProgressBar(steps)
 
         decode_fn = lambda a: self.first_stage_model.decode(a.to(self.vae_dtype).to(self.device)).float()
-        output = self.process_output(
-            (comfy.utils.tiled_scale(samples, decode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar) +
-            comfy.utils.tiled_scale(samples, decode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar) +
-             comfy.utils.tiled_scale(samples, decode_fn, tile_x, tile_y, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar))
-            / 3.0)
-        return output
+        while True:
+            pbar = comfy.utils.ProgressBar(steps)
+            try:
+                output = self.process_output(
+                    (comfy.utils.tiled_scale(samples, decode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, tile_batch_size=tile_batch_size) +
+                    comfy.utils.tiled_scale(samples, decode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, tile_batch_size=tile_batch_size) +
+                     comfy.utils.tiled_scale(samples, decode_fn, tile_x, tile_y, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, tile_batch_size=tile_batch_size))
+                    / 3.0)
+                return output
+            except model_management.OOM_EXCEPTION:
+                if tile_batch_size <= 1:
+                    raise
+                tile_batch_size //= 2
+                logging.warning("Ran out of memory during tiled VAE decoding, retrying with {} tiles at once.".format(tile_batch_size))
 
     def decode_tiled_1d(self, samples, tile_x=128, overlap=32):
         if samples.ndim == 3:
@@ -750,17 +771,25 @@ class VAE:
         return self.process_output(comfy.utils.tiled_scale_multidim(samples, decode_fn, tile=(tile_t, tile_x, tile_y), overlap=overlap, upscale_amount=self.upscale_ratio, out_channels=self.output_channels, index_formulas=self.upscale_index_formula, output_device=self.output_device))
 
     def encode_tiled_(self, pixel_samples, tile_x=512, tile_y=512, overlap = 64):
+        tile_batch_size = self.tile_batch_size(self.memory_used_encode((1, pixel_samples.shape[1], tile_y, tile_x), self.vae_dtype))
         steps = pixel_samples.shape[0] * comfy.utils.get_tiled_scale_steps(pixel_samples.shape[3], pixel_samples.shape[2], tile_x, tile_y, overlap)
         steps += pixel_samples.shape[0] * comfy.utils.get_tiled_scale_steps(pixel_samples.shape[3], pixel_samples.shape[2], tile_x // 2, tile_y * 2, overlap)
         steps += pixel_samples.shape[0] * comfy.utils.get_tiled_scale_steps(pixel_samples.shape[3], pixel_samples.shape[2], tile_x * 2, tile_y // 2, overlap)
-        pbar = comfy.utils.ProgressBar(steps)
 
         encode_fn = lambda a: self.first_stage_model.encode((self.process_input(a)).to(self.vae_dtype).to(self.device)).float()
-        samples = comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x, tile_y, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
-        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
-        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
-        samples /= 3.0
-        return samples
+        while True:
+            pbar = comfy.utils.ProgressBar(steps)
+            try:
+                samples = comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x, tile_y, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, tile_batch_size=tile_batch_size)
+                samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, tile_batch_size=tile_batch_size)
+                samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, tile_batch_size=tile_batch_size)
+                samples /= 3.0
+                return samples
+            except model_management.OOM_EXCEPTION:
+                if tile_batch_size <= 1:
+                    raise
+                tile_batch_size //= 2
+                logging.warning("Ran out of memory during tiled VAE encoding, retrying with {} tiles at once.".format(tile_batch_size))
 
     def encode_tiled_1d(self, samples, tile_x=256 * 2048, overlap=64 * 2048):
         if self.latent_dim == 1:
@@ -975,7 +1004,7 @@ class StyleModel:
 
 
 def load_style_model(ckpt_path):
-    model_data = comfy.utils.load_torch_file(ckpt_path, safe_load=True)
+    model_data = comfy.utils.load_torch_file(ckpt_path, safe_load=True, cache=True)
     keys = model_data.keys()
     if "style_embedding" in keys:
         model = comfy.t2i_adapter.adapter.StyleAdapter(width=1024, context_dim=768, num_head=8, n_layes=3, num_token=8)
@@ -1020,7 +1049,9 @@ def load_clip(ckpt_paths, embedding_directory=None, clip_type=CLIPType.STABLE_DI
         if model_options.get("custom_operations", None) is None:
             sd, metadata = comfy.utils.convert_old_quants(sd, model_prefix="", metadata=metadata)
         clip_data.append(sd)
-    return load_text_encoder_state_dicts(clip_data, embedding_directory=embedding_directory, clip_type=clip_type, model_options=model_options)
+    clip = load_text_encoder_state_dicts(clip_data, embedding_directory=embedding_directory, clip_type=clip_type, model_options=model_options)
+    comfy.conditioning_cache.conditioning_cache.set_model_source(clip.cond_stage_model, ckpt_paths, [clip_type.name, model_options])
+    return clip
 
 
 class TEModel(Enum):
@@ -1342,6 +1373,8 @@ def load_checkpoint_guess_config(ckpt_path, output_vae=True, output_clip=True, o
     out = load_state_dict_guess_config(sd, output_vae, output_clip, output_clipvision, embedding_directory, output_model, model_options, te_model_options=te_model_options, metadata=metadata)
     if out is None:
         raise RuntimeError("ERROR: Could not detect model type of: {}\n{}".format(ckpt_path, model_detection_error_hint(ckpt_path, sd)))
+    if out[1] is not None:
+        comfy.conditioning_cache.conditioning_cache.set_model_source(out[1].cond_stage_model, [ckpt_path], te_model_options)
     return out
 
 def load_state_dict_guess_config(sd, output_vae=True, output_clip=True, output_clipvision=False, embedding_directory=None, output_model=True, model_options={}, te_model_options={}, metadata=None):
@@ -7,10 +7,12 @@ import traceback
 import zipfile
 from . import model_management
 import comfy.clip_model
+import comfy.utils
 import json
 import logging
 import numbers
 import re
+import threading
 
 def gen_empty_tokens(special_tokens, length):
     start_token = special_tokens.get("start", None)
@@ -394,14 +396,9 @@ def bundled_embed(embed, prefix, suffix): #bundled embedding in lora format
 
     return torch.cat(out_list, dim=0)
 
-def load_embed(embedding_name, embedding_directory, embedding_size, embed_key=None):
-    if isinstance(embedding_directory, str):
-        embedding_directory = [embedding_directory]
-
-    embedding_directory = expand_directory_list(embedding_directory)
-
+def find_embed_file(embedding_name, directories, isfile=os.path.isfile):
     valid_file = None
-    for embed_dir in embedding_directory:
+    for embed_dir in directories:
         embed_path = os.path.abspath(os.path.join(embed_dir, embedding_name))
         embed_dir = os.path.abspath(embed_dir)
         try:
@@ -409,29 +406,95 @@ def load_embed(embedding_name, embedding_directory, embedding_size, embed_key=No
                 continue
         except:
             continue
-        if not os.path.isfile(embed_path):
+        if not isfile(embed_path):
             extensions = ['.safetensors', '.pt', '.bin']
             for x in extensions:
                 t = embed_path + x
-                if os.path.isfile(t):
+                if isfile(t):
                     valid_file = t
                     break
         else:
             valid_file = embed_path
         if valid_file is not None:
             break
+    return valid_file
+
+class EmbeddingCache:
+    """
+    Caches the files found under the embedding directories and the embeddings loaded from them.
+    The directory index is rebuilt when the mtime of one of the directories changes, embeddings
+    are keyed by the mtime and size of their file.
+    """
+    def __init__(self, max_embeddings=128):
+        self.lock = threading.Lock()
+        #directories -> (expanded directories, {directory: mtime}, set of file paths)
+        self.indexes = {}
+        self.embeddings = comfy.utils.LRUCache(max_embeddings)
+
+    def _mtimes(self, directories):
+        out = {}
+        for d in directories:
+            try:
+                out[d] = os.stat(d).st_mtime_ns
+            except OSError:
+                out[d] = None
+        return out
 
-    if valid_file is None:
-        return None
+    def _index(self, directories):
+        key = tuple(directories)
+        with self.lock:
+            index = self.indexes.get(key)
+        if index is not None and self._mtimes(index[0]) == index[1]:
+            return index
+
+        expanded = set()
+        files = set()
+        for x in directories:
+            expanded.add(x)
+            for root, subdir, file in os.walk(x, followlinks=True):
+                expanded.add(root)
+                files.update(os.path.abspath(os.path.join(root, f)) for f in file)
+        expanded = list(expanded)
+        index = (expanded, self._mtimes(expanded), files)
+        with self.lock:
+            self.indexes[key] = index
+        return index
+
+    def find(self, embedding_name, directories):
+        expanded, _, files = self._index(directories)
+        valid_file = find_embed_file(embedding_name, expanded, files.__contains__)
+        if valid_file is None:
+            # The index is exact, this only matters on case insensitive file systems
+            valid_file = find_embed_file(embedding_name, expanded)
+        return valid_file
+
+    def load(self, embed_path, embedding_name, embedding_size, embed_key=None):
+        stat = os.stat(embed_path)
+        key = (embed_path, stat.st_mtime_ns, stat.st_size, embedding_size, embed_key)
+        embed_out = self.embeddings.get(key)
+        if embed_out is None:
+            embed_out = load_embed_file(embed_path, embedding_name, embedding_size, embed_key)
+            if embed_out is not None:
+                self.embeddings.put(key, embed_out)
+        return embed_out
+
+embedding_cache = EmbeddingCache()
 
-    embed_path = valid_file
+def load_embed(embedding_name, embedding_directory, embedding_size, embed_key=None):
+    if isinstance(embedding_directory, str):
+        embedding_directory = [embedding_directory]
+
+    embed_path = embedding_cache.find(embedding_name, embedding_directory)
+    if embed_path is None:
+        return None
+    return embedding_cache.load(embed_path, embedding_name, embedding_size, embed_key)
 
+def load_embed_file(embed_path, embedding_name, embedding_size, embed_key=None):
     embed_out = None
 
     try:
         if embed_path.lower().endswith(".safetensors"):
-            import safetensors.torch
-            embed = safetensors.torch.load_file(embed_path, device="cpu")
+            embed = comfy.utils.load_torch_file(embed_path, safe_load=True, cache=True)
         else:
             try:
                 embed = torch.load(embed_path, weights_only=True, map_location="cpu")
@@ -515,6 +578,20 @@ class SDTokenizer:
 
         self.disable_weights = disable_weights
 
+        # Prompts are often tokenized again unchanged or with a few words changed
+        self.word_cache = comfy.utils.LRUCache(self.WORD_CACHE_SIZE)
+        self.tokenize_cache = comfy.utils.LRUCache(self.TOKENIZE_CACHE_SIZE)
+
+    WORD_CACHE_SIZE = 16384
+    TOKENIZE_CACHE_SIZE = 256
+
+    def _tokenize_word(self, word):
+        input_ids = self.word_cache.get(word)
+        if input_ids is None:
+            input_ids = tuple(self.tokenizer(word)["input_ids"])
+            self.word_cache.put(word, input_ids)
+        return input_ids
+
     def _try_get_embedding(self, embedding_name:str):
         '''
         Takes a potential embedding name and tries to retrieve it.
@@ -547,9 +624,25 @@ class SDTokenizer:
         '''
         min_length = tokenizer_options.get("{}_min_length".format(self.embedding_key), self.min_length)
         min_padding = tokenizer_options.get("{}_min_padding".format(self.embedding_key), self.min_padding)
+        disable_weights = kwargs.get("disable_weights", self.disable_weights)
+
+        # Embedding files can change between calls, those prompts only use the embedding cache
+        cache_key = None
+        if self.embedding_directory is None or self.embedding_identifier not in text:
+            cache_key = (text, return_word_ids, min_length, min_padding, disable_weights)
+            cached = self.tokenize_cache.get(cache_key)
+            if cached is not None:
+                # Callers are free to modify the batches they get
+                return [list(x) for x in cached]
+
+        batched_tokens = self._tokenize_with_weights(text, return_word_ids, min_length, min_padding, disable_weights)
+        if cache_key is not None:
+            self.tokenize_cache.put(cache_key, tuple(tuple(x) for x in batched_tokens))
+        return batched_tokens
 
+    def _tokenize_with_weights(self, text, return_word_ids, min_length, min_padding, disable_weights):
         text = escape_important(text)
-        if kwargs.get("disable_weights", self.disable_weights):
+        if disable_weights:
             parsed_weights = [(text, 1.0)]
         else:
             parsed_weights = token_weights(text, 1.0)
@@ -585,7 +678,7 @@ class SDTokenizer:
                 if self.tokenizer_adds_end_token:
                     end = -1
                 #parse word
-                tokens.append([(t, weight) for t in self.tokenizer(word)["input_ids"][self.tokens_start:end]])
+                tokens.append([(t, weight) for t in self._tokenize_word(word)[self.tokens_start:end]])
 
         #reshape token array to CLIP input size
         batched_tokens = []
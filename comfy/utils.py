@@ -30,6 +30,10 @@ from torch.nn.functional import interpolate
 from einops import rearrange
 from comfy.cli_args import args
 import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
 
 MMAP_TORCH_FILES = args.mmap_torch_files
 DISABLE_MMAP = args.disable_mmap
@@ -55,9 +59,125 @@ if hasattr(torch.serialization, "add_safe_globals"):  # TODO: this was added in
 else:
     logging.warning("Warning, you are using an old pytorch version and some ckpt/pt files might be loaded unsafely. Upgrading to 2.4 or above is recommended as older versions of pytorch are no longer supported.")
 
-def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
+class StateDict(dict):
+    """A state dict handed out by StateDictCache, its cache entry is referenced while the dict is alive."""
+    pass
+
+class StateDictCache:
+    """
+    Process wide cache of the state dicts loaded by load_torch_file(cache=True), keyed by path,
+    mtime and size. Every caller gets its own dict sharing the tensors, which are memory mapped
+    unless --disable-mmap is set, so the callers must not modify the tensors in place. Entries
+    nobody references are dropped, oldest first, once the cache grows over max_size bytes.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        #key -> [state dict, metadata, nbytes, number of live StateDicts]
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def _key(self, path, device):
+        stat = os.stat(path)
+        return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size, str(device))
+
+    def load(self, path, device, load_fn):
+        """Returns (state dict, metadata) for path, calling load_fn() to load it on a miss."""
+        key = self._key(path, device)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None:
+            sd, metadata = load_fn()
+            if not isinstance(sd, dict):
+                return sd, metadata
+            nbytes = sum(t.nbytes for t in sd.values() if isinstance(t, torch.Tensor))
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = [sd, metadata, nbytes, 0]
+                    # Older versions of the file are never used again
+                    for k in [k for k, e in self.entries.items() if k[0] == key[0] and e[3] == 0]:
+                        self._drop(k)
+                    self.entries[key] = entry
+                    self.size += nbytes
+        out = StateDict(entry[0])
+        with self.lock:
+            entry[3] += 1
+            self.trim(self.max_size)
+        weakref.finalize(out, self._release, entry)
+        return out, entry[1]
+
+    def _release(self, entry):
+        with self.lock:
+            entry[3] -= 1
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry[2]
+        return entry[2]
+
+    def trim(self, max_size=0):
+        """Drops unreferenced entries until the cache fits in max_size bytes, returns the bytes dropped."""
+        freed = 0
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e[3] == 0]:
+                if self.size <= max_size:
+                    break
+                freed += self._drop(key)
+        return freed
+
+    def ram_usage(self):
+        return self.size
+
+state_dict_cache = StateDictCache(int(args.state_dict_cache_size * (1024 ** 3)))
+
+class LRUCache:
+    """Thread safe dict that keeps the max_items most recently used entries."""
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        if self.max_items <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False, cache=False):
+    """
+    Loads a checkpoint file. With cache=True the state dict comes from the process wide
+    state_dict_cache, for files used by many nodes like LoRAs; the tensors are shared with other
+    callers and must not be modified in place.
+    """
     if device is None:
         device = torch.device("cpu")
+    if cache and state_dict_cache.max_size > 0:
+        sd, metadata = state_dict_cache.load(ckpt, device, lambda: _load_torch_file(ckpt, safe_load, device, True))
+    else:
+        sd, metadata = _load_torch_file(ckpt, safe_load, device, return_metadata)
+    return (sd, metadata) if return_metadata else sd
+
+def _load_torch_file(ckpt, safe_load, device, return_metadata):
     metadata = None
     if ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft"):
         try:
@@ -98,7 +218,7 @@ def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
                     sd = pl_sd
             else:
                 sd = pl_sd
-    return (sd, metadata) if return_metadata else sd
+    return sd, metadata
 
 def save_torch_file(sd, ckpt, metadata=None):
     if metadata is not None:
@@ -974,7 +1094,13 @@ def get_tiled_scale_steps(width, height, tile_x, tile_y, overlap):
     return rows * cols
 
 @torch.inference_mode()
-def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", downscale=False, index_formulas=None, pbar=None):
+def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", downscale=False, index_formulas=None, pbar=None, tile_batch_size=1):
+    """
+    Runs function over overlapping tiles of samples and blends the results with feathered masks.
+
+    tile_batch_size tiles of the same shape, from any batch element, are passed to function at
+    once, so it has to handle batches; callers size it to the available memory.
+    """
     dims = len(tile)
 
     if not (isinstance(upscale_amount, (tuple, list))):
@@ -1032,60 +1158,93 @@ def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_am
 
     output = torch.empty([samples.shape[0], out_channels] + mult_list_upscale(samples.shape[2:]), device=output_device)
 
-    for b in range(samples.shape[0]):
-        s = samples[b:b+1]
-
-        # handle entire input fitting in a single tile
-        if all(s.shape[d+2] <= tile[d] for d in range(dims)):
-            output[b:b+1] = function(s).to(output_device)
+    # handle entire input fitting in a single tile
+    if all(samples.shape[d+2] <= tile[d] for d in range(dims)):
+        for b in range(0, samples.shape[0], tile_batch_size):
+            s = samples[b:b+tile_batch_size]
+            output[b:b+s.shape[0]] = function(s).to(output_device)
             if pbar is not None:
-                pbar.update(1)
-            continue
-
-        out = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
-        out_div = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
-
-        positions = [range(0, s.shape[d+2] - overlap[d], tile[d] - overlap[d]) if s.shape[d+2] > tile[d] else [0] for d in range(dims)]
-
-        for it in itertools.product(*positions):
-            s_in = s
-            upscaled = []
-
+                pbar.update(s.shape[0])
+        return output
+
+    positions = [range(0, samples.shape[d+2] - overlap[d], tile[d] - overlap[d]) if samples.shape[d+2] > tile[d] else [0] for d in range(dims)]
+
+    # tiles are the same for every batch element, edge tiles can be smaller
+    tiles = []
+    for it in itertools.product(*positions):
+        pos = []
+        lengths = []
+        upscaled = []
+        for d in range(dims):
+            p = max(0, min(samples.shape[d + 2] - overlap[d], it[d]))
+            pos.append(p)
+            lengths.append(min(tile[d], samples.shape[d + 2] - p))
+            upscaled.append(round(get_pos(d, p)))
+        tiles.append((pos, lengths, upscaled))
+
+    feathers = [round(get_scale(d, overlap[d])) for d in range(dims)]
+    masks = {}
+
+    def get_mask(shape):
+        mask = masks.get(shape)
+        if mask is None:
+            mask = torch.ones([1, 1] + list(shape), device=output_device)
             for d in range(dims):
-                pos = max(0, min(s.shape[d + 2] - overlap[d], it[d]))
-                l = min(tile[d], s.shape[d + 2] - pos)
-                s_in = s_in.narrow(d + 2, pos, l)
-                upscaled.append(round(get_pos(d, pos)))
-
-            ps = function(s_in).to(output_device)
-            mask = torch.ones_like(ps)
-
-            for d in range(2, dims + 2):
-                feather = round(get_scale(d - 2, overlap[d - 2]))
-                if feather >= mask.shape[d]:
+                feather = feathers[d]
+                if feather >= shape[d]:
                     continue
-                for t in range(feather):
-                    a = (t + 1) / feather
-                    mask.narrow(d, t, 1).mul_(a)
-                    mask.narrow(d, mask.shape[d] - 1 - t, 1).mul_(a)
-
-            o = out
-            o_d = out_div
-            for d in range(dims):
-                o = o.narrow(d + 2, upscaled[d], mask.shape[d + 2])
-                o_d = o_d.narrow(d + 2, upscaled[d], mask.shape[d + 2])
-
-            o.add_(ps * mask)
-            o_d.add_(mask)
+                ramp = torch.ones(shape[d], device=output_device)
+                a = torch.arange(1, feather + 1, device=output_device) / feather
+                ramp[:feather] *= a
+                ramp[shape[d] - feather:] *= a.flip(0)
+                mask.mul_(ramp.view([1, 1] + [shape[d] if x == d else 1 for x in range(dims)]))
+            masks[shape] = mask
+        return mask
+
+    # the weights only depend on the tile positions, so they are shared by all batch elements
+    output.zero_()
+    out_div = torch.zeros([1, 1] + list(output.shape[2:]), device=output_device)
+    div_done = set()
+
+    jobs = {}
+    for b in range(samples.shape[0]):
+        for t, (pos, lengths, upscaled) in enumerate(tiles):
+            jobs.setdefault(tuple(lengths), []).append((b, t))
+
+    for group in jobs.values():
+        for c in range(0, len(group), tile_batch_size):
+            chunk = group[c:c + tile_batch_size]
+            s_in = []
+            for b, t in chunk:
+                s = samples[b:b+1]
+                pos, lengths, _ = tiles[t]
+                for d in range(dims):
+                    s = s.narrow(d + 2, pos[d], lengths[d])
+                s_in.append(s)
+            ps = function(torch.cat(s_in) if len(s_in) > 1 else s_in[0]).to(output_device)
+            mask = get_mask(tuple(ps.shape[2:]))
+
+            for i, (b, t) in enumerate(chunk):
+                upscaled = tiles[t][2]
+                o = output[b:b+1]
+                for d in range(dims):
+                    o = o.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+                o.addcmul_(ps[i:i+1], mask)
+                if t not in div_done:
+                    o_d = out_div
+                    for d in range(dims):
+                        o_d = o_d.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+                    o_d.add_(mask)
+                    div_done.add(t)
 
             if pbar is not None:
-                pbar.update(1)
+                pbar.update(len(chunk))
 
-        output[b:b+1] = out/out_div
+    output /= out_div
     return output
 
-def tiled_scale(samples, function, tile_x=64, tile_y=64, overlap = 8, upscale_amount = 4, out_channels = 3, output_device="cpu", pbar = None):
-    return tiled_scale_multidim(samples, function, (tile_y, tile_x), overlap=overlap, upscale_amount=upscale_amount, out_channels=out_channels, output_device=output_device, pbar=pbar)
+def tiled_scale(samples, function, tile_x=64, tile_y=64, overlap = 8, upscale_amount = 4, out_channels = 3, output_device="cpu", pbar = None, tile_batch_size=1):
+    return tiled_scale_multidim(samples, function, (tile_y, tile_x), overlap=overlap, upscale_amount=upscale_amount, out_channels=out_channels, output_device=output_device, pbar=pbar, tile_batch_size=tile_batch_size)
 
 PROGRESS_BAR_ENABLED = True
 def set_progress_bar_enabled(enabled):
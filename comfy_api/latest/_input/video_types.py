@@ -1,9 +1,10 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from fractions import Fraction
-from typing import Optional, Union, IO
+from typing import Iterator, Optional, Union, IO
 import io
 import av
+import torch
 from .._util import VideoContainer, VideoCodec, VideoComponents
 
 class VideoInput(ABC):
@@ -50,6 +51,38 @@ class VideoInput(ABC):
         buffer.seek(0)
         return buffer
 
+    def get_components_range(self, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1, include_audio: bool = True) -> VideoComponents:
+        """
+        Returns the components of the frames [start_frame, end_frame) taking every step-th frame.
+        The audio is trimmed to the same time range and the frame rate is divided by step.
+
+        Default implementation slices the result of :meth:`get_components`. File-based
+        implementations should override this and only decode the frames they need.
+        """
+        components = self.get_components()
+        images = components.images[start_frame:end_frame:step]
+        audio = components.audio
+        if audio is not None and include_audio:
+            rate = components.frame_rate
+            start = int(start_frame / rate * audio["sample_rate"])
+            end = None if end_frame is None else int(end_frame / rate * audio["sample_rate"])
+            audio = {**audio, "waveform": audio["waveform"][..., start:end]}
+        elif not include_audio:
+            audio = None
+        return VideoComponents(images=images, audio=audio, frame_rate=components.frame_rate / step, metadata=components.metadata)
+
+    def iter_frames(self, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1, chunk_size: int = 16) -> Iterator[torch.Tensor]:
+        """
+        Yields the frames [start_frame, end_frame), taking every step-th frame, in chunks of up to
+        chunk_size frames of shape (N, H, W, 3) with values in [0, 1].
+
+        Default implementation slices the images of :meth:`get_components`. File-based
+        implementations should override this to decode one chunk at a time.
+        """
+        images = self.get_components().images[start_frame:end_frame:step]
+        for i in range(0, images.shape[0], chunk_size):
+            yield images[i:i + chunk_size]
+
     # Provide a default implementation, but subclasses can provide optimized versions
     # if possible.
     def get_dimensions(self) -> tuple[int, int]:
@@ -100,6 +133,16 @@ class VideoInput(ABC):
         """
         return self.get_components().frame_rate
 
+    def get_ram_usage(self) -> int:
+        """
+        Returns the number of bytes of RAM held by this object. Used by the RAM
+        pressure cache to decide what to evict.
+
+        Returns:
+            Size in bytes
+        """
+        return 0
+
     def get_container_format(self) -> str:
         """
         Returns the container format of the video (e.g., 'mp4', 'mov', 'avi').
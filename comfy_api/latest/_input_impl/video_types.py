@@ -2,7 +2,7 @@ from __future__ import annotations
 from av.container import InputContainer
 from av.subtitles.stream import SubtitleStream
 from fractions import Fraction
-from typing import Optional
+from typing import Iterator, Optional
 from .._input import AudioInput, VideoInput
 import av
 import io
@@ -12,6 +12,9 @@ import math
 import torch
 from .._util import VideoContainer, VideoCodec, VideoComponents
 
+# Largest uint8 buffer _read_frames allocates at once
+FRAME_BUFFER_CHUNK_BYTES = 64 * 1024 * 1024
+
 
 def container_to_output_format(container_format: str | None) -> str | None:
     """
@@ -198,21 +201,76 @@ class VideoFromFile(VideoInput):
         with av.open(self.__file, mode='r') as container:
             return container.format.name
 
-    def get_components_internal(self, container: InputContainer) -> VideoComponents:
-        # Get video frames
-        frames = []
-        for frame in container.decode(video=0):
-            img = frame.to_ndarray(format='rgb24')  # shape: (H, W, 3)
-            img = torch.from_numpy(img) / 255.0  # shape: (H, W, 3)
-            frames.append(img)
-
-        images = torch.stack(frames) if len(frames) > 0 else torch.zeros(0, 3, 0, 0)
+    def get_ram_usage(self) -> int:
+        if isinstance(self.__file, io.BytesIO):
+            return self.__file.getbuffer().nbytes
+        return 0
 
-        # Get frame rate
-        video_stream = next(s for s in container.streams if s.type == 'video')
-        frame_rate = Fraction(video_stream.average_rate) if video_stream and video_stream.average_rate else Fraction(1)
+    def _decode_frames(self, container: InputContainer, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1) -> Iterator[np.ndarray]:
+        """
+        Yields the frames [start_frame, end_frame) of the first video stream, taking every
+        step-th frame, as uint8 arrays of shape (H, W, 3). When the stream has timestamps a
+        frame's index comes from its pts, whatever start_frame is, so the same frame gets the
+        same index on variable frame rate video too. Frames before start_frame are skipped by
+        seeking to the keyframe before it.
+        """
+        video_stream = self._get_first_video_stream(container)
+        video_stream.thread_type = "AUTO"
+        rate = video_stream.average_rate
+        first_pts = video_stream.start_time or 0
+        index_from_pts = bool(rate) and video_stream.time_base is not None
+        if index_from_pts and start_frame > 0:
+            try:
+                container.seek(first_pts + int(start_frame / (rate * video_stream.time_base)), stream=video_stream, backward=True)
+            except av.error.FFmpegError:
+                container.seek(0)
 
-        # Get audio if available
+        index = -1
+        for frame in container.decode(video_stream):
+            if index_from_pts and frame.pts is not None:
+                index = int(round((frame.pts - first_pts) * video_stream.time_base * rate))
+            else:
+                index += 1
+            if end_frame is not None and index >= end_frame:
+                break
+            if index < start_frame or (index - start_frame) % step != 0:
+                continue
+            yield frame.to_ndarray(format='rgb24')  # shape: (H, W, 3)
+
+    def _estimate_selected_frames(self, container: InputContainer, start_frame: int, end_frame: Optional[int], step: int) -> int:
+        video_stream = self._get_first_video_stream(container)
+        total = video_stream.frames
+        if not total and container.duration is not None and video_stream.average_rate:
+            total = int(round(container.duration / av.time_base * float(video_stream.average_rate)))
+        if end_frame is not None:
+            total = end_frame if not total else min(total, end_frame)
+        return len(range(start_frame, total or 0, step))
+
+    def _read_frames(self, container: InputContainer, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1) -> torch.Tensor:
+        # Decode into uint8 buffers, a quarter of the size of the float frames, and convert once at the end.
+        # The frame count is only estimated from the container, so buffers are at most FRAME_BUFFER_CHUNK_BYTES each.
+        buffers = []
+        filled = 0
+        count = 0
+        estimate = None
+        for img in self._decode_frames(container, start_frame, end_frame, step):
+            if len(buffers) == 0 or filled == buffers[-1].shape[0]:
+                if estimate is None:
+                    estimate = self._estimate_selected_frames(container, start_frame, end_frame, step)
+                chunk = max(1, FRAME_BUFFER_CHUNK_BYTES // img.nbytes)
+                size = min(estimate - count, chunk) if estimate > count else chunk
+                buffers.append(torch.empty((size,) + img.shape, dtype=torch.uint8))
+                filled = 0
+            buffers[-1][filled] = torch.from_numpy(img)
+            filled += 1
+            count += 1
+
+        if count == 0:
+            return torch.zeros(0, 3, 0, 0)
+        buffer = buffers[0] if len(buffers) == 1 else torch.cat(buffers)
+        return buffer[:count].to(torch.float32).div_(255.0)
+
+    def _read_audio(self, container: InputContainer, start_time: float = 0.0, end_time: Optional[float] = None) -> Optional[AudioInput]:
         audio = None
         try:
             container.seek(0)  # Reset the container to the beginning
@@ -220,23 +278,54 @@ class VideoFromFile(VideoInput):
                 if stream.type != 'audio':
                     continue
                 assert isinstance(stream, av.AudioStream)
+                sample_rate = int(stream.sample_rate) if stream.sample_rate else 1
                 audio_frames = []
+                first_time = None
+                done = False
                 for packet in container.demux(stream):
                     for frame in packet.decode():
                         assert isinstance(frame, av.AudioFrame)
+                        if frame.time is not None:
+                            if end_time is not None and frame.time >= end_time:
+                                done = True
+                                break
+                            if frame.time + frame.samples / sample_rate <= start_time:
+                                continue
+                            if first_time is None:
+                                first_time = frame.time
                         audio_frames.append(frame.to_ndarray())  # shape: (channels, samples)
+                    if done:
+                        break
                 if len(audio_frames) > 0:
                     audio_data = np.concatenate(audio_frames, axis=1)  # shape: (channels, total_samples)
+                    if first_time is not None and (start_time > 0 or end_time is not None):
+                        start = max(0, int(round((start_time - first_time) * sample_rate)))
+                        end = None if end_time is None else max(start, int(round((end_time - first_time) * sample_rate)))
+                        audio_data = audio_data[:, start:end]
                     audio_tensor = torch.from_numpy(audio_data).unsqueeze(0)  # shape: (1, channels, total_samples)
                     audio = AudioInput({
                         "waveform": audio_tensor,
-                        "sample_rate": int(stream.sample_rate) if stream.sample_rate else 1,
+                        "sample_rate": sample_rate,
                     })
         except StopIteration:
             pass  # No audio stream
+        return audio
+
+    def get_components_internal(self, container: InputContainer, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1, include_audio: bool = True) -> VideoComponents:
+        # Get video frames
+        images = self._read_frames(container, start_frame, end_frame, step)
+
+        # Get frame rate
+        video_stream = next(s for s in container.streams if s.type == 'video')
+        frame_rate = Fraction(video_stream.average_rate) if video_stream and video_stream.average_rate else Fraction(1)
+
+        # Get audio if available
+        audio = None
+        if include_audio:
+            audio = self._read_audio(container, float(start_frame / frame_rate), None if end_frame is None else float(end_frame / frame_rate))
 
         metadata = container.metadata
-        return VideoComponents(images=images, audio=audio, frame_rate=frame_rate, metadata=metadata)
+        return VideoComponents(images=images, audio=audio, frame_rate=frame_rate / step, metadata=metadata)
 
     def get_components(self) -> VideoComponents:
         if isinstance(self.__file, io.BytesIO):
@@ -245,6 +334,25 @@ class VideoFromFile(VideoInput):
             return self.get_components_internal(container)
         raise ValueError(f"No video stream found in file '{self.__file}'")
 
+    def get_components_range(self, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1, include_audio: bool = True) -> VideoComponents:
+        if isinstance(self.__file, io.BytesIO):
+            self.__file.seek(0)
+        with av.open(self.__file, mode='r') as container:
+            return self.get_components_internal(container, start_frame, end_frame, step, include_audio)
+
+    def iter_frames(self, start_frame: int = 0, end_frame: Optional[int] = None, step: int = 1, chunk_size: int = 16) -> Iterator[torch.Tensor]:
+        if isinstance(self.__file, io.BytesIO):
+            self.__file.seek(0)
+        with av.open(self.__file, mode='r') as container:
+            chunk = []
+            for img in self._decode_frames(container, start_frame, end_frame, step):
+                chunk.append(torch.from_numpy(img))
+                if len(chunk) == chunk_size:
+                    yield torch.stack(chunk).to(torch.float32).div_(255.0)
+                    chunk = []
+            if len(chunk) > 0:
+                yield torch.stack(chunk).to(torch.float32).div_(255.0)
+
     def save_to(
         self,
         path: str | io.BytesIO,
@@ -318,6 +426,13 @@ class VideoFromComponents(VideoInput):
     def __init__(self, components: VideoComponents):
         self.__components = components
 
+    def get_ram_usage(self) -> int:
+        # Tensors on the GPU don't hold any RAM
+        tensors = [self.__components.images]
+        if self.__components.audio is not None:
+            tensors.append(self.__components.audio["waveform"])
+        return sum(t.nbytes for t in tensors if t.device.type == 'cpu')
+
     def get_components(self) -> VideoComponents:
         return VideoComponents(
             images=self.__components.images,
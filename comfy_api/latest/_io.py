@@ -1244,6 +1244,10 @@ class Schema:
     """Flags a node as not idempotent; when True, the node will run and not reuse the cached outputs when identical inputs are provided on a different node in the graph."""
     enable_expand: bool=False
     """Flags a node as expandable, allowing NodeOutput to include 'expand' property."""
+    is_thread_safe: bool=False
+    """Flags a node as doing no GPU work and being safe to run on a worker thread; when parallel execution is enabled, the node can run concurrently with independent branches of the graph."""
+    batch_list_inputs: list[str] | None=None
+    """Inputs that can be stacked along the batch dimension; when the node receives lists, it is called once with the list elements stacked and its outputs are split back into per-element results."""
 
     def validate(self):
         '''Validate the schema:
@@ -1675,6 +1679,22 @@ class _ComfyNodeBaseInternal(_ComfyNodeInternal):
             cls.GET_SCHEMA()
         return cls._NOT_IDEMPOTENT
 
+    _THREAD_SAFE = None
+    @final
+    @classproperty
+    def THREAD_SAFE(cls):  # noqa
+        if cls._THREAD_SAFE is None:
+            cls.GET_SCHEMA()
+        return cls._THREAD_SAFE
+
+    _BATCH_LIST_INPUTS = None
+    @final
+    @classproperty
+    def BATCH_LIST_INPUTS(cls):  # noqa
+        if cls._BATCH_LIST_INPUTS is None:
+            cls.GET_SCHEMA()
+        return cls._BATCH_LIST_INPUTS
+
     @final
     @classmethod
     def INPUT_TYPES(cls, include_hidden=True, return_schema=False, live_inputs=None) -> dict[str, dict] | tuple[dict[str, dict], Schema, V3Data]:
@@ -1722,6 +1742,10 @@ class _ComfyNodeBaseInternal(_ComfyNodeInternal):
             cls._INPUT_IS_LIST = schema.is_input_list
         if cls._NOT_IDEMPOTENT is None:
             cls._NOT_IDEMPOTENT = schema.not_idempotent
+        if cls._THREAD_SAFE is None:
+            cls._THREAD_SAFE = schema.is_thread_safe
+        if cls._BATCH_LIST_INPUTS is None:
+            cls._BATCH_LIST_INPUTS = tuple(schema.batch_list_inputs or ())
 
         if cls._RETURN_TYPES is None:
             output = []
@@ -1,7 +1,6 @@
 import logging
 import math
 
-import torch
 from typing_extensions import override
 
 from comfy_api.latest import IO, ComfyExtension, Input
@@ -26,6 +25,7 @@ from comfy_api_nodes.util import (
     ApiEndpoint,
     download_url_to_image_tensor,
     download_url_to_video_output,
+    download_urls_to_image_tensor,
     get_number_of_images,
     image_tensor_pair_to_batch,
     poll_op,
@@ -445,7 +445,7 @@ class ByteDanceSeedreamNode(IO.ComfyNode):
         urls = [str(d["url"]) for d in response.data if isinstance(d, dict) and "url" in d]
         if fail_on_partial and len(urls) < len(response.data):
             raise RuntimeError(f"Only {len(urls)} of {len(response.data)} images were generated before error.")
-        return IO.NodeOutput(torch.cat([await download_url_to_image_tensor(i) for i in urls]))
+        return IO.NodeOutput(await download_urls_to_image_tensor(urls))
 
 
 class ByteDanceTextToVideoNode(IO.ComfyNode):
@@ -14,7 +14,7 @@ from comfy_api_nodes.apis import (
 from comfy_api_nodes.util import (
     ApiEndpoint,
     bytesio_to_image_tensor,
-    download_url_as_bytesio,
+    download_urls_as_bytesio,
     resize_mask_to_image,
     sync_op,
 )
@@ -212,9 +212,7 @@ async def download_and_process_images(image_urls):
     # Initialize list to store image tensors
     image_tensors = []
 
-    for image_url in image_urls:
-        # Using functions from apinode_utils.py to handle downloading and processing
-        image_bytesio = await download_url_as_bytesio(image_url)  # Download image content to BytesIO
+    for image_bytesio in await download_urls_as_bytesio(image_urls):
         img_tensor = bytesio_to_image_tensor(image_bytesio, mode="RGB")  # Convert to torch.Tensor with RGB mode
         image_tensors.append(img_tensor)
 
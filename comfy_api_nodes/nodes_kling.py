@@ -66,6 +66,7 @@ from comfy_api_nodes.util import (
     ApiEndpoint,
     download_url_to_image_tensor,
     download_url_to_video_output,
+    download_urls_to_image_tensor,
     get_number_of_images,
     poll_op,
     sync_op,
@@ -385,7 +386,7 @@ async def image_result_to_node_output(
     if len(images) == 1:
         return await download_url_to_image_tensor(str(images[0].url))
     else:
-        return torch.cat([await download_url_to_image_tensor(str(image.url)) for image in images])
+        return await download_urls_to_image_tensor([str(image.url) for image in images])
 
 
 async def execute_text2video(
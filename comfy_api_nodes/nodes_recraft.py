@@ -25,6 +25,7 @@ from comfy_api_nodes.util import (
     ApiEndpoint,
     bytesio_to_image_tensor,
     download_url_as_bytesio,
+    download_urls_as_bytesio,
     resize_mask_to_image,
     sync_op,
     tensor_to_bytesio,
@@ -58,14 +59,9 @@ async def handle_recraft_file_request(
         multipart_parser=recraft_multipart_parser,
         max_retries=1,
     )
-    all_bytesio = []
     if response.image is not None:
-        all_bytesio.append(await download_url_as_bytesio(response.image.url, timeout=timeout))
-    else:
-        for data in response.data:
-            all_bytesio.append(await download_url_as_bytesio(data.url, timeout=timeout))
-
-    return all_bytesio
+        return [await download_url_as_bytesio(response.image.url, timeout=timeout)]
+    return await download_urls_as_bytesio([data.url for data in response.data], timeout=timeout)
 
 
 def recraft_multipart_parser(
@@ -732,9 +728,7 @@ class RecraftTextToVectorNode(IO.ComfyNode):
             ),
             max_retries=1,
         )
-        svg_data = []
-        for data in response.data:
-            svg_data.append(await download_url_as_bytesio(data.url, timeout=1024))
+        svg_data = await download_urls_as_bytesio([data.url for data in response.data], timeout=1024)
 
         return IO.NodeOutput(SVG(svg_data))
 
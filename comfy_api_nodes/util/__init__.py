@@ -28,6 +28,8 @@ from .download_helpers import (
     download_url_to_bytesio,
     download_url_to_image_tensor,
     download_url_to_video_output,
+    download_urls_as_bytesio,
+    download_urls_to_image_tensor,
 )
 from .upload_helpers import (
     upload_audio_to_comfyapi,
@@ -67,6 +69,8 @@ __all__ = [
     "download_url_to_bytesio",
     "download_url_to_image_tensor",
     "download_url_to_video_output",
+    "download_urls_as_bytesio",
+    "download_urls_to_image_tensor",
     # Conversions
     "audio_bytes_to_audio_input",
     "audio_input_to_mp3",
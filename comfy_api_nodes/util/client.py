@@ -28,6 +28,7 @@ from ._helpers import (
     sleep_with_interrupt,
 )
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
+from .sessions import get_session
 
 M = TypeVar("M", bound=BaseModel)
 
@@ -465,18 +466,18 @@ async def _diagnose_connectivity() -> dict[str, bool]:
         "api_accessible": False,
     }
     timeout = aiohttp.ClientTimeout(total=5.0)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        with contextlib.suppress(ClientError, OSError):
-            async with session.get("https://www.google.com") as resp:
-                results["internet_accessible"] = resp.status < 500
-        if not results["internet_accessible"]:
-            return results
-
-        parsed = urlparse(default_base_url())
-        health_url = f"{parsed.scheme}://{parsed.netloc}/health"
-        with contextlib.suppress(ClientError, OSError):
-            async with session.get(health_url) as resp:
-                results["api_accessible"] = resp.status < 500
+    session = get_session()
+    with contextlib.suppress(ClientError, OSError, asyncio.TimeoutError):
+        async with session.get("https://www.google.com", timeout=timeout) as resp:
+            results["internet_accessible"] = resp.status < 500
+    if not results["internet_accessible"]:
+        return results
+
+    parsed = urlparse(default_base_url())
+    health_url = f"{parsed.scheme}://{parsed.netloc}/health"
+    with contextlib.suppress(ClientError, OSError, asyncio.TimeoutError):
+        async with session.get(health_url, timeout=timeout) as resp:
+            results["api_accessible"] = resp.status < 500
     return results
 
 
@@ -593,7 +594,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
         attempt += 1
         stop_event = asyncio.Event()
         monitor_task: asyncio.Task | None = None
-        sess: aiohttp.ClientSession | None = None
 
         operation_id = _generate_operation_id(method, cfg.endpoint.path, attempt)
         logging.debug("[DEBUG] HTTP %s %s (attempt %d)", method, url, attempt)
@@ -613,7 +613,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task = asyncio.create_task(_monitor(stop_event, start_time))
 
             timeout = aiohttp.ClientTimeout(total=cfg.timeout)
-            sess = aiohttp.ClientSession(timeout=timeout)
+            sess = get_session()
 
             if cfg.content_type == "multipart/form-data" and method != "GET":
                 # aiohttp will set Content-Type boundary; remove any fixed Content-Type
@@ -665,7 +665,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             except Exception as _log_e:
                 logging.debug("[DEBUG] request logging failed: %s", _log_e)
 
-            req_coro = sess.request(method, url, params=params, **payload_kw)
+            req_coro = sess.request(method, url, params=params, timeout=timeout, **payload_kw)
             req_task = asyncio.create_task(req_coro)
 
             # Race: request vs. monitor (interruption)
@@ -869,9 +869,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
             if operation_succeeded and cfg.monitor_progress and cfg.final_label_on_success:
                 _display_time_progress(
                     cfg.node_cls,
@@ -23,6 +23,7 @@ from ._helpers import (
 from .client import _diagnose_connectivity
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
 from .conversions import bytesio_to_image_tensor
+from .sessions import DEFAULT_CONCURRENCY, gather_bounded, get_session
 
 _RETRY_STATUS = {408, 429, 500, 502, 503, 504}
 
@@ -71,7 +72,6 @@ async def download_url_to_bytesio(
 
         is_path_sink = isinstance(dest, (str, Path))
         fhandle = None
-        session: aiohttp.ClientSession | None = None
         stop_evt: asyncio.Event | None = None
         monitor_task: asyncio.Task | None = None
         req_task: asyncio.Task | None = None
@@ -80,7 +80,7 @@ async def download_url_to_bytesio(
             with contextlib.suppress(Exception):
                 request_logger.log_request_response(operation_id=op_id, request_method="GET", request_url=url)
 
-            session = aiohttp.ClientSession(timeout=timeout_cfg)
+            session = get_session()
             stop_evt = asyncio.Event()
 
             async def _monitor():
@@ -94,7 +94,7 @@ async def download_url_to_bytesio(
 
             monitor_task = asyncio.create_task(_monitor())
 
-            req_task = asyncio.create_task(session.get(url, headers=headers))
+            req_task = asyncio.create_task(session.get(url, headers=headers, timeout=timeout_cfg))
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
 
             if monitor_task in done and req_task in pending:
@@ -207,9 +207,6 @@ async def download_url_to_bytesio(
                 req_task.cancel()
                 with contextlib.suppress(Exception):
                     await req_task
-            if session:
-                with contextlib.suppress(Exception):
-                    await session.close()
             if fhandle:
                 with contextlib.suppress(Exception):
                     fhandle.flush()
@@ -228,6 +225,20 @@ async def download_url_to_image_tensor(
     return bytesio_to_image_tensor(result)
 
 
+async def download_urls_to_image_tensor(
+    urls: list[str],
+    *,
+    timeout: float = None,
+    cls: type[COMFY_IO.ComfyNode] = None,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
+) -> torch.Tensor:
+    """Downloads several images concurrently and returns them as one [B, H, W, C] tensor, in the order of `urls`."""
+    images = await gather_bounded(
+        (download_url_to_image_tensor(url, timeout=timeout, cls=cls) for url in urls), max_concurrency
+    )
+    return torch.cat(images)
+
+
 async def download_url_to_video_output(
     video_url: str,
     *,
@@ -253,6 +264,19 @@ async def download_url_as_bytesio(
     return result
 
 
+async def download_urls_as_bytesio(
+    urls: list[str],
+    *,
+    timeout: float = None,
+    cls: type[COMFY_IO.ComfyNode] = None,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
+) -> list[BytesIO]:
+    """Downloads several URLs concurrently and returns a BytesIO (rewound to 0) for each, in order."""
+    return await gather_bounded(
+        (download_url_as_bytesio(url, timeout=timeout, cls=cls) for url in urls), max_concurrency
+    )
+
+
 def _generate_operation_id(method: str, url: str, attempt: int) -> str:
     try:
         parsed = urlparse(url)
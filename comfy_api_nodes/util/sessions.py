@@ -0,0 +1,87 @@
+"""
+Pooled aiohttp sessions for the API nodes.
+
+Creating a ClientSession per request pays for a new connection pool, DNS lookup and TLS
+handshake every time, including on every poll of a long running task. get_session() returns
+one session per event loop instead, with keep-alive and a per-host connection limit, so
+requests to the same host reuse their connections. aiohttp sessions are bound to the loop
+that created them; the session of a loop that has since been closed is dropped the next
+time a session is requested.
+"""
+
+import asyncio
+import inspect
+import threading
+from collections.abc import Awaitable, Iterable
+from typing import TypeVar
+
+import aiohttp
+
+T = TypeVar("T")
+
+LIMIT_PER_HOST = 16
+LIMIT_TOTAL = 100
+KEEPALIVE_TIMEOUT = 60.0
+DNS_CACHE_TTL = 300
+DEFAULT_CONCURRENCY = 4
+
+_sessions: dict[int, tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+_lock = threading.Lock()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Returns the pooled session of the running event loop. Pass the timeout to each request."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for key, (other_loop, session) in list(_sessions.items()):
+            if other_loop.is_closed():
+                # Its connections died with the loop, just don't warn about the unclosed session
+                session.detach()
+                del _sessions[key]
+        entry = _sessions.get(id(loop))
+        if entry is not None and entry[0] is loop and not entry[1].closed:
+            return entry[1]
+        connector = aiohttp.TCPConnector(
+            limit=LIMIT_TOTAL,
+            limit_per_host=LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None))
+        _sessions[id(loop)] = (loop, session)
+        return session
+
+
+async def close_session() -> None:
+    """Closes the pooled session of the running event loop, if it has one."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _sessions.pop(id(loop), None)
+    if entry is not None and entry[0] is loop:
+        await entry[1].close()
+
+
+async def gather_bounded(aws: Iterable[Awaitable[T]], max_concurrency: int = DEFAULT_CONCURRENCY) -> list[T]:
+    """
+    Awaits the awaitables with at most max_concurrency of them running at once and returns
+    their results in order. The first exception cancels the ones still running and is raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    aws = list(aws)
+    tasks = [asyncio.ensure_future(run(aw)) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for aw in aws:
+            # Coroutines cancelled while waiting for their turn never started
+            if inspect.iscoroutine(aw) and inspect.getcoroutinestate(aw) == inspect.CORO_CREATED:
+                aw.close()
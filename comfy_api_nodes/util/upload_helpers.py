@@ -26,6 +26,7 @@ from .conversions import (
     audio_tensor_to_contiguous_ndarray,
     tensor_to_bytesio,
 )
+from .sessions import DEFAULT_CONCURRENCY, gather_bounded, get_session
 
 
 class UploadRequest(BaseModel):
@@ -49,19 +50,20 @@ async def upload_images_to_comfyapi(
     mime_type: str | None = None,
     wait_label: str | None = "Uploading",
     show_batch_index: bool = True,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
 ) -> list[str]:
     """
     Uploads images to ComfyUI API and returns download URLs.
     To upload multiple images, stack them in the batch dimension first.
+    Up to `max_concurrency` images are uploaded at once; the URLs are returned in batch order.
     """
     # if batched, try to upload each file if max_images is greater than 0
-    download_urls: list[str] = []
     is_batch = len(image.shape) > 3
     batch_len = image.shape[0] if is_batch else 1
     num_to_upload = min(batch_len, max_images)
     batch_start_ts = time.monotonic()
 
-    for idx in range(num_to_upload):
+    async def _upload(idx: int) -> str:
         tensor = image[idx] if is_batch else image
         img_io = tensor_to_bytesio(tensor, mime_type=mime_type)
 
@@ -69,9 +71,9 @@ async def upload_images_to_comfyapi(
         if wait_label and show_batch_index and num_to_upload > 1:
             effective_label = f"{wait_label} ({idx + 1}/{num_to_upload})"
 
-        url = await upload_file_to_comfyapi(cls, img_io, img_io.name, mime_type, effective_label, batch_start_ts)
-        download_urls.append(url)
-    return download_urls
+        return await upload_file_to_comfyapi(cls, img_io, img_io.name, mime_type, effective_label, batch_start_ts)
+
+    return await gather_bounded((_upload(idx) for idx in range(num_to_upload)), max_concurrency)
 
 
 async def upload_audio_to_comfyapi(
@@ -218,7 +220,6 @@ async def upload_file(
                 return
 
         monitor_task = asyncio.create_task(_monitor())
-        sess: aiohttp.ClientSession | None = None
         try:
             try:
                 request_logger.log_request_response(
@@ -232,8 +233,8 @@ async def upload_file(
             except Exception as e:
                 logging.debug("[DEBUG] upload request logging failed: %s", e)
 
-            sess = aiohttp.ClientSession(timeout=timeout)
-            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers)
+            sess = get_session()
+            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers, timeout=timeout)
             req_task = asyncio.create_task(req)
 
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
@@ -324,9 +325,6 @@ async def upload_file(
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
 
 
 def _generate_operation_id(method: str, url: str, attempt: int, op_uuid: str) -> str:
@@ -1,20 +1,35 @@
-import bisect
 import gc
+import hashlib
+import heapq
 import itertools
+import json
+import logging
+import math
+import os
 import psutil
+import threading
 import time
 import torch
-from typing import Sequence, Mapping, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, Mapping, Dict, NamedTuple
 from comfy_execution.graph import DynamicPrompt
 from abc import ABC, abstractmethod
 
 import nodes
+import comfy.utils
 
 from comfy_execution.graph_utils import is_link
 
 NODE_CLASS_CONTAINS_UNIQUE_ID: Dict[str, bool] = {}
 
 
+class CacheEntry(NamedTuple):
+    ui: dict
+    outputs: list
+
+
+
 def include_unique_id_in_input(class_type: str) -> bool:
     if class_type in NODE_CLASS_CONTAINS_UNIQUE_ID:
         return NODE_CLASS_CONTAINS_UNIQUE_ID[class_type]
@@ -154,6 +169,10 @@ class BasicCache:
         self.cache_key_set: CacheKeySet
         self.cache = {}
         self.subcaches = {}
+        self.persistent = None
+
+    def set_persistent_tier(self, persistent):
+        self.persistent = persistent
 
     async def set_prompt(self, dynprompt, node_ids, is_changed_cache):
         self.dynprompt = dynprompt
@@ -200,6 +219,8 @@ class BasicCache:
         assert self.initialized
         cache_key = self.cache_key_set.get_data_key(node_id)
         self.cache[cache_key] = value
+        if self.persistent is not None:
+            self.persistent.store(cache_key, value)
 
     def _get_immediate(self, node_id):
         if not self.initialized:
@@ -207,6 +228,12 @@ class BasicCache:
         cache_key = self.cache_key_set.get_data_key(node_id)
         if cache_key in self.cache:
             return self.cache[cache_key]
+        elif self.persistent is not None and cache_key is not None:
+            value = self.persistent.load(cache_key)
+            if value is not None:
+                # Promote to the in-memory tier so later touches don't go to disk
+                self.cache[cache_key] = value
+            return value
         else:
             return None
 
@@ -215,6 +242,7 @@ class BasicCache:
         subcache = self.subcaches.get(subcache_key, None)
         if subcache is None:
             subcache = BasicCache(self.key_class)
+            subcache.set_persistent_tier(self.persistent)
             self.subcaches[subcache_key] = subcache
         await subcache.set_prompt(self.dynprompt, children_ids, self.is_changed_cache)
         return subcache
@@ -349,13 +377,14 @@ class LRUCache(BasicCache):
         return self
 
 
-#Iterating the cache for usage analysis might be expensive, so if we trigger make sure
-#to take a chunk out to give breathing space on high-node / low-ram-per-node flows.
+#Eviction frees a chunk at a time so we don't trigger again on the very next
+#node on high-node / low-ram-per-node flows.
 
 RAM_CACHE_HYSTERESIS = 1.1
 
 #This is kinda in GB but not really. It needs to be non-zero for the below heuristic
-#and as long as Multi GB models dwarf this it will approximate OOM scoring OK
+#and as long as Multi GB models dwarf this it will approximate OOM scoring OK.
+#It is also the amount we assume an entry frees when we know nothing about it.
 
 RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
 
@@ -364,22 +393,143 @@ RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
 
 RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER = 1.3
 
+#CPU tensors are scored at a 50% discount for RAM usage as they are likely to
+#be high value intermediates
+
+RAM_CACHE_TENSOR_WEIGHT = 0.5
+
+def _ram_usage_identity(obj):
+    #Model patcher clones share their weights, so count the underlying module once
+    owner = getattr(obj, "patcher", obj)
+    for attr in ("model", "first_stage_model"):
+        inner = getattr(owner, attr, None)
+        if inner is not None:
+            return ("object", id(inner))
+    return ("object", id(obj))
+
+def scan_ram_usage(outputs):
+    """
+    Walks node outputs and returns {resource_id: (nbytes, score_weight)} for everything
+    that holds RAM. Tensors are identified by their storage so views and tensors shared
+    between entries are only counted once.
+    """
+    resources = {}
+    def scan(obj):
+        if obj is None:
+            return
+        if isinstance(obj, torch.Tensor):
+            if obj.device.type != 'cpu':
+                return
+            try:
+                storage = obj.untyped_storage()
+                resources[("tensor", storage.data_ptr())] = (storage.nbytes(), RAM_CACHE_TENSOR_WEIGHT)
+            except (NotImplementedError, RuntimeError):
+                resources[("object", id(obj))] = (obj.numel() * obj.element_size(), RAM_CACHE_TENSOR_WEIGHT)
+        elif isinstance(obj, (list, tuple)):
+            for x in obj:
+                scan(x)
+        elif isinstance(obj, dict):
+            for x in obj.values():
+                scan(x)
+        elif hasattr(obj, "get_ram_usage"):
+            resources[_ram_usage_identity(obj)] = (obj.get_ram_usage(), 1.0)
+    scan(outputs)
+    return resources
+
 class RAMPressureCache(LRUCache):
 
     def __init__(self, key_class):
         super().__init__(key_class, 0)
         self.timestamps = {}
+        #key -> (oom score usage, resource ids)
+        self.entry_usage = {}
+        #resource id -> [nbytes, number of entries referencing it]
+        self.resources = {}
+        #Max-heap on OOM score with lazy invalidation through heap_version
+        self.heap = []
+        self.heap_version = {}
+        self.heap_counter = itertools.count()
 
     def clean_unused(self):
         self._clean_subcaches()
 
+    def _account(self, key, value):
+        outputs = value.outputs if value is not None else None
+        ram_usage = RAM_CACHE_DEFAULT_RAM_USAGE
+        resource_ids = []
+        for resource_id, (nbytes, weight) in scan_ram_usage(outputs).items():
+            ram_usage += nbytes * weight
+            resource = self.resources.get(resource_id)
+            if resource is None:
+                self.resources[resource_id] = [nbytes, 1]
+            else:
+                resource[1] += 1
+            resource_ids.append(resource_id)
+        self.entry_usage[key] = (ram_usage, resource_ids)
+        self._push(key)
+
+    def _release(self, key):
+        """Forgets the accounting for an entry, returning the bytes no other entry still references."""
+        freed = 0
+        _, resource_ids = self.entry_usage.pop(key, (0, []))
+        for resource_id in resource_ids:
+            resource = self.resources[resource_id]
+            resource[1] -= 1
+            if resource[1] == 0:
+                freed += resource[0]
+                del self.resources[resource_id]
+        self.heap_version.pop(key, None)
+        return freed
+
+    def _push(self, key):
+        #The generation term is shared by every entry, so ordering by
+        #log(usage) - used_generation * log(multiplier) is stable as generations pass
+        ram_usage, _ = self.entry_usage[key]
+        priority = math.log(ram_usage) - self.used_generation.get(key, 0) * math.log(RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER)
+        version = next(self.heap_counter)
+        self.heap_version[key] = version
+        #In the case where we have no information on the node ram usage at all,
+        #break OOM score ties on the last touch timestamp
+        heapq.heappush(self.heap, (-priority, -self.timestamps.get(key, 0), version, key))
+        if len(self.heap) > 2 * len(self.entry_usage) + 64:
+            self.heap = [item for item in self.heap if self.heap_version.get(item[3]) == item[2]]
+            heapq.heapify(self.heap)
+
+    def _touch(self, key):
+        if key not in self.entry_usage:
+            return
+        self.timestamps[key] = time.time()
+        #Re-push with the new timestamp, the old heap item is invalidated lazily
+        self._push(key)
+
     def set(self, node_id, value):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
+        key = self.cache_key_set.get_data_key(node_id)
+        previous = self.cache.get(key, None)
+        self.timestamps[key] = time.time()
         super().set(node_id, value)
+        if previous is not value:
+            self._release(key)
+            self._account(key, value)
+        else:
+            self._touch(key)
 
     def get(self, node_id):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
-        return super().get(node_id)
+        key = self.cache_key_set.get_data_key(node_id)
+        value = super().get(node_id)
+        if value is not None and key not in self.entry_usage:
+            #Promoted from the persistent tier
+            self.timestamps[key] = time.time()
+            self._account(key, value)
+        else:
+            self._touch(key)
+        return value
+
+    def _pop_eviction_candidate(self):
+        while self.heap:
+            _, _, version, key = heapq.heappop(self.heap)
+            if self.heap_version.get(key) == version:
+                return key
+        return None
 
     def poll(self, ram_headroom):
         def _ram_gb():
@@ -388,36 +538,286 @@ class RAMPressureCache(LRUCache):
         if _ram_gb() > ram_headroom:
             return
         gc.collect()
-        if _ram_gb() > ram_headroom:
+        available = _ram_gb()
+        if available > ram_headroom:
             return
 
-        clean_list = []
-
-        for key, (outputs, _), in self.cache.items():
-            oom_score =  RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER ** (self.generation - self.used_generation[key])
-
-            ram_usage = RAM_CACHE_DEFAULT_RAM_USAGE
-            def scan_list_for_ram_usage(outputs):
-                nonlocal ram_usage
-                if outputs is None:
-                    return
-                for output in outputs:
-                    if isinstance(output, list):
-                        scan_list_for_ram_usage(output)
-                    elif isinstance(output, torch.Tensor) and output.device.type == 'cpu':
-                        #score Tensors at a 50% discount for RAM usage as they are likely to
-                        #be high value intermediates
-                        ram_usage += (output.numel() * output.element_size()) * 0.5
-                    elif hasattr(output, "get_ram_usage"):
-                        ram_usage += output.get_ram_usage()
-            scan_list_for_ram_usage(outputs)
-
-            oom_score *= ram_usage
-            #In the case where we have no information on the node ram usage at all,
-            #break OOM score ties on the last touch timestamp (pure LRU)
-            bisect.insort(clean_list, (oom_score, self.timestamps[key], key))
-
-        while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and clean_list:
-            _, _, key = clean_list.pop()
-            del self.cache[key]
+        #Files in the state dict cache that no node holds anymore go before any node output
+        if comfy.utils.state_dict_cache.trim() > 0:
+            gc.collect()
+            available = _ram_gb()
+            if available > ram_headroom:
+                return
+
+        while True:
+            needed = (ram_headroom * RAM_CACHE_HYSTERESIS - available) * (1024**3)
+            if needed <= 0:
+                break
+            freed = 0
+            evicted = False
+            while freed < needed:
+                key = self._pop_eviction_candidate()
+                if key is None:
+                    break
+                evicted = True
+                entry_freed = self._release(key)
+                freed += entry_freed if entry_freed > 0 else RAM_CACHE_DEFAULT_RAM_USAGE * (1024**3)
+                del self.cache[key]
+                self.timestamps.pop(key, None)
+            if not evicted:
+                break
             gc.collect()
+            available = _ram_gb()
+
+
+#The disk tier can't tell a cheap primitive from a multi-minute encode, so only
+#entries carrying at least one tensor are worth a file on disk.
+
+DISK_CACHE_FORMAT_VERSION = 1
+DISK_CACHE_SUFFIX = ".safetensors"
+#An entry taking more than this fraction of the cache would evict most of it, so it isn't written
+DISK_CACHE_MAX_ENTRY_FRACTION = 0.5
+DISK_CACHE_STALE_TMP_SECONDS = 3600
+
+class NotPersistable(Exception):
+    pass
+
+def stable_signature_digest(signature):
+    """
+    Hashes a signature built by to_hashable() in a way that is stable across processes.
+    Python's own hash() is salted per process, so it can't be used to name files.
+    Raises NotPersistable for signatures that must never match across runs (NaN IS_CHANGED
+    results, Unhashable inputs).
+    """
+    def encode(obj):
+        if obj is None:
+            return "N"
+        elif isinstance(obj, bool):
+            return "b" + ("1" if obj else "0")
+        elif isinstance(obj, int):
+            return "i" + str(obj)
+        elif isinstance(obj, float):
+            if math.isnan(obj):
+                raise NotPersistable()
+            return "f" + repr(obj)
+        elif isinstance(obj, str):
+            return "s" + json.dumps(obj)
+        elif isinstance(obj, bytes):
+            return "y" + obj.hex()
+        elif isinstance(obj, tuple):
+            return "(" + ",".join(encode(x) for x in obj) + ")"
+        elif isinstance(obj, frozenset):
+            return "{" + ",".join(sorted(encode(x) for x in obj)) + "}"
+        raise NotPersistable()
+
+    data = "v{}:{}".format(DISK_CACHE_FORMAT_VERSION, encode(signature))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def _pack_value(value, tensors, names):
+    if value is None or isinstance(value, (bool, int, str)):
+        return {"t": "v", "v": value}
+    elif isinstance(value, float):
+        if not math.isfinite(value):
+            raise NotPersistable()
+        return {"t": "v", "v": value}
+    elif isinstance(value, torch.Tensor):
+        name = names.get(id(value))
+        if name is None:
+            name = "t{}".format(len(tensors))
+            names[id(value)] = name
+            tensors[name] = value
+        return {"t": "tensor", "k": name}
+    elif isinstance(value, list):
+        return {"t": "list", "v": [_pack_value(x, tensors, names) for x in value]}
+    elif isinstance(value, tuple):
+        return {"t": "tuple", "v": [_pack_value(x, tensors, names) for x in value]}
+    elif isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value.keys()):
+            raise NotPersistable()
+        return {"t": "dict", "v": {k: _pack_value(v, tensors, names) for k, v in value.items()}}
+    # Models, VAEs, hooks, videos etc. only make sense inside the process that built them
+    raise NotPersistable()
+
+def _unpack_value(packed, tensors):
+    t = packed["t"]
+    if t == "v":
+        return packed["v"]
+    elif t == "tensor":
+        return tensors[packed["k"]]
+    elif t == "list":
+        return [_unpack_value(x, tensors) for x in packed["v"]]
+    elif t == "tuple":
+        return tuple(_unpack_value(x, tensors) for x in packed["v"])
+    elif t == "dict":
+        return {k: _unpack_value(v, tensors) for k, v in packed["v"].items()}
+    raise ValueError("Unknown disk cache value type {}".format(t))
+
+class DiskCache:
+    """
+    Second cache tier that spills serializable node outputs to a directory so that a fresh
+    process (or another container sharing the volume) can reuse them. Entries are keyed on the
+    CacheKeySetInputSignature data key and stored as safetensors files, which are memory-mapped
+    on load. The directory is kept under max_size bytes by evicting the least recently used files.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self.index = OrderedDict()
+        self.total_size = 0
+        self.digests = {}
+        # digest -> future of the entries queued for the writer thread
+        self.pending = {}
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(DISK_CACHE_SUFFIX):
+                    st = entry.stat()
+                    files.append((st.st_mtime, entry.name[:-len(DISK_CACHE_SUFFIX)], st.st_size))
+                elif entry.name.endswith(".tmp") and now - entry.stat().st_mtime > DISK_CACHE_STALE_TMP_SECONDS:
+                    # Left behind by a process that died mid-write; recent ones may still be in progress elsewhere
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        for _, digest, size in sorted(files):
+            self.index[digest] = size
+            self.total_size += size
+        logging.info("Disk cache at {} holds {} entries ({:.2f} GB)".format(self.directory, len(self.index), self.total_size / (1024**3)))
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + DISK_CACHE_SUFFIX)
+
+    def _digest(self, cache_key):
+        if cache_key in self.digests:
+            return self.digests[cache_key]
+        try:
+            digest = stable_signature_digest(cache_key)
+        except NotPersistable:
+            digest = None
+        #Signatures are large; don't let the memo grow without bound in long-lived processes
+        if len(self.digests) > 4096:
+            self.digests.clear()
+        self.digests[cache_key] = digest
+        return digest
+
+    def _forget(self, digest):
+        size = self.index.pop(digest, None)
+        if size is not None:
+            self.total_size -= size
+
+    def _evict(self):
+        while self.total_size > self.max_size and len(self.index) > 0:
+            digest, size = self.index.popitem(last=False)
+            self.total_size -= size
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def load(self, cache_key):
+        digest = self._digest(cache_key)
+        if digest is None:
+            return None
+        path = self._path(digest)
+        with self.lock:
+            if digest not in self.index and not os.path.exists(path):
+                return None
+            try:
+                sd, metadata = comfy.utils.load_torch_file(path, return_metadata=True)
+                layout = json.loads(metadata["layout"])
+                value = CacheEntry(ui=None, outputs=_unpack_value(layout, sd))
+            except Exception as e:
+                logging.warning("Dropping unreadable disk cache entry {}: {}".format(path, e))
+                self._forget(digest)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                return None
+            if digest not in self.index:
+                # Written by another process sharing the directory
+                self.index[digest] = os.path.getsize(path)
+                self.total_size += self.index[digest]
+            self.index.move_to_end(digest)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return value
+
+    def store(self, cache_key, value):
+        # Entries with UI output reference files that may not exist in another container
+        if value is None or getattr(value, "ui", None) is not None or value.outputs is None:
+            return
+        digest = self._digest(cache_key)
+        if digest is None:
+            return
+        with self.lock:
+            if digest in self.index or digest in self.pending:
+                return
+            if os.path.exists(self._path(digest)):
+                return
+            tensors = {}
+            try:
+                layout = _pack_value(value.outputs, tensors, {})
+            except NotPersistable:
+                return
+            if len(tensors) == 0:
+                return
+            size = sum(t.nbytes for t in tensors.values())
+            if size > self.max_size * DISK_CACHE_MAX_ENTRY_FRACTION:
+                logging.debug("Not writing {:.2f} MB disk cache entry {}, too large for the cache".format(size / (1024**2), digest))
+                return
+            # The device to host copy and the write happen off the executor thread
+            self.pending[digest] = self._get_writer().submit(self._write, digest, layout, tensors)
+
+    def _get_writer(self):
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comfy_disk_cache")
+        return self.writer
+
+    def _write(self, digest, layout, tensors):
+        path = self._path(digest)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            seen_storage = set()
+            for name, tensor in tensors.items():
+                tensor = tensor.detach().to("cpu").contiguous()
+                ptr = tensor.untyped_storage().data_ptr()
+                if ptr in seen_storage:
+                    tensor = tensor.clone()
+                seen_storage.add(ptr)
+                tensors[name] = tensor
+            comfy.utils.save_torch_file(tensors, tmp_path, metadata={"layout": json.dumps(layout)})
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning("Failed to write disk cache entry {}: {}".format(path, e))
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            with self.lock:
+                self.pending.pop(digest, None)
+            return
+        with self.lock:
+            self.pending.pop(digest, None)
+            if digest not in self.index:
+                self.index[digest] = os.path.getsize(path)
+                self.total_size += self.index[digest]
+            self._evict()
+
+    def flush(self):
+        """Waits for the entries queued by store() to be written."""
+        with self.lock:
+            pending = list(self.pending.values())
+        for future in pending:
+            future.result()
@@ -6,6 +6,7 @@ import asyncio
 import inspect
 from comfy_execution.graph_utils import is_link, ExecutionBlocker
 from comfy.comfy_types.node_typing import ComfyNodeABC, InputTypeDict, InputTypeOptions
+from comfy.cli_args import args
 
 # NOTE: ExecutionBlocker code got moved to graph_utils.py to prevent torch being imported too soon during unit tests
 ExecutionBlocker = ExecutionBlocker
@@ -276,9 +277,12 @@ class ExecutionList(TopologicalSort):
 
         # If an available node is async, do that first.
         # This will execute the asynchronous function earlier, reducing the overall time.
+        # Thread safe nodes are dispatched to worker threads when enabled, so they count as async too.
         def is_async(node_id):
             class_type = self.dynprompt.get_node(node_id)["class_type"]
             class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
+            if args.parallel_cpu_nodes > 0 and getattr(class_def, "THREAD_SAFE", False) == True:
+                return True
             return inspect.iscoroutinefunction(getattr(class_def, class_def.FUNCTION))
 
         for node_id in node_list:
@@ -3,6 +3,8 @@ Job utilities for the /api/jobs endpoint.
 Provides normalization and helper functions for job status tracking.
 """
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from comfy_api.internal import prune_dict
@@ -24,6 +26,44 @@ PREVIEWABLE_MEDIA_TYPES = frozenset({'images', 'video', 'audio'})
 # 3D file extensions for preview fallback (no dedicated media_type exists)
 THREE_D_EXTENSIONS = frozenset({'.obj', '.fbx', '.gltf', '.glb'})
 
+# Fields of the job dict returned for list views
+JOB_SUMMARY_FIELDS = frozenset({
+    'id', 'status', 'priority', 'create_time', 'execution_start_time', 'execution_end_time',
+    'execution_error', 'outputs_count', 'preview_output', 'workflow_id',
+})
+
+
+def get_job_store():
+    """Return the database job store module, or None if the database is not available."""
+    try:
+        from app.database.db import can_create_session
+        if not can_create_session():
+            return None
+        from app.database import job_store
+        return job_store
+    except Exception:
+        return None
+
+
+_job_store_executor = None
+
+def get_job_store_executor():
+    """
+    Single thread that runs every job store query in submission order, so the prompt queue and
+    the event loop never wait on the database and a read always sees the writes queued before it.
+    """
+    global _job_store_executor
+    if _job_store_executor is None:
+        _job_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comfy_job_store")
+    return _job_store_executor
+
+
+def _write_job_store(description, func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logging.warning("Failed to {} in the database".format(description), exc_info=True)
+
 
 def _extract_job_metadata(extra_data: dict) -> tuple[Optional[int], Optional[str]]:
     """Extract create_time and workflow_id from extra_data.
@@ -184,10 +224,7 @@ def get_outputs_summary(outputs: dict) -> tuple[int, Optional[dict]]:
     return count, preview_output or fallback_preview
 
 
-def apply_sorting(jobs: list[dict], sort_by: str, sort_order: str) -> list[dict]:
-    """Sort jobs list by specified field and order."""
-    reverse = (sort_order == 'desc')
-
+def _get_sort_key_function(sort_by: str):
     if sort_by == 'execution_duration':
         def get_sort_key(job):
             start = job.get('execution_start_time', 0)
@@ -196,11 +233,73 @@ def apply_sorting(jobs: list[dict], sort_by: str, sort_order: str) -> list[dict]
     else:
         def get_sort_key(job):
             return job.get('create_time', 0)
+    return get_sort_key
+
+
+def apply_sorting(jobs: list[dict], sort_by: str, sort_order: str) -> list[dict]:
+    """Sort jobs list by specified field and order."""
+    reverse = (sort_order == 'desc')
+    return sorted(jobs, key=_get_sort_key_function(sort_by), reverse=reverse)
+
+
+def history_item_to_job_record(prompt_id: str, history_item: dict) -> dict:
+    """Convert a history item to the column values stored by the job store."""
+    job = normalize_history_item(prompt_id, history_item)
+    _, _, prompt, extra_data, outputs_to_execute = history_item['prompt']
+    return {
+        'number': job.get('priority'),
+        'status': job['status'],
+        'workflow_id': job.get('workflow_id'),
+        'create_time': job.get('create_time'),
+        'execution_start_time': job.get('execution_start_time'),
+        'execution_end_time': job.get('execution_end_time'),
+        'execution_duration': _get_sort_key_function('execution_duration')(job),
+        'execution_error': job.get('execution_error'),
+        'outputs_count': job['outputs_count'],
+        'preview_output': job.get('preview_output'),
+        'prompt': prompt,
+        'extra_data': extra_data,
+        'outputs_to_execute': outputs_to_execute,
+        'outputs': history_item.get('outputs', {}),
+        'execution_status': history_item.get('status'),
+        'meta': history_item.get('meta'),
+    }
+
+
+def save_history_item(prompt_id: str, history_item: dict):
+    """Queue a finished job to be written to the job store, if the database is available."""
+    job_store = get_job_store()
+    if job_store is None:
+        return
+    record = history_item_to_job_record(prompt_id, history_item)
+    get_job_store_executor().submit(_write_job_store, "save job {}".format(prompt_id), job_store.save_job, prompt_id, record)
+
+
+def delete_history_items(prompt_id: Optional[str] = None):
+    """Queue the deletion of one job, or of every job if prompt_id is None, from the job store."""
+    job_store = get_job_store()
+    if job_store is None:
+        return
+    if prompt_id is None:
+        get_job_store_executor().submit(_write_job_store, "delete all jobs", job_store.delete_all_jobs)
+    else:
+        get_job_store_executor().submit(_write_job_store, "delete job {}".format(prompt_id), job_store.delete_job, prompt_id)
+
+
+def _job_from_record(record: dict, include_outputs: bool = False) -> dict:
+    job = prune_dict({k: v for k, v in record.items() if k in JOB_SUMMARY_FIELDS})
+    if include_outputs:
+        job['outputs'] = record['outputs'] or {}
+        job['execution_status'] = record['execution_status']
+        job['workflow'] = {
+            'prompt': record['prompt'],
+            'extra_data': record['extra_data'],
+        }
+    return job
 
-    return sorted(jobs, key=get_sort_key, reverse=reverse)
 
 
-def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optional[dict]:
+def get_job(prompt_id: str, running: list, queued: list, history: dict, job_store=None) -> Optional[dict]:
     """
     Get a single job by prompt_id from history or queue.
 
@@ -209,6 +308,7 @@ def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optio
         running: List of currently running queue items
         queued: List of pending queue items
         history: Dict of history items keyed by prompt_id
+        job_store: Optional job store to look up jobs that are no longer in history
 
     Returns:
         Job dict with full details, or None if not found
@@ -224,6 +324,11 @@ def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optio
         if item[1] == prompt_id:
             return normalize_queue_item(item, JobStatus.PENDING)
 
+    if job_store is not None:
+        record = job_store.get_job_record(prompt_id)
+        if record is not None:
+            return _job_from_record(record, include_outputs=True)
+
     return None
 
 
@@ -236,7 +341,8 @@ def get_all_jobs(
     sort_by: str = "created_at",
     sort_order: str = "desc",
     limit: Optional[int] = None,
-    offset: int = 0
+    offset: int = 0,
+    job_store=None
 ) -> tuple[list[dict], int]:
     """
     Get all jobs (running, pending, completed) with filtering and sorting.
@@ -251,6 +357,7 @@ def get_all_jobs(
         sort_order: 'asc' or 'desc'
         limit: Maximum number of items to return
         offset: Number of items to skip
+        job_store: Optional job store to query completed and failed jobs from instead of history
 
     Returns:
         tuple: (jobs_list, total_count)
@@ -260,6 +367,10 @@ def get_all_jobs(
     if status_filter is None:
         status_filter = JobStatus.ALL
 
+    if job_store is not None:
+        return _get_all_jobs_from_store(running, queued, job_store, status_filter, workflow_id,
+                                        sort_by, sort_order, limit, offset)
+
     if JobStatus.IN_PROGRESS in status_filter:
         for item in running:
             jobs.append(normalize_queue_item(item, JobStatus.IN_PROGRESS))
@@ -289,3 +400,61 @@ def get_all_jobs(
         jobs = jobs[:limit]
 
     return (jobs, total_count)
+
+
+def _get_all_jobs_from_store(running, queued, job_store, status_filter, workflow_id, sort_by, sort_order, limit, offset):
+    """
+    get_all_jobs for finished jobs kept in the job store.
+
+    The store returns finished jobs already filtered and sorted, so only the rows that can
+    land on the requested page are fetched and merged with the in-memory queue.
+    """
+    queue_jobs = []
+    if JobStatus.IN_PROGRESS in status_filter:
+        queue_jobs += [normalize_queue_item(item, JobStatus.IN_PROGRESS) for item in running]
+    if JobStatus.PENDING in status_filter:
+        queue_jobs += [normalize_queue_item(item, JobStatus.PENDING) for item in queued]
+    if workflow_id:
+        queue_jobs = [j for j in queue_jobs if j.get('workflow_id') == workflow_id]
+    queue_jobs = apply_sorting(queue_jobs, sort_by, sort_order)
+
+    statuses = [s for s in (JobStatus.COMPLETED, JobStatus.FAILED) if s in status_filter]
+    stored_total = job_store.count_jobs(statuses, workflow_id) if statuses else 0
+    total_count = len(queue_jobs) + stored_total
+
+    # Stored jobs ranked before offset - len(queue_jobs) are before the page whatever
+    # the queue contains, so they are skipped in the query.
+    skip = min(max(0, offset - len(queue_jobs)), stored_total)
+    end = None if limit is None else offset + limit
+    stored_jobs = []
+    if statuses and (end is None or end > skip):
+        stored_jobs = job_store.list_jobs(statuses, workflow_id, sort_by, sort_order, skip,
+                                          None if end is None else end - skip)
+        stored_jobs = [prune_dict(job) for job in stored_jobs]
+
+    get_sort_key = _get_sort_key_function(sort_by)
+    if sort_order == 'desc':
+        queue_first = lambda q, s: get_sort_key(q) >= get_sort_key(s)
+    else:
+        queue_first = lambda q, s: get_sort_key(q) <= get_sort_key(s)
+
+    jobs = []
+    i_queue = 0
+    i_stored = 0
+    while i_queue < len(queue_jobs) or i_stored < len(stored_jobs):
+        rank = skip + i_queue + i_stored
+        if i_stored >= len(stored_jobs) or (i_queue < len(queue_jobs) and queue_first(queue_jobs[i_queue], stored_jobs[i_stored])):
+            job = queue_jobs[i_queue]
+            i_queue += 1
+            # Queue jobs ahead of the first fetched stored job rank before offset
+            if skip > 0 and i_stored == 0:
+                continue
+        else:
+            job = stored_jobs[i_stored]
+            i_stored += 1
+        if end is not None and rank >= end:
+            break
+        if rank >= offset:
+            jobs.append(job)
+
+    return (jobs, total_count)
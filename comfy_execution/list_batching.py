@@ -0,0 +1,188 @@
+"""
+Batched execution of list inputs.
+
+When a node receives lists, the executor normally calls it once per list element. Nodes that
+declare BATCH_LIST_INPUTS (V1) or batch_list_inputs (V3 schema) name the inputs that can be
+stacked along the batch dimension instead, so the executor can call them once for the whole
+list and split the outputs back into one result per element.
+
+Supported values are tensors (IMAGE, MASK, ...), latents that only carry "samples", and
+conditioning. Every other input has to be the same for all elements, otherwise the executor
+falls back to calling the node per element. Nodes with list outputs or that can expand into a
+subgraph are never batched, and a batched output that can't be split is an error: the node has
+already run on the whole batch and isn't run again.
+"""
+
+from typing import Any, Optional
+
+import torch
+
+
+def _same(a, b) -> bool:
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _is_latent(value) -> bool:
+    return isinstance(value, dict) and set(value.keys()) == {"samples"} and isinstance(value["samples"], torch.Tensor)
+
+
+def _is_conditioning(value) -> bool:
+    return (isinstance(value, list) and len(value) > 0
+            and all(isinstance(c, (list, tuple)) and len(c) == 2 and isinstance(c[0], torch.Tensor) and isinstance(c[1], dict) for c in value))
+
+
+def batch_size(value) -> Optional[int]:
+    """Returns the batch size of a stackable value, or None if it can't be stacked."""
+    if isinstance(value, torch.Tensor):
+        return value.shape[0] if value.ndim > 0 else None
+    if _is_latent(value):
+        return batch_size(value["samples"])
+    if _is_conditioning(value):
+        sizes = {c[0].shape[0] for c in value}
+        return sizes.pop() if len(sizes) == 1 else None
+    return None
+
+
+def _cat(tensors: list[torch.Tensor]) -> Optional[torch.Tensor]:
+    first = tensors[0]
+    if any(t.shape[1:] != first.shape[1:] or t.dtype != first.dtype or t.device != first.device for t in tensors):
+        return None
+    return torch.cat(tensors, dim=0)
+
+
+def _stack_options(options: list[dict], sizes: list[int]) -> Optional[dict]:
+    keys = options[0].keys()
+    if any(o.keys() != keys for o in options):
+        return None
+    out = {}
+    for k in keys:
+        values = [o[k] for o in options]
+        if all(isinstance(v, torch.Tensor) and v.ndim > 0 and v.shape[0] == s for v, s in zip(values, sizes)):
+            stacked = _cat(values)
+            if stacked is None:
+                return None
+            out[k] = stacked
+        elif all(_same(values[0], v) for v in values[1:]):
+            out[k] = values[0]
+        else:
+            return None
+    return out
+
+
+def stack(values: list, sizes: list[int]) -> Optional[Any]:
+    """Stacks the values of one input along the batch dimension, returns None if they are not compatible."""
+    first = values[0]
+    if isinstance(first, torch.Tensor):
+        if not all(isinstance(v, torch.Tensor) for v in values):
+            return None
+        return _cat(values)
+    if _is_latent(first):
+        if not all(_is_latent(v) for v in values):
+            return None
+        samples = _cat([v["samples"] for v in values])
+        return None if samples is None else {"samples": samples}
+    if _is_conditioning(first):
+        if not all(_is_conditioning(v) and len(v) == len(first) for v in values):
+            return None
+        out = []
+        for entries in zip(*values):
+            cond = _cat([c[0] for c in entries])
+            options = _stack_options([c[1] for c in entries], sizes)
+            if cond is None or options is None:
+                return None
+            out.append([cond, options])
+        return out
+    return None
+
+
+def split(value, sizes: list[int]) -> Optional[list]:
+    """
+    Splits an output of a batched call into one value per list element. Values that are not
+    batched are repeated for each element, None is returned if the batch size doesn't match.
+    """
+    total = sum(sizes)
+    if isinstance(value, torch.Tensor) and value.ndim > 0:
+        # Outputs can have a fixed number of rows per input row, like the frames of a decoded video latent
+        if total == 0 or value.shape[0] % total != 0:
+            return None
+        rows = value.shape[0] // total
+        return list(torch.split(value, [s * rows for s in sizes], dim=0))
+    if isinstance(value, dict) and isinstance(value.get("samples"), torch.Tensor):
+        samples = split(value["samples"], sizes)
+        if samples is None:
+            return None
+        # Other keys such as noise_mask or batch_index describe the whole batch
+        return [{"samples": s} for s in samples]
+    if _is_conditioning(value):
+        entries = []
+        for cond, options in value:
+            conds = split(cond, sizes)
+            if conds is None:
+                return None
+            split_options = [{} for _ in sizes]
+            for k, v in options.items():
+                parts = split(v, sizes) if isinstance(v, torch.Tensor) and v.ndim > 0 and v.shape[0] == total else None
+                for i, o in enumerate(split_options):
+                    o[k] = v if parts is None else parts[i]
+            entries.append([[c, o] for c, o in zip(conds, split_options)])
+        return [[e[i] for e in entries] for i in range(len(sizes))]
+    return [value] * len(sizes)
+
+
+def outputs_can_be_split(obj) -> bool:
+    """Whether the declared outputs of a node allow splitting the result of a batched call, checked before it runs."""
+    if any(getattr(obj, "OUTPUT_IS_LIST", None) or ()):
+        return False
+    schema = getattr(obj, "SCHEMA", None)
+    if schema is not None and getattr(schema, "enable_expand", False):
+        return False
+    return True
+
+
+def stack_list_inputs(input_data_all: dict, batch_inputs, count: int):
+    """
+    Builds the inputs for a single batched call from per element input lists.
+
+    Returns (inputs, sizes) with the batch size each element contributed, or None when the
+    elements can't be batched.
+    """
+    per_element = {}
+    for k, v in input_data_all.items():
+        values = [v[i if len(v) > i else -1] for i in range(count)]
+        if k in batch_inputs:
+            per_element[k] = values
+        elif not all(_same(values[0], x) for x in values[1:]):
+            return None
+
+    if len(per_element) == 0:
+        return None
+
+    sizes = None
+    for values in per_element.values():
+        value_sizes = [batch_size(x) for x in values]
+        if None in value_sizes or (sizes is not None and value_sizes != sizes):
+            return None
+        sizes = value_sizes
+
+    inputs = {k: v[0] for k, v in input_data_all.items() if k not in per_element}
+    for k, values in per_element.items():
+        stacked = stack(values, sizes)
+        if stacked is None:
+            return None
+        inputs[k] = stacked
+    return inputs, sizes
+
+
+def split_outputs(result, sizes: list[int]) -> Optional[list[tuple]]:
+    """Splits the return value of a batched call into one result tuple per element, or None."""
+    if not isinstance(result, (tuple, list)):
+        return None
+    outputs = [split(value, sizes) for value in result]
+    if any(o is None for o in outputs):
+        return None
+    return [tuple(o[i] for o in outputs) for i in range(len(sizes))]
@@ -0,0 +1,128 @@
+"""
+Lookahead model loading driven by the execution graph.
+
+Before a node runs, the executor collects the models (MODEL, CLIP, VAE, ...) in the already
+computed inputs of the nodes that are still pending. They are passed to comfy.model_management
+as "needed later" hints so free_memory unloads other models first, and with --prefetch-models the
+ones the running node doesn't use are loaded into free VRAM on a background thread meanwhile.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import comfy.model_management
+from comfy.model_patcher import ModelPatcher
+from comfy_execution.graph_utils import is_link
+
+# Seconds the prefetch waits for the running node to load its own models before it starts
+PREFETCH_START_TIMEOUT = 30.0
+
+_prefetch_pool = None
+
+def get_prefetch_pool():
+    global _prefetch_pool
+    if _prefetch_pool is None:
+        _prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comfy_prefetch")
+    return _prefetch_pool
+
+
+def get_models(value) -> list[ModelPatcher]:
+    """Returns the model patchers held by a node output value."""
+    if isinstance(value, ModelPatcher):
+        return [value]
+    patcher = getattr(value, "patcher", None)
+    if isinstance(patcher, ModelPatcher):
+        return [patcher]
+    return []
+
+
+def _add_unique(models, new_models):
+    for m in new_models:
+        if not any(m is x for x in models):
+            models.append(m)
+
+
+def get_node_models(execution_list, node_id) -> list[ModelPatcher]:
+    """Returns the models in the inputs of a node that have already been computed."""
+    node = execution_list.dynprompt.get_node(node_id)
+    linked = execution_list.execution_cache.get(node_id, {})
+    models = []
+    for value in node["inputs"].values():
+        if not is_link(value):
+            continue
+        cached = linked.get(value[0])
+        if cached is None or cached.outputs is None or value[1] >= len(cached.outputs):
+            continue
+        for output in cached.outputs[value[1]]:
+            _add_unique(models, get_models(output))
+    return models
+
+
+class ModelPrefetcher:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.future = None
+        self.cancelled = None
+
+    def plan(self, execution_list, node_id):
+        """
+        Returns the models used by node_id and the models used by the other pending nodes, with
+        the models of the nodes that are ready to run first.
+        """
+        pending = [n for n in execution_list.get_ready_nodes() if n != node_id]
+        pending += [n for n in execution_list.pendingNodes if n != node_id and n not in pending]
+        later = []
+        for n in pending:
+            _add_unique(later, get_node_models(execution_list, n))
+        return get_node_models(execution_list, node_id), later
+
+    def before_node(self, execution_list, node_id):
+        current, later = self.plan(execution_list, node_id)
+        comfy.model_management.set_models_needed_later(later)
+        if not self.enabled:
+            return
+        to_load = [m for m in later if not any(m.is_clone(x) for x in current)]
+        if len(to_load) > 0:
+            self.cancelled = threading.Event()
+            self.future = get_prefetch_pool().submit(self._prefetch, current, to_load, self.cancelled)
+
+    def _prefetch(self, current, models, cancelled):
+        # Let the running node load its own models first, they take priority over the free memory
+        with comfy.model_management.models_loaded_condition:
+            comfy.model_management.models_loaded_condition.wait_for(lambda: cancelled.is_set() or all(comfy.model_management.is_model_loaded(m) for m in current), timeout=PREFETCH_START_TIMEOUT)
+        if cancelled.is_set():
+            return
+        device = models[0].load_device
+        stream = None
+        if device.type == "cuda":
+            stream = torch.cuda.Stream(device)
+        try:
+            with torch.inference_mode():
+                if stream is not None:
+                    with torch.cuda.stream(stream):
+                        count = comfy.model_management.prefetch_models(models)
+                    stream.synchronize()
+                else:
+                    count = comfy.model_management.prefetch_models(models)
+            if count > 0:
+                logging.debug("Prefetched {} models".format(count))
+        except Exception as e:
+            logging.warning("Model prefetch failed: {}".format(e))
+
+    def wait(self):
+        """Waits for the prefetch started by before_node, called when the node is done."""
+        if self.future is None:
+            return
+        self.cancelled.set()
+        with comfy.model_management.models_loaded_condition:
+            comfy.model_management.models_loaded_condition.notify_all()
+        self.future.result()
+        self.future = None
+        self.cancelled = None
+
+    def finish(self):
+        self.wait()
+        comfy.model_management.set_models_needed_later([])
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import contextvars
+import threading
 from typing import TypedDict, Dict, Optional, Tuple
 from typing_extensions import override
 from PIL import Image
@@ -319,18 +321,29 @@ class ProgressRegistry:
         for handler in self.handlers.values():
             handler.reset()
 
-# Global registry instance
+# Registry of the prompt running in the current context. Each prompt worker runs its prompt in
+# its own asyncio context, so concurrent prompts don't see each other's progress.
+current_progress_registry: contextvars.ContextVar[ProgressRegistry | None] = contextvars.ContextVar("current_progress_registry", default=None)
+
+# Last registry created by each prompt worker thread, so it can be reset by the next prompt
+worker_progress_registry = threading.local()
+
+# Global registry instance, used outside of prompt execution
 global_progress_registry: ProgressRegistry | None = None
 
 def reset_progress_state(prompt_id: str, dynprompt: "DynamicPrompt") -> None:
     global global_progress_registry
 
     # Reset existing handlers if registry exists
-    if global_progress_registry is not None:
-        global_progress_registry.reset_handlers()
+    registry = getattr(worker_progress_registry, "registry", None)
+    if registry is not None:
+        registry.reset_handlers()
 
     # Create new registry
-    global_progress_registry = ProgressRegistry(prompt_id, dynprompt)
+    registry = ProgressRegistry(prompt_id, dynprompt)
+    worker_progress_registry.registry = registry
+    current_progress_registry.set(registry)
+    global_progress_registry = registry
 
 
 def add_progress_handler(handler: ProgressHandler) -> None:
@@ -341,6 +354,9 @@ def add_progress_handler(handler: ProgressHandler) -> None:
 
 def get_progress_state() -> ProgressRegistry:
     global global_progress_registry
+    registry = current_progress_registry.get()
+    if registry is not None:
+        return registry
     if global_progress_registry is None:
         from comfy_execution.graph import DynamicPrompt
 
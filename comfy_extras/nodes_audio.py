@@ -265,6 +265,7 @@ class LoadAudio(IO.ComfyNode):
                 IO.Combo.Input("audio", upload=IO.UploadType.audio, options=sorted(files)),
             ],
             outputs=[IO.Audio.Output()],
+            is_thread_safe=True,
         )
 
     @classmethod
@@ -1,10 +1,13 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Union
+from collections import OrderedDict
 from comfy_api.latest import io, ComfyExtension
 import comfy.patcher_extension
 import logging
 import torch
 import comfy.model_patcher
+import comfy.ldm.flux.model
+import comfy.ldm.wan.model
 if TYPE_CHECKING:
     from uuid import UUID
 
@@ -490,11 +493,280 @@ class LazyCacheNode(io.ComfyNode):
         return io.NodeOutput(model)
 
 
+# Diffusion models whose block loop BlockCache can cut short, with the reuse threshold it defaults to for them.
+# Variants that add to the hidden states between blocks (VACE, S2V, Animate) are left out, skipping the
+# blocks would add those again on top of the cached residual.
+BLOCKCACHE_THRESHOLDS = {
+    comfy.ldm.wan.model.WanModel: 0.06,
+    comfy.ldm.wan.model.CameraWanModel: 0.06,
+    comfy.ldm.wan.model.HumoWanModel: 0.06,
+    comfy.ldm.flux.model.Flux: 0.08,
+}
+
+
+def blockcache_block_keys(diffusion_model: torch.nn.Module) -> list[tuple[str, int]]:
+    """Returns the "dit" patch keys of the blocks in the order they run, or None if the model is not supported."""
+    if type(diffusion_model) not in BLOCKCACHE_THRESHOLDS:
+        return None
+    if isinstance(diffusion_model, comfy.ldm.flux.model.Flux):
+        keys = [("double_block", i) for i in range(len(diffusion_model.double_blocks))]
+        if len(diffusion_model.single_blocks) == 0:
+            return None
+        keys += [("single_block", i) for i in range(len(diffusion_model.single_blocks))]
+    else:
+        keys = [("double_block", i) for i in range(len(diffusion_model.blocks))]
+    if len(keys) < 3:
+        return None
+    return keys
+
+
+def blockcache_forward_wrapper(executor, *args, **kwargs):
+    # get values from args
+    transformer_options: dict[str] = args[-1]
+    if not isinstance(transformer_options, dict):
+        transformer_options = kwargs.get("transformer_options")
+        if not transformer_options:
+            transformer_options = args[-2]
+    blockcache: BlockCacheHolder = transformer_options["blockcache"]
+    sigmas = transformer_options["sigmas"]
+    blockcache.total_blocks += len(blockcache.block_keys)
+    blockcache.forward_key = None
+    blockcache.skip_blocks = False
+    # controlnets add to the hidden states in place between blocks
+    if kwargs.get("control", None) is None and sigmas is not None and blockcache.should_do_blockcache(sigmas):
+        # batched context windows are only listed in context_windows
+        windows = transformer_options.get("context_windows", None)
+        if windows is None:
+            window = transformer_options.get("context_window", None)
+            windows = [window] if window is not None else []
+        blockcache.forward_key = (tuple(transformer_options["uuids"]), tuple(args[0].shape),
+                                  tuple(tuple(window.index_list) for window in windows))
+    try:
+        return executor(*args, **kwargs)
+    finally:
+        blockcache.forward_key = None
+        blockcache.skip_blocks = False
+        blockcache.first_residual = None
+        blockcache.base = None
+
+
+def blockcache_first_block(args: dict, extra: dict) -> dict:
+    blockcache: BlockCacheHolder = args["transformer_options"]["blockcache"]
+    if blockcache.forward_key is None:
+        return extra["original_block"](args)
+    # flux blocks update their inputs in place
+    img_in = args["img"].clone() if blockcache.clone_first_input else args["img"]
+    out = extra["original_block"](args)
+    first_residual = blockcache.subsample(out["img"] - img_in)
+    del img_in
+    blockcache.skip_blocks = blockcache.should_skip(first_residual)
+    if blockcache.skip_blocks:
+        blockcache.total_blocks_skipped += len(blockcache.block_keys) - 1
+    else:
+        blockcache.first_residual = first_residual
+        # hidden states after the first block, laid out like the output of the last one
+        if "txt" in out:
+            blockcache.base = torch.cat((out["txt"], out["img"]), 1)
+        else:
+            blockcache.base = out["img"]
+    return out
+
+
+def blockcache_middle_block(args: dict, extra: dict) -> dict:
+    blockcache: BlockCacheHolder = args["transformer_options"]["blockcache"]
+    if blockcache.skip_blocks:
+        return {"img": args["img"], "txt": args.get("txt", None)}
+    return extra["original_block"](args)
+
+
+def blockcache_last_block(args: dict, extra: dict) -> dict:
+    blockcache: BlockCacheHolder = args["transformer_options"]["blockcache"]
+    if blockcache.skip_blocks:
+        return {"img": args["img"] + blockcache.get_residual(args["img"].device)}
+    out = extra["original_block"](args)
+    if blockcache.forward_key is not None:
+        blockcache.store(blockcache.forward_key, blockcache.first_residual, out["img"] - blockcache.base)
+    return out
+
+
+def blockcache_sample_wrapper(executor, *args, **kwargs):
+    """
+    This OUTER_SAMPLE wrapper makes sure blockcache is prepped for current run, and all memory usage is cleared at the end.
+    """
+    try:
+        guider = executor.class_obj
+        orig_model_options = guider.model_options
+        guider.model_options = comfy.model_patcher.create_model_options_clone(orig_model_options)
+        guider.model_options["transformer_options"]["blockcache"] = guider.model_options["transformer_options"]["blockcache"].clone().prepare_timesteps(guider.model_patcher.model.model_sampling)
+        blockcache: BlockCacheHolder = guider.model_options["transformer_options"]["blockcache"]
+        blockcache.offload_device = guider.model_patcher.offload_device
+        logging.info(f"{blockcache.name} enabled - threshold: {blockcache.reuse_threshold}, start_percent: {blockcache.start_percent}, end_percent: {blockcache.end_percent}, max_cache_mb: {blockcache.max_cache_mb}, offload: {blockcache.offload_cache}")
+        return executor(*args, **kwargs)
+    finally:
+        blockcache = guider.model_options["transformer_options"]["blockcache"]
+        if blockcache.verbose:
+            logging.info(f"{blockcache.name} [verbose] - change_rates {len(blockcache.change_rates)}: {blockcache.change_rates}")
+        try:
+            speedup = blockcache.total_blocks / (blockcache.total_blocks - blockcache.total_blocks_skipped)
+        except ZeroDivisionError:
+            speedup = 1.0
+        logging.info(f"{blockcache.name} - skipped {blockcache.total_blocks_skipped}/{blockcache.total_blocks} blocks ({speedup:.2f}x speedup of the transformer blocks).")
+        blockcache.reset()
+        guider.model_options = orig_model_options
+
+
+class BlockCacheHolder:
+    def __init__(self, reuse_threshold: float, start_percent: float, end_percent: float, block_keys: list[tuple[str, int]], clone_first_input: bool,
+                 max_cache_mb: int=0, offload_cache: bool=False, subsample_factor: int=8, verbose: bool=False):
+        self.name = "BlockCache"
+        self.reuse_threshold = reuse_threshold
+        self.start_percent = start_percent
+        self.end_percent = end_percent
+        self.block_keys = block_keys
+        self.clone_first_input = clone_first_input
+        self.max_cache_mb = max_cache_mb
+        self.offload_cache = offload_cache
+        self.subsample_factor = subsample_factor
+        self.verbose = verbose
+        self.offload_device: torch.device = None
+        # timestep values
+        self.start_t = 0.0
+        self.end_t = 0.0
+        # state of the current forward
+        self.forward_key = None
+        self.skip_blocks = False
+        self.first_residual: torch.Tensor = None
+        self.base: torch.Tensor = None
+        # key -> (subsampled first block residual, residual of the remaining blocks), oldest first
+        self.cache: OrderedDict[tuple, tuple[torch.Tensor, torch.Tensor]] = OrderedDict()
+        self.cache_bytes = 0
+        self.change_rates = []
+        self.total_blocks = 0
+        self.total_blocks_skipped = 0
+
+    def should_do_blockcache(self, timestep: torch.Tensor) -> bool:
+        return (timestep[0] <= self.start_t).item() and (timestep[0] > self.end_t).item()
+
+    def prepare_timesteps(self, model_sampling):
+        self.start_t = model_sampling.percent_to_sigma(self.start_percent)
+        self.end_t = model_sampling.percent_to_sigma(self.end_percent)
+        return self
+
+    def subsample(self, residual: torch.Tensor) -> torch.Tensor:
+        # a strided subset of the tokens is enough to estimate the change rate
+        if self.subsample_factor > 1:
+            return residual[:, ::self.subsample_factor].clone()
+        return residual.clone()
+
+    def should_skip(self, first_residual: torch.Tensor) -> bool:
+        cached = self.cache.get(self.forward_key, None)
+        if cached is None:
+            return False
+        self.cache.move_to_end(self.forward_key)
+        prev_first_residual = cached[0].to(first_residual.device)
+        change_rate = ((first_residual - prev_first_residual).abs().mean() / prev_first_residual.abs().mean()).item()
+        if self.verbose:
+            self.change_rates.append(change_rate)
+        return change_rate < self.reuse_threshold
+
+    def get_residual(self, device: torch.device) -> torch.Tensor:
+        return self.cache[self.forward_key][1].to(device, non_blocking=True)
+
+    def store(self, key: tuple, first_residual: torch.Tensor, residual: torch.Tensor):
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.cache_bytes -= old[0].nbytes + old[1].nbytes
+        size = first_residual.nbytes + residual.nbytes
+        max_bytes = self.max_cache_mb * 1024 * 1024
+        if max_bytes > 0:
+            if size > max_bytes:
+                if self.verbose:
+                    logging.info(f"{self.name} [verbose] - residuals of {size / (1024 * 1024):.1f} MB don't fit in the cache, not caching them")
+                return
+            while self.cache_bytes + size > max_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted[0].nbytes + evicted[1].nbytes
+        if self.offload_cache and self.offload_device is not None:
+            first_residual = first_residual.to(self.offload_device)
+            residual = residual.to(self.offload_device)
+        self.cache[key] = (first_residual, residual)
+        self.cache_bytes += size
+
+    def reset(self):
+        self.forward_key = None
+        self.skip_blocks = False
+        self.first_residual = None
+        self.base = None
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.change_rates = []
+        self.total_blocks = 0
+        self.total_blocks_skipped = 0
+        return self
+
+    def clone(self):
+        return BlockCacheHolder(self.reuse_threshold, self.start_percent, self.end_percent, self.block_keys, self.clone_first_input,
+                                self.max_cache_mb, self.offload_cache, self.subsample_factor, self.verbose)
+
+
+class BlockCacheNode(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        return io.Schema(
+            node_id="BlockCache",
+            display_name="BlockCache",
+            description="Runs the first transformer block every step and skips the rest when its residual barely changed, reusing their cached residual instead. Supports Wan and Flux models.",
+            category="advanced/debug/model",
+            is_experimental=True,
+            inputs=[
+                io.Model.Input("model", tooltip="The model to add BlockCache to."),
+                io.Float.Input("reuse_threshold", min=0.0, default=0.0, max=1.0, step=0.005, tooltip="The relative change of the first block residual below which the other blocks are skipped. 0 uses the value calibrated for the model."),
+                io.Float.Input("start_percent", min=0.0, default=0.15, max=1.0, step=0.01, tooltip="The relative sampling step to begin use of BlockCache."),
+                io.Float.Input("end_percent", min=0.0, default=0.95, max=1.0, step=0.01, tooltip="The relative sampling step to end use of BlockCache."),
+                io.Int.Input("max_cache_mb", min=0, default=4096, max=1024 * 1024, tooltip="The memory the cached residuals may use, the least recently used are dropped past it. 0 for no limit."),
+                io.Boolean.Input("offload_cache", default=False, tooltip="Whether to keep the cached residuals in the offload device (CPU) memory instead of the GPU."),
+                io.Boolean.Input("verbose", default=False, tooltip="Whether to log verbose information."),
+            ],
+            outputs=[
+                io.Model.Output(tooltip="The model with BlockCache."),
+            ],
+        )
+
+    @classmethod
+    def execute(cls, model: io.Model.Type, reuse_threshold: float, start_percent: float, end_percent: float, max_cache_mb: int, offload_cache: bool, verbose: bool) -> io.NodeOutput:
+        diffusion_model = model.model.diffusion_model
+        block_keys = blockcache_block_keys(diffusion_model)
+        if block_keys is None:
+            logging.warning(f"BlockCache - {type(diffusion_model).__name__} is not supported, model left unchanged")
+            return io.NodeOutput(model)
+        if len(model.model_options["transformer_options"].get("patches_replace", {}).get("dit", {})) > 0:
+            logging.warning("BlockCache - model already has block replacements, model left unchanged")
+            return io.NodeOutput(model)
+        if reuse_threshold == 0.0:
+            reuse_threshold = BLOCKCACHE_THRESHOLDS[type(diffusion_model)]
+        model = model.clone()
+        clone_first_input = isinstance(diffusion_model, comfy.ldm.flux.model.Flux)
+        model.model_options["transformer_options"]["blockcache"] = BlockCacheHolder(reuse_threshold, start_percent, end_percent, block_keys, clone_first_input,
+                                                                                    max_cache_mb=max_cache_mb, offload_cache=offload_cache, verbose=verbose)
+        for i, (block_name, number) in enumerate(block_keys):
+            if i == 0:
+                patch = blockcache_first_block
+            elif i == len(block_keys) - 1:
+                patch = blockcache_last_block
+            else:
+                patch = blockcache_middle_block
+            model.set_model_patch_replace(patch, "dit", block_name, number)
+        model.add_wrapper_with_key(comfy.patcher_extension.WrappersMP.OUTER_SAMPLE, "blockcache", blockcache_sample_wrapper)
+        model.add_wrapper_with_key(comfy.patcher_extension.WrappersMP.DIFFUSION_MODEL, "blockcache", blockcache_forward_wrapper)
+        return io.NodeOutput(model)
+
+
 class EasyCacheExtension(ComfyExtension):
     async def get_node_list(self) -> list[type[io.ComfyNode]]:
         return [
             EasyCacheNode,
             LazyCacheNode,
+            BlockCacheNode,
         ]
 
 def comfy_entrypoint():
@@ -328,7 +328,7 @@ class CreateHookLora:
                 del temp
 
         if lora is None:
-            lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+            lora = comfy.utils.load_torch_file(lora_path, safe_load=True, cache=True)
             self.loaded_lora = (lora_path, lora)
 
         hooks = comfy.hooks.create_hook_lora(lora=lora, strength_model=strength_model, strength_clip=strength_clip)
@@ -629,7 +629,7 @@ class SaveGLB(IO.ComfyNode):
 
     @classmethod
     def execute(cls, mesh, filename_prefix) -> IO.NodeOutput:
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory())
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory(), count=mesh.vertices.shape[0])
         results = []
 
         metadata = {}
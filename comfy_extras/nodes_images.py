@@ -441,7 +441,7 @@ class SaveSVGNode(IO.ComfyNode):
 
     @classmethod
     def execute(cls, svg: IO.SVG.Type, filename_prefix="svg/ComfyUI") -> IO.NodeOutput:
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory())
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory(), count=len(svg.data))
         results: list[UI.SavedResult] = []
 
         # Prepare metadata JSON
@@ -33,7 +33,7 @@ class UpscaleModelLoader(io.ComfyNode):
     @classmethod
     def execute(cls, model_name) -> io.NodeOutput:
         model_path = folder_paths.get_full_path_or_raise("upscale_models", model_name)
-        sd = comfy.utils.load_torch_file(model_path, safe_load=True)
+        sd = comfy.utils.load_torch_file(model_path, safe_load=True, cache=True)
         if "module.layers.0.residual_group.blocks.0.norm1.weight" in sd:
             sd = comfy.utils.state_dict_prefix_replace(sd, {"module.":""})
         out = ModelLoader().load_from_state_dict(sd).eval()
@@ -76,15 +76,21 @@ class ImageUpscaleWithModel(io.ComfyNode):
 
         tile = 512
         overlap = 32
+        # Tiles are upscaled in batches that fit in the free memory, with the same estimate as above
+        tile_memory = (tile * tile * 3) * image.element_size() * max(upscale_model.scale, 1.0) * 384.0
+        tile_batch_size = max(1, int(model_management.get_free_memory(device) / tile_memory))
 
         oom = True
         while oom:
             try:
                 steps = in_img.shape[0] * comfy.utils.get_tiled_scale_steps(in_img.shape[3], in_img.shape[2], tile_x=tile, tile_y=tile, overlap=overlap)
                 pbar = comfy.utils.ProgressBar(steps)
-                s = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile, overlap=overlap, upscale_amount=upscale_model.scale, pbar=pbar)
+                s = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile, overlap=overlap, upscale_amount=upscale_model.scale, pbar=pbar, tile_batch_size=tile_batch_size)
                 oom = False
             except model_management.OOM_EXCEPTION as e:
+                if tile_batch_size > 1:
+                    tile_batch_size //= 2
+                    continue
                 tile //= 2
                 if tile < 128:
                     raise e
@@ -11,6 +11,9 @@ from fractions import Fraction
 from comfy_api.latest import ComfyExtension, io, ui, Input, InputImpl, Types
 from comfy.cli_args import args
 
+# Upper bound of the frame index inputs
+MAX_FRAME_INDEX = 2**31 - 1
+
 class SaveWEBM(io.ComfyNode):
     @classmethod
     def define_schema(cls):
@@ -32,7 +35,7 @@ class SaveWEBM(io.ComfyNode):
     @classmethod
     def execute(cls, images, codec, fps, filename_prefix, crf) -> io.NodeOutput:
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
-            filename_prefix, folder_paths.get_output_directory(), images[0].shape[1], images[0].shape[0]
+            filename_prefix, folder_paths.get_output_directory(), images[0].shape[1], images[0].shape[0], count=1
         )
 
         file = f"{filename}_{counter:05}_.webm"
@@ -89,7 +92,8 @@ class SaveVideo(io.ComfyNode):
             filename_prefix,
             folder_paths.get_output_directory(),
             width,
-            height
+            height,
+            count=1
         )
         saved_metadata = None
         if not args.disable_metadata:
@@ -145,6 +149,9 @@ class GetVideoComponents(io.ComfyNode):
             description="Extracts all components from a video: frames, audio, and framerate.",
             inputs=[
                 io.Video.Input("video", tooltip="The video to extract components from."),
+                io.Int.Input("start_frame", default=0, min=0, max=MAX_FRAME_INDEX, optional=True, tooltip="The first frame to extract."),
+                io.Int.Input("frame_count", default=0, min=0, max=MAX_FRAME_INDEX, optional=True, tooltip="The number of frames to extract, 0 extracts all frames after start_frame."),
+                io.Int.Input("select_every_nth", default=1, min=1, max=1000, optional=True, tooltip="Only extract every nth frame, the fps output is divided by this."),
             ],
             outputs=[
                 io.Image.Output(display_name="images"),
@@ -154,8 +161,13 @@ class GetVideoComponents(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, video: Input.Video) -> io.NodeOutput:
-        components = video.get_components()
+    def execute(cls, video: Input.Video, start_frame: int = 0, frame_count: int = 0, select_every_nth: int = 1) -> io.NodeOutput:
+        if start_frame == 0 and frame_count == 0 and select_every_nth == 1:
+            components = video.get_components()
+        else:
+            # Only decodes the selected frames for videos loaded from files
+            end_frame = None if frame_count == 0 else start_frame + frame_count * select_every_nth
+            components = video.get_components_range(start_frame, end_frame, select_every_nth)
         return io.NodeOutput(components.images, components.audio, float(components.frame_rate))
 
 
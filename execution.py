@@ -1,11 +1,15 @@
+import contextvars
 import copy
+import functools
 import heapq
 import inspect
 import logging
+import os
 import sys
 import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import List, Literal, NamedTuple, Optional, Union
 import asyncio
@@ -13,16 +17,20 @@ import asyncio
 import torch
 
 import comfy.model_management
+import folder_paths
+from comfy.cli_args import args
 from latent_preview import set_preview_method
 import nodes
 from comfy_execution.caching import (
     BasicCache,
+    CacheEntry,
     CacheKeySetID,
     CacheKeySetInputSignature,
     NullCache,
     HierarchicalCache,
     LRUCache,
     RAMPressureCache,
+    DiskCache,
 )
 from comfy_execution.graph import (
     DynamicPrompt,
@@ -31,6 +39,9 @@ from comfy_execution.graph import (
     get_input_info,
 )
 from comfy_execution.graph_utils import GraphBuilder, is_link
+from comfy_execution.jobs import delete_history_items, save_history_item
+from comfy_execution.list_batching import outputs_can_be_split, split_outputs, stack_list_inputs
+from comfy_execution.model_prefetch import ModelPrefetcher
 from comfy_execution.validation import validate_node_input
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
@@ -90,11 +101,6 @@ class IsChangedCache:
         return self.is_changed[node_id]
 
 
-class CacheEntry(NamedTuple):
-    ui: dict
-    outputs: list
-
-
 class CacheType(Enum):
     CLASSIC = 0
     LRU = 1
@@ -118,6 +124,9 @@ class CacheSet:
         else:
             self.init_classic_cache()
 
+        if cache_args and cache_args.get("disk") and cache_type != CacheType.NONE:
+            self.init_disk_cache(cache_args["disk"], cache_args.get("disk_size", 10.0))
+
         self.all = [self.outputs, self.objects]
 
     # Performs like the old cache -- dump data ASAP
@@ -137,6 +146,10 @@ class CacheSet:
         self.outputs = NullCache()
         self.objects = NullCache()
 
+    def init_disk_cache(self, directory, max_size_gb):
+        self.outputs.set_persistent_tier(DiskCache(directory, int(max_size_gb * (1024**3))))
+        logging.info("Using disk cache tier at {}".format(directory))
+
     def recursive_debug_dump(self):
         result = {
             "outputs": self.outputs.recursive_debug_dump(),
@@ -214,6 +227,19 @@ def get_input_data(inputs, class_def, unique_id, execution_list=None, dynprompt=
 
 map_node_over_list = None #Don't hook this please
 
+_cpu_node_pool = None
+
+def get_cpu_node_pool():
+    global _cpu_node_pool
+    if args.parallel_cpu_nodes <= 0:
+        return None
+    if _cpu_node_pool is None:
+        _cpu_node_pool = ThreadPoolExecutor(max_workers=args.parallel_cpu_nodes, thread_name_prefix="comfy_cpu_node")
+    return _cpu_node_pool
+
+def is_thread_safe_node(obj):
+    return getattr(obj, "THREAD_SAFE", False) == True
+
 async def resolve_map_node_over_list_results(results):
     remaining = [x for x in results if isinstance(x, asyncio.Task) and not x.done()]
     if len(remaining) == 0:
@@ -226,10 +252,13 @@ async def resolve_map_node_over_list_results(results):
                 raise exc
         return [x.result() if isinstance(x, asyncio.Task) else x for x in results]
 
-async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, func, allow_interrupt=False, execution_block_cb=None, pre_execute_cb=None, v3_data=None):
+async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, func, allow_interrupt=False, execution_block_cb=None, pre_execute_cb=None, v3_data=None, allow_threading=False):
     # check if node wants the lists
     input_is_list = getattr(obj, "INPUT_IS_LIST", False)
 
+    # thread safe CPU nodes can run on a worker thread while the graph moves on to independent branches
+    thread_pool = get_cpu_node_pool() if allow_threading and is_thread_safe_node(obj) else None
+
     if len(input_data_all) == 0:
         max_len_input = 0
     else:
@@ -287,6 +316,15 @@ async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, f
                     results.append(result)
                 else:
                     results.append(task)
+            elif thread_pool is not None:
+                def thread_wrapper(f, prompt_id, unique_id, list_index, args):
+                    # inference mode is thread local
+                    with torch.inference_mode(), CurrentNodeContext(prompt_id, unique_id, list_index):
+                        return f(**args)
+                async def thread_task(call):
+                    return await asyncio.get_running_loop().run_in_executor(thread_pool, call)
+                call = functools.partial(contextvars.copy_context().run, thread_wrapper, f, prompt_id, unique_id, index, inputs)
+                results.append(asyncio.create_task(thread_task(call)))
             else:
                 with CurrentNodeContext(prompt_id, unique_id, index):
                     result = f(**inputs)
@@ -299,12 +337,47 @@ async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, f
     elif max_len_input == 0:
         await process_inputs({})
     else:
+        # nodes that declare batchable inputs are called once with the list elements stacked
+        batch_inputs = getattr(obj, "BATCH_LIST_INPUTS", None)
+        stacked = None
+        if batch_inputs and max_len_input > 1 and outputs_can_be_split(obj) and not any(isinstance(x, ExecutionBlocker) for v in input_data_all.values() for x in v):
+            stacked = stack_list_inputs(input_data_all, batch_inputs, max_len_input)
+        if stacked is not None:
+            input_dict, sizes = stacked
+            await process_inputs(input_dict, 0)
+            result = results.pop()
+            if isinstance(result, asyncio.Task):
+                result = await result
+            split_results = split_batched_result(result, sizes)
+            if split_results is None:
+                # Running it again per element would execute the node twice
+                raise RuntimeError("Node {} ({}) declares BATCH_LIST_INPUTS but its output could not be split back into list elements".format(unique_id, getattr(obj, "__name__", type(obj).__name__)))
+            return split_results
         for i in range(max_len_input):
             input_dict = slice_dict(input_data_all, i)
             await process_inputs(input_dict, i)
     return results
 
 
+def split_batched_result(result, sizes):
+    """Splits the return value of a call with stacked list inputs into per element return values."""
+    ui = None
+    if isinstance(result, dict):
+        if 'expand' in result or 'result' not in result:
+            return None
+        ui = result.get('ui')
+        result = result['result']
+    elif isinstance(result, _NodeOutputInternal):
+        if result.expand is not None or result.block_execution is not None:
+            return None
+        if result.ui is not None:
+            ui = result.ui if isinstance(result.ui, dict) else result.ui.as_dict()
+        result = result.result
+    split = split_outputs(result, sizes)
+    if split is not None and ui is not None:
+        split[0] = {"ui": ui, "result": split[0]}
+    return split
+
 def merge_result_data(results, obj):
     # check which outputs need concatenating
     output = []
@@ -327,7 +400,7 @@ def merge_result_data(results, obj):
     return output
 
 async def get_output_data(prompt_id, unique_id, obj, input_data_all, execution_block_cb=None, pre_execute_cb=None, v3_data=None):
-    return_values = await _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, obj.FUNCTION, allow_interrupt=True, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, v3_data=v3_data)
+    return_values = await _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, obj.FUNCTION, allow_interrupt=True, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, v3_data=v3_data, allow_threading=True)
     has_pending_task = any(isinstance(r, asyncio.Task) and not r.done() for r in return_values)
     if has_pending_task:
         return return_values, {}, False, has_pending_task
@@ -622,6 +695,7 @@ class PromptExecutor:
         self.cache_args = cache_args
         self.cache_type = cache_type
         self.server = server
+        self.loop = None
         self.reset()
 
     def reset(self):
@@ -666,8 +740,45 @@ class PromptExecutor:
             }
             self.add_message("execution_error", mes, broadcast=False)
 
+    async def wait_for_image_saves(self, prompt_id, dynamic_prompt):
+        """Waits for the files the prompt writes with --async-image-save, returns the error details of the first one that failed."""
+        if not args.async_image_save:
+            return None, None
+        failed = await asyncio.get_running_loop().run_in_executor(None, nodes.wait_for_image_saves, prompt_id)
+        if failed is None:
+            return None, None
+        node_id, path, ex = failed
+        error_details = {
+            "node_id": dynamic_prompt.get_real_node_id(node_id),
+            "exception_message": "Error saving {}: {}".format(path, ex),
+            "exception_type": full_type_name(type(ex)),
+            "traceback": traceback.format_tb(ex.__traceback__),
+            "current_inputs": {},
+        }
+        return error_details, ex
+
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
-        asyncio.run(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
+        # The event loop is kept between prompts so that loop bound resources, like the pooled
+        # http sessions of the API nodes, are reused instead of being recreated for every prompt.
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # interrupts sent for other prompt workers' prompts don't stop this one
+        comfy.model_management.set_interrupt_prompt(prompt_id)
+        try:
+            self.loop.run_until_complete(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
+        finally:
+            self._cancel_leftover_tasks()
+            asyncio.set_event_loop(None)
+            comfy.model_management.set_interrupt_prompt(None)
+
+    def _cancel_leftover_tasks(self):
+        # Same cleanup asyncio.run does, without closing the loop
+        tasks = [t for t in asyncio.all_tasks(self.loop) if not t.done()]
+        for t in tasks:
+            t.cancel()
+        if len(tasks) > 0:
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
 
     async def execute_async(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
         set_preview_method(extra_data.get("preview_method"))
@@ -708,6 +819,7 @@ class PromptExecutor:
             current_outputs = self.caches.outputs.all_node_ids()
             for node_id in list(execute_outputs):
                 execution_list.add_node(node_id)
+            prefetcher = ModelPrefetcher(enabled=args.prefetch_models)
 
             while not execution_list.is_empty():
                 node_id, error, ex = await execution_list.stage_node_execution()
@@ -716,7 +828,9 @@ class PromptExecutor:
                     break
 
                 assert node_id is not None, "Node ID should not be None at this point"
+                prefetcher.before_node(execution_list, node_id)
                 result, error, ex = await execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_node_outputs)
+                prefetcher.wait()
                 self.success = result != ExecutionResult.FAILURE
                 if result == ExecutionResult.FAILURE:
                     self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
@@ -728,7 +842,15 @@ class PromptExecutor:
                 self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
             else:
                 # Only execute when the while-loop ends without break
-                self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+                error, ex = await self.wait_for_image_saves(prompt_id, dynamic_prompt)
+                if error is not None:
+                    self.success = False
+                    self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
+                else:
+                    self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+            # the files of a prompt that failed are still waited for, they are in its outputs
+            await self.wait_for_image_saves(prompt_id, dynamic_prompt)
+            prefetcher.finish()
 
             ui_outputs = {}
             meta_outputs = {}
@@ -744,7 +866,104 @@ class PromptExecutor:
                 comfy.model_management.unload_all_models()
 
 
-async def validate_inputs(prompt_id, prompt, item, validated):
+# Seconds a cached node schema, and the passing custom validation results stored with it, are
+# trusted by validate_inputs. A combo value missing from the cached options always refreshes the
+# schema and failed custom validations are never cached, so new files are picked up right away
+# and only removed ones can go unnoticed for this long.
+VALIDATION_SCHEMA_TTL = 60.0
+VALIDATION_SCHEMA_CACHE_SIZE = 4096
+VALIDATION_RESULT_CACHE_SIZE = 1024
+
+class NodeValidationSchema:
+    """The INPUT_TYPES of a node class and what validate_inputs derives from them."""
+    def __init__(self, obj_class, class_inputs, validate_function_name, validate_function):
+        self.obj_class = obj_class
+        self.class_inputs = class_inputs
+        self.validate_function_name = validate_function_name
+        self.validate_function_inputs = []
+        self.validate_has_kwargs = False
+        if validate_function is not None:
+            argspec = inspect.getfullargspec(validate_function)
+            self.validate_function_inputs = argspec.args
+            self.validate_has_kwargs = argspec.varkw is not None
+        valid_inputs = set(class_inputs.get('required',{})).union(set(class_inputs.get('optional',{})))
+        self.input_info = {x: get_input_info(obj_class, x, class_inputs) for x in valid_inputs}
+        self.combo_options = {}
+        self.validate_results = set()
+        self.created = time.monotonic()
+
+    def in_combo(self, input_name, options, val):
+        try:
+            if input_name not in self.combo_options:
+                self.combo_options[input_name] = frozenset(options)
+            return val in self.combo_options[input_name]
+        except TypeError:
+            return val in options
+
+    def validate_key(self, inputs, received_types):
+        """
+        The signature the custom validate function is called with, or None if it can't be cached:
+        linked inputs are only known at execution time and hidden inputs differ per prompt.
+        """
+        if self.validate_has_kwargs:
+            return None
+        values = []
+        for x in self.validate_function_inputs:
+            if x == 'input_types':
+                values.append((x, tuple(sorted(received_types.items()))))
+                continue
+            if x in self.class_inputs.get('hidden', {}):
+                return None
+            if x not in self.input_info:
+                continue
+            val = inputs.get(x)
+            if isinstance(val, list):
+                return None
+            values.append((x, val))
+        key = tuple(values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def store_validate_result(self, key):
+        if len(self.validate_results) >= VALIDATION_RESULT_CACHE_SIZE:
+            self.validate_results.clear()
+        self.validate_results.add(key)
+
+_validation_schemas = {}
+
+def get_validation_schema(class_type, obj_class, inputs, refresh=False):
+    """
+    Returns (schema, cached) for a node. V3 schemas can depend on the inputs that are present,
+    so they are cached per set of input names, and not at all when they have dynamic inputs.
+    """
+    is_v3 = issubclass(obj_class, _ComfyNodeInternal)
+    key = (class_type, frozenset(inputs)) if is_v3 else class_type
+    schema = _validation_schemas.get(key)
+    if not refresh and schema is not None and schema.obj_class is obj_class and time.monotonic() - schema.created < VALIDATION_SCHEMA_TTL:
+        return schema, True
+
+    if is_v3:
+        class_inputs, _, v3_data = obj_class.INPUT_TYPES(include_hidden=False, return_schema=True, live_inputs=inputs)
+        validate_function_name = "validate_inputs"
+        validate_function = first_real_override(obj_class, validate_function_name)
+        cacheable = "dynamic_paths" not in v3_data
+    else:
+        class_inputs = obj_class.INPUT_TYPES()
+        validate_function_name = "VALIDATE_INPUTS"
+        validate_function = getattr(obj_class, validate_function_name, None)
+        cacheable = True
+
+    schema = NodeValidationSchema(obj_class, class_inputs, validate_function_name, validate_function)
+    if cacheable:
+        if len(_validation_schemas) >= VALIDATION_SCHEMA_CACHE_SIZE:
+            _validation_schemas.clear()
+        _validation_schemas[key] = schema
+    return schema, False
+
+async def validate_inputs(prompt_id, prompt, item, validated, refresh_schema=False):
     unique_id = item
     if unique_id in validated:
         return validated[unique_id]
@@ -756,26 +975,13 @@ async def validate_inputs(prompt_id, prompt, item, validated):
     errors = []
     valid = True
 
-    validate_function_inputs = []
-    validate_has_kwargs = False
-    if issubclass(obj_class, _ComfyNodeInternal):
-        class_inputs, _, _ = obj_class.INPUT_TYPES(include_hidden=False, return_schema=True, live_inputs=inputs)
-        validate_function_name = "validate_inputs"
-        validate_function = first_real_override(obj_class, validate_function_name)
-    else:
-        class_inputs = obj_class.INPUT_TYPES()
-        validate_function_name = "VALIDATE_INPUTS"
-        validate_function = getattr(obj_class, validate_function_name, None)
-    if validate_function is not None:
-        argspec = inspect.getfullargspec(validate_function)
-        validate_function_inputs = argspec.args
-        validate_has_kwargs = argspec.varkw is not None
+    schema, schema_cached = get_validation_schema(class_type, obj_class, inputs, refresh=refresh_schema)
+    validate_function_name = schema.validate_function_name
+    validate_function_inputs = schema.validate_function_inputs
+    validate_has_kwargs = schema.validate_has_kwargs
     received_types = {}
 
-    valid_inputs = set(class_inputs.get('required',{})).union(set(class_inputs.get('optional',{})))
-
-    for x in valid_inputs:
-        input_type, input_category, extra_info = get_input_info(obj_class, x, class_inputs)
+    for x, (input_type, input_category, extra_info) in schema.input_info.items():
         assert extra_info is not None
         if x not in inputs:
             if input_category == "required":
@@ -918,7 +1124,10 @@ async def validate_inputs(prompt_id, prompt, item, validated):
 
                 if isinstance(input_type, list):
                     combo_options = input_type
-                    if val not in combo_options:
+                    if not schema.in_combo(x, combo_options, val):
+                        if schema_cached:
+                            # The options may have changed since the schema was cached
+                            return await validate_inputs(prompt_id, prompt, item, validated, refresh_schema=True)
                         input_config = info
                         list_info = ""
 
@@ -943,7 +1152,10 @@ async def validate_inputs(prompt_id, prompt, item, validated):
                         errors.append(error)
                         continue
 
-    if len(validate_function_inputs) > 0 or validate_has_kwargs:
+    validate_key = None
+    if len(validate_function_inputs) > 0 and len(errors) == 0:
+        validate_key = schema.validate_key(inputs, received_types)
+    if (len(validate_function_inputs) > 0 or validate_has_kwargs) and (validate_key is None or validate_key not in schema.validate_results):
         input_data_all, _, v3_data = get_input_data(inputs, obj_class, unique_id)
         input_filtered = {}
         for x in input_data_all:
@@ -971,6 +1183,8 @@ async def validate_inputs(prompt_id, prompt, item, validated):
                     }
                     errors.append(error)
                     continue
+        if validate_key is not None and all(r is True for r in ret):
+            schema.store_validate_result(validate_key)
 
     if len(errors) > 0 or valid is not True:
         ret = (False, errors, unique_id)
@@ -1097,36 +1311,104 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 
 MAXIMUM_HISTORY_SIZE = 10000
 
+# How far down the queue a prompt worker looks for a prompt using models it already has loaded
+PROMPT_AFFINITY_WINDOW = 8
+
+def get_prompt_model_files(prompt):
+    """Returns the model file names referenced by the inputs of a prompt."""
+    files = set()
+    for node in prompt.values():
+        for value in node.get("inputs", {}).values():
+            if isinstance(value, str) and os.path.splitext(value)[1].lower() in folder_paths.supported_pt_extensions:
+                files.add(value)
+    return files
+
 class PromptQueue:
     def __init__(self, server):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
+        # Heap of queued items. Deleted items stay in the heap until they are popped or the
+        # heap is compacted, their id() is kept in removed_items until then.
         self.queue = []
+        self.removed_items = set()
+        self.queue_by_id = {}
         self.currently_running = {}
+        # history keeps insertion order, history_order/history_position index it for paging.
+        # An entry of history_order is live only if history_position points back at it.
         self.history = {}
+        self.history_order = []
+        self.history_position = {}
+        self.history_start = 0
+        self.history_deleted = 0
         self.flags = {}
+        # worker -> flags that prompt worker hasn't read yet
+        self.worker_flags = {}
+        # Immutable snapshot handed out to readers, rebuilt on the first read after a change
+        self._queue_snapshot = None
+
+    def _queue_changed(self):
+        self._queue_snapshot = None
+        self.server.queue_updated()
+
+    def _queue_len(self):
+        return len(self.queue) - len(self.removed_items)
+
+    def _live_queue_items(self):
+        return (x for x in self.queue if id(x) not in self.removed_items)
+
+    def _discard_queue_item(self, item):
+        self.removed_items.add(id(item))
+        if self.queue_by_id.get(item[1]) is item:
+            del self.queue_by_id[item[1]]
+        if len(self.removed_items) > 32 and len(self.removed_items) * 2 > len(self.queue):
+            self.queue = list(self._live_queue_items())
+            heapq.heapify(self.queue)
+            self.removed_items.clear()
+
+    def _pop_queue_item(self):
+        while True:
+            item = heapq.heappop(self.queue)
+            if id(item) in self.removed_items:
+                self.removed_items.discard(id(item))
+                continue
+            if self.queue_by_id.get(item[1]) is item:
+                del self.queue_by_id[item[1]]
+            return item
 
     def put(self, item):
         with self.mutex:
             heapq.heappush(self.queue, item)
-            self.server.queue_updated()
+            self.queue_by_id[item[1]] = item
+            self._queue_changed()
             self.not_empty.notify()
 
-    def get(self, timeout=None):
+    def get(self, timeout=None, affinity=None):
         with self.not_empty:
-            while len(self.queue) == 0:
+            while self._queue_len() == 0:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                if timeout is not None and self._queue_len() == 0:
                     return None
-            item = heapq.heappop(self.queue)
+            item = None
+            if affinity:
+                item = self._pop_affine(affinity)
+            if item is None:
+                item = self._pop_queue_item()
             i = self.task_counter
             self.currently_running[i] = copy.deepcopy(item)
             self.task_counter += 1
-            self.server.queue_updated()
+            self._queue_changed()
             return (item, i)
 
+    def _pop_affine(self, affinity):
+        # Prefer a prompt near the front of the queue that uses models the worker already has loaded
+        for candidate in heapq.nsmallest(PROMPT_AFFINITY_WINDOW, self._live_queue_items()):
+            if not affinity.isdisjoint(get_prompt_model_files(candidate[2])):
+                self._discard_queue_item(candidate)
+                return candidate
+        return None
+
     class ExecutionStatus(NamedTuple):
         status_str: Literal['success', 'error']
         completed: bool
@@ -1136,8 +1418,6 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
 
             status_dict: Optional[dict] = None
             if status is not None:
@@ -1146,67 +1426,106 @@ class PromptQueue:
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            prompt_id = prompt[1]
+            if prompt_id not in self.history:
+                while len(self.history) >= MAXIMUM_HISTORY_SIZE:
+                    self._pop_oldest_history_item()
+                self.history_position[prompt_id] = len(self.history_order)
+                self.history_order.append(prompt_id)
+
+            self.history[prompt_id] = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
-            self.server.queue_updated()
+            self.history[prompt_id].update(history_result)
+            # Only queued here, the database write happens on the job store thread
+            save_history_item(prompt_id, self.history[prompt_id])
+            self._queue_changed()
+
+    def _history_live_at(self, index):
+        return self.history_position.get(self.history_order[index]) == index
+
+    def _pop_oldest_history_item(self):
+        while not self._history_live_at(self.history_start):
+            self.history_start += 1
+            self.history_deleted -= 1
+        prompt_id = self.history_order[self.history_start]
+        self.history_start += 1
+        del self.history_position[prompt_id]
+        del self.history[prompt_id]
+        self._maybe_compact_history_order()
+
+    def _maybe_compact_history_order(self):
+        # Rebuilt once at least half of history_order is dead, so it's amortized O(1) per removal
+        if (self.history_start + self.history_deleted) * 2 > len(self.history_order):
+            self._compact_history_order()
+
+    def _compact_history_order(self):
+        self.history_order = list(self.history)
+        self.history_position = {k: i for i, k in enumerate(self.history_order)}
+        self.history_start = 0
+        self.history_deleted = 0
+
+    def _get_queue_snapshot(self):
+        if self._queue_snapshot is None:
+            self._queue_snapshot = tuple(sorted(self._live_queue_items()))
+        return self._queue_snapshot
 
-    # Note: slow
     def get_current_queue(self):
+        # The snapshot is replaced rather than changed, the queue items in it are shared and must not be modified
         with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+            return (list(self.currently_running.values()), list(self._get_queue_snapshot()))
 
     # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
         with self.mutex:
-            running = [x for x in self.currently_running.values()]
-            queued = copy.copy(self.queue)
-            return (running, queued)
+            return (list(self.currently_running.values()), list(self._get_queue_snapshot()))
 
     def get_tasks_remaining(self):
         with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+            return self._queue_len() + len(self.currently_running)
 
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
-            self.server.queue_updated()
+            self.removed_items.clear()
+            self.queue_by_id = {}
+            self._queue_changed()
 
     def delete_queue_item(self, function):
         with self.mutex:
-            for x in range(len(self.queue)):
-                if function(self.queue[x]):
-                    if len(self.queue) == 1:
-                        self.wipe_queue()
-                    else:
-                        self.queue.pop(x)
-                        heapq.heapify(self.queue)
-                    self.server.queue_updated()
+            for x in self._live_queue_items():
+                if function(x):
+                    self._discard_queue_item(x)
+                    self._queue_changed()
                     return True
         return False
 
+    def delete_queue_item_by_id(self, prompt_id):
+        with self.mutex:
+            item = self.queue_by_id.get(prompt_id)
+            if item is None:
+                return False
+            self._discard_queue_item(item)
+            self._queue_changed()
+            return True
+
     def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
         with self.mutex:
             if prompt_id is None:
-                out = {}
-                i = 0
+                if max_items is None and offset <= 0 and map_function is None:
+                    return dict(self.history)
+
                 if offset < 0 and max_items is not None:
                     offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
+                offset = max(offset, 0)
+                out = {}
+                for k in self._history_page(offset, max_items):
+                    p = self.history[k]
+                    if map_function is not None:
+                        p = map_function(p)
+                    out[k] = p
                 return out
             elif prompt_id in self.history:
                 p = self.history[prompt_id]
@@ -1218,24 +1537,73 @@ class PromptQueue:
             else:
                 return {}
 
+    def _history_page(self, offset, max_items):
+        """Returns the prompt ids of max_items live history entries from offset, skipping deleted slots."""
+        count = len(self.history) - offset
+        if max_items is not None:
+            count = min(count, max_items)
+        if count <= 0:
+            return []
+        if self.history_deleted == 0:
+            start = self.history_start + offset
+            return self.history_order[start:start + count]
+
+        # Walk from whichever end of history_order is closer to the page
+        if offset * 2 < len(self.history):
+            indices = range(self.history_start, len(self.history_order))
+            skip = offset
+        else:
+            indices = range(len(self.history_order) - 1, self.history_start - 1, -1)
+            skip = len(self.history) - offset - count
+        keys = []
+        for i in indices:
+            if not self._history_live_at(i):
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            keys.append(self.history_order[i])
+            if len(keys) == count:
+                break
+        if indices.step < 0:
+            keys.reverse()
+        return keys
+
     def wipe_history(self):
         with self.mutex:
             self.history = {}
+            self._compact_history_order()
+            delete_history_items()
 
     def delete_history_item(self, id_to_delete):
         with self.mutex:
-            self.history.pop(id_to_delete, None)
+            if self.history.pop(id_to_delete, None) is not None:
+                del self.history_position[id_to_delete]
+                self.history_deleted += 1
+                self._maybe_compact_history_order()
+            delete_history_items(id_to_delete)
+
+    def register_worker(self, worker):
+        """Gives a prompt worker its own copy of the flags, so every worker sees flags like unload_models."""
+        with self.mutex:
+            self.worker_flags[worker] = {}
 
     def set_flag(self, name, data):
         with self.mutex:
-            self.flags[name] = data
-            self.not_empty.notify()
+            if len(self.worker_flags) > 0:
+                for flags in self.worker_flags.values():
+                    flags[name] = data
+            else:
+                self.flags[name] = data
+            self.not_empty.notify_all()
 
-    def get_flags(self, reset=True):
+    def get_flags(self, reset=True, worker=None):
         with self.mutex:
-            if reset:
-                ret = self.flags
-                self.flags = {}
-                return ret
+            flags = self.worker_flags.get(worker, self.flags)
+            if not reset:
+                return flags.copy()
+            if worker in self.worker_flags:
+                self.worker_flags[worker] = {}
             else:
-                return self.flags.copy()
+                self.flags = {}
+            return flags
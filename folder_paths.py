@@ -4,6 +4,7 @@ import os
 import time
 import mimetypes
 import logging
+import threading
 from typing import Literal, List
 from collections.abc import Collection
 
@@ -425,16 +426,44 @@ def get_filename_list(folder_name: str) -> list[str]:
     cache_helper.set(folder_name, out)
     return list(out[0])
 
-def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
-    def map_filename(filename: str) -> tuple[int, str]:
-        prefix_len = len(os.path.basename(filename_prefix))
-        prefix = filename[:prefix_len + 1]
+# (folder, filename prefix) -> next free counter of the get_save_image_path callers that reserve their counters
+save_image_counters: dict[tuple[str, str], int] = {}
+save_image_counters_lock = threading.Lock()
+
+def scan_save_image_counter(full_output_folder: str, filename: str) -> int:
+    """Returns the counter after the highest one of the files named {filename}_{counter}... in the folder, creating it if needed."""
+    def map_filename(f: str) -> tuple[int, str]:
+        prefix_len = len(filename)
+        prefix = f[:prefix_len + 1]
         try:
-            digits = int(filename[prefix_len + 1:].split('_')[0])
+            digits = int(f[prefix_len + 1:].split('_')[0])
         except:
             digits = 0
         return digits, prefix
 
+    try:
+        return max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
+    except ValueError:
+        return 1
+    except FileNotFoundError:
+        os.makedirs(full_output_folder, exist_ok=True)
+        return 1
+
+def forget_save_image_counter(full_output_folder: str, filename: str) -> None:
+    """Makes the next get_save_image_path call with count for this prefix scan the folder again."""
+    with save_image_counters_lock:
+        save_image_counters.pop((os.path.normcase(os.path.abspath(full_output_folder)), os.path.normcase(filename)), None)
+
+def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0, count: int | None = None) -> tuple[str, str, int, str, str]:
+    """
+    Returns (full_output_folder, filename, counter, subfolder, filename_prefix) for saving files named from filename_prefix.
+
+    With count, the counters [counter, counter + count) are reserved in an in-memory index that is seeded by listing
+    the folder once per prefix, so saving to a folder that already holds many files doesn't list it again every time,
+    and files that are still being written in the background are never handed out twice. Savers should pass the
+    number of files they write. Without count the folder is listed and the counter skips past the reserved ones;
+    only that one counter is reserved, so callers writing more files with it can collide, see forget_save_image_counter.
+    """
     def compute_vars(input: str, image_width: int, image_height: int) -> str:
         input = input.replace("%width%", str(image_width))
         input = input.replace("%height%", str(image_height))
@@ -463,13 +492,20 @@ def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, im
         logging.error(err)
         raise Exception(err)
 
-    try:
-        counter = max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
-    except ValueError:
-        counter = 1
-    except FileNotFoundError:
-        os.makedirs(full_output_folder, exist_ok=True)
-        counter = 1
+    key = (os.path.normcase(os.path.abspath(full_output_folder)), os.path.normcase(filename))
+    if count is None:
+        counter = scan_save_image_counter(full_output_folder, filename)
+        with save_image_counters_lock:
+            reserved = save_image_counters.get(key, None)
+            if reserved is not None:
+                counter = max(counter, reserved)
+                save_image_counters[key] = counter + 1
+    else:
+        with save_image_counters_lock:
+            counter = save_image_counters.get(key, None)
+            if counter is None or not os.path.isdir(full_output_folder):
+                counter = scan_save_image_counter(full_output_folder, filename)
+            save_image_counters[key] = counter + count
     return full_output_folder, filename, counter, subfolder, filename_prefix
 
 def get_input_subfolders() -> list[str]:
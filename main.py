@@ -195,7 +195,11 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
+def prompt_worker(q, server_instance, worker_index=0):
+    if args.prompt_workers > 1:
+        device = comfy.model_management.set_current_thread_device(worker_index)
+        logging.info("Prompt worker {} using device {}".format(worker_index, device))
+
     current_time: float = 0.0
     cache_type = execution.CacheType.CLASSIC
     if args.cache_lru > 0:
@@ -205,17 +209,19 @@ def prompt_worker(q, server_instance):
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram, "disk" : args.cache_disk, "disk_size" : args.cache_disk_size } )
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
+    # model files used by the last prompt, likely still loaded on this worker's device
+    resident_models = set()
 
     while True:
         timeout = 1000.0
         if need_gc:
             timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
 
-        queue_item = q.get(timeout=timeout)
+        queue_item = q.get(timeout=timeout, affinity=resident_models if args.prompt_workers > 1 else None)
         if queue_item is not None:
             item, item_id = queue_item
             execution_start_time = time.perf_counter()
@@ -229,6 +235,7 @@ def prompt_worker(q, server_instance):
 
             e.execute(item[2], prompt_id, extra_data, item[4])
             need_gc = True
+            resident_models = execution.get_prompt_model_files(item[2])
 
             remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
             q.task_done(item_id,
@@ -250,7 +257,7 @@ def prompt_worker(q, server_instance):
             else:
                 logging.info("Prompt executed in {:.2f} seconds".format(execution_time))
 
-        flags = q.get_flags()
+        flags = q.get_flags(worker=worker_index)
         free_memory = flags.get("free_memory", False)
 
         if flags.get("unload_models", free_memory):
@@ -367,7 +374,14 @@ def start_comfyui(asyncio_loop=None):
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    # Workers of the same device would unload each other's models and share its memory, one per device at most
+    device_count = comfy.model_management.get_torch_device_count()
+    if args.prompt_workers > device_count:
+        logging.warning("--prompt-workers {} is more than the {} available devices, using {} prompt workers.".format(args.prompt_workers, device_count, device_count))
+        args.prompt_workers = device_count
+    for worker_index in range(max(args.prompt_workers, 1)):
+        prompt_server.prompt_queue.register_worker(worker_index)
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server, worker_index)).start()
 
     if args.quick_test_for_ci:
         exit(0)
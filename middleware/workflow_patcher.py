@@ -1,18 +1,62 @@
-from typing import Dict, Any
+import copy
+from typing import Dict, Any, Iterable, List, Union
 
-def patch_workflow(workflow: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+
+class WorkflowTemplate:
+    """
+    A workflow (API format) compiled once for repeated patching.
+
+    Patched prompts share the input values of the template instead of deep copying the whole
+    workflow. Only the node and inputs dicts are copied, since prompt validation normalizes
+    input values in place. Nested values such as embedded images or subgraph definitions are
+    shared between the template and every prompt made from it, treat them as read-only.
+    """
+
+    def __init__(self, workflow: Dict[str, Any]):
+        # The one deep copy, so later changes to the caller's workflow don't leak in
+        self._nodes = copy.deepcopy(workflow)
+
+    def patch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Same as patch_workflow(workflow, params) for the workflow of the template."""
+        patched = {}
+        for node_id, node in self._nodes.items():
+            if not isinstance(node, dict):
+                patched[node_id] = node
+                continue
+            node = dict(node)
+            inputs = node.get("inputs")
+            updates = params.get(node_id)
+            if inputs is not None or updates is not None:
+                node["inputs"] = dict(inputs or {})
+            if updates:
+                node["inputs"].update(updates)
+            patched[node_id] = node
+        return patched
+
+
+def compile_workflow(workflow: Dict[str, Any]) -> WorkflowTemplate:
+    """
+    Compiles a workflow (API format) into a WorkflowTemplate for repeated patching.
+    """
+    return WorkflowTemplate(workflow)
+
+
+def patch_workflow(workflow: Union[Dict[str, Any], WorkflowTemplate], params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Patches a ComfyUI workflow (API format) with dynamic parameters.
     
     Args:
-        workflow (Dict[str, Any]): The base workflow in ComfyUI API format (key=node_id, value=node_data).
+        workflow (Dict[str, Any]): The base workflow in ComfyUI API format (key=node_id, value=node_data),
+                                   or a WorkflowTemplate from compile_workflow.
         params (Dict[str, Any]): A dictionary of parameters to inject. 
                                  Format: { node_id: { input_name: value } }
     
     Returns:
         Dict[str, Any]: The patched workflow.
     """
-    import copy
+    if isinstance(workflow, WorkflowTemplate):
+        return workflow.patch(params)
+
     patched = copy.deepcopy(workflow)
     
     for node_id, updates in params.items():
@@ -28,3 +72,14 @@ def patch_workflow(workflow: Dict[str, Any], params: Dict[str, Any]) -> Dict[str
             pass
             
     return patched
+
+
+def patch_workflow_batch(workflow: Union[Dict[str, Any], WorkflowTemplate], param_sets: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Patches a workflow once for each parameter set, for bulk submission.
+
+    The workflow is compiled once, see WorkflowTemplate for what the results share.
+    """
+    if not isinstance(workflow, WorkflowTemplate):
+        workflow = compile_workflow(workflow)
+    return [workflow.patch(params) for params in param_sets]
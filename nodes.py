@@ -12,6 +12,8 @@ import math
 import time
 import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image, ImageOps, ImageSequence
 from PIL.PngImagePlugin import PngInfo
@@ -31,6 +33,7 @@ from comfy.comfy_types import IO, ComfyNodeABC, InputTypeDict, FileLocator
 from comfy_api.internal import register_versions, ComfyAPIWithVersion
 from comfy_api.version_list import supported_versions
 from comfy_api.latest import io, ComfyExtension
+from comfy_execution.utils import get_executing_context
 
 import comfy.clip_vision
 
@@ -49,8 +52,8 @@ if args.enable_manager:
 def before_node_execution():
     comfy.model_management.throw_exception_if_processing_interrupted()
 
-def interrupt_processing(value=True):
-    comfy.model_management.interrupt_current_processing(value)
+def interrupt_processing(value=True, prompt_id=None):
+    comfy.model_management.interrupt_current_processing(value, prompt_id=prompt_id)
 
 MAX_RESOLUTION=16384
 
@@ -290,6 +293,7 @@ class VAEDecode:
     RETURN_TYPES = ("IMAGE",)
     OUTPUT_TOOLTIPS = ("The decoded image.",)
     FUNCTION = "decode"
+    BATCH_LIST_INPUTS = ("samples",)
 
     CATEGORY = "latent"
     DESCRIPTION = "Decodes latent images back into pixel space images."
@@ -339,6 +343,7 @@ class VAEEncode:
         return {"required": { "pixels": ("IMAGE", ), "vae": ("VAE", )}}
     RETURN_TYPES = ("LATENT",)
     FUNCTION = "encode"
+    BATCH_LIST_INPUTS = ("pixels",)
 
     CATEGORY = "latent"
 
@@ -474,7 +479,7 @@ class SaveLatent:
     CATEGORY = "_for_testing"
 
     def save(self, samples, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir)
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, count=1)
 
         # support save metadata for latent sharing
         prompt_info = ""
@@ -518,6 +523,7 @@ class LoadLatent:
 
     RETURN_TYPES = ("LATENT", )
     FUNCTION = "load"
+    THREAD_SAFE = True
 
     def load(self, latent):
         latent_path = folder_paths.get_annotated_filepath(latent)
@@ -675,7 +681,7 @@ class LoraLoader:
                 self.loaded_lora = None
 
         if lora is None:
-            lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+            lora = comfy.utils.load_torch_file(lora_path, safe_load=True, cache=True)
             self.loaded_lora = (lora_path, lora)
 
         model_lora, clip_lora = comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
@@ -1571,6 +1577,65 @@ class KSamplerAdvanced:
             disable_noise = True
         return common_ksampler(model, noise_seed, steps, cfg, sampler_name, scheduler, positive, negative, latent_image, denoise=denoise, disable_noise=disable_noise, start_step=start_at_step, last_step=end_at_step, force_full_denoise=force_full_denoise)
 
+_image_save_pool = None
+# path -> future of the files still being written with --async-image-save
+_pending_image_saves = {}
+# prompt id -> [(node id, path, future)] of the files its nodes are still writing
+_prompt_image_saves = {}
+_pending_image_saves_lock = threading.Lock()
+
+def get_image_save_pool():
+    global _image_save_pool
+    if _image_save_pool is None:
+        _image_save_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="comfy_image_save")
+    return _image_save_pool
+
+def save_png(image, path, metadata, compress_level):
+    i = 255. * image.cpu().numpy()
+    img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+    img.save(path, pnginfo=metadata, compress_level=compress_level)
+
+def submit_image_save(path, func, *func_args):
+    """Writes a file on the image save pool without waiting for it, see pending_image_save and wait_for_image_saves."""
+    key = os.path.normcase(os.path.abspath(path))
+    context = get_executing_context()
+    future = get_image_save_pool().submit(func, *func_args)
+
+    def done(f):
+        with _pending_image_saves_lock:
+            if _pending_image_saves.get(key) is f:
+                del _pending_image_saves[key]
+
+    with _pending_image_saves_lock:
+        _pending_image_saves[key] = future
+        if context is None:
+            _prompt_image_saves.setdefault(None, []).append((None, path, future))
+        else:
+            _prompt_image_saves.setdefault(context.prompt_id, []).append((context.node_id, path, future))
+    future.add_done_callback(done)
+    return future
+
+def pending_image_save(path):
+    """Returns the future of the file still being written to path, or None."""
+    with _pending_image_saves_lock:
+        return _pending_image_saves.get(os.path.normcase(os.path.abspath(path)))
+
+def wait_for_image_saves(prompt_id=None):
+    """
+    Waits for the files the nodes of prompt_id are still writing, or the ones submitted outside of a prompt.
+    Returns (node_id, path, exception) for the first file that couldn't be written, or None.
+    """
+    with _pending_image_saves_lock:
+        pending = _prompt_image_saves.pop(prompt_id, [])
+    failed = None
+    for node_id, path, future in pending:
+        e = future.exception()
+        if e is not None:
+            logging.error(f"Error saving image {path}: {e}")
+            if failed is None:
+                failed = (node_id, path, e)
+    return failed
+
 class SaveImage:
     def __init__(self):
         self.output_dir = folder_paths.get_output_directory()
@@ -1600,30 +1665,35 @@ class SaveImage:
 
     def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         filename_prefix += self.prefix_append
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
-        results = list()
-        for (batch_number, image) in enumerate(images):
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-
-            filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
-            results.append({
-                "filename": file,
-                "subfolder": subfolder,
-                "type": self.type
-            })
-            counter += 1
+        metadata = None
+        if not args.disable_metadata:
+            metadata = PngInfo()
+            if prompt is not None:
+                metadata.add_text("prompt", json.dumps(prompt))
+            if extra_pnginfo is not None:
+                for x in extra_pnginfo:
+                    metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+
+        for attempt in range(2):
+            full_output_folder, filename, counter, subfolder, _ = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0], count=len(images))
+            files = [f"{filename.replace('%batch_num%', str(batch_number))}_{counter + batch_number:05}_.png" for batch_number in range(len(images))]
+            if attempt > 0 or not any(os.path.exists(os.path.join(full_output_folder, file)) for file in files):
+                break
+            # something that doesn't reserve its counters wrote to the folder, list it again
+            folder_paths.forget_save_image_counter(full_output_folder, filename)
+
+        paths = [os.path.join(full_output_folder, file) for file in files]
+        if args.async_image_save:
+            for image, path in zip(images, paths):
+                submit_image_save(path, save_png, image, path, metadata, self.compress_level)
+        elif len(paths) == 1:
+            save_png(images[0], paths[0], metadata, self.compress_level)
+        else:
+            pool = get_image_save_pool()
+            for future in [pool.submit(save_png, image, path, metadata, self.compress_level) for image, path in zip(images, paths)]:
+                future.result()
 
+        results = [{"filename": file, "subfolder": subfolder, "type": self.type} for file in files]
         return { "ui": { "images": results } }
 
 class PreviewImage(SaveImage):
@@ -1654,6 +1724,7 @@ class LoadImage:
 
     RETURN_TYPES = ("IMAGE", "MASK")
     FUNCTION = "load_image"
+    THREAD_SAFE = True
     def load_image(self, image):
         image_path = folder_paths.get_annotated_filepath(image)
 
@@ -1731,6 +1802,7 @@ class LoadImageMask:
 
     RETURN_TYPES = ("MASK",)
     FUNCTION = "load_image"
+    THREAD_SAFE = True
     def load_image(self, image, channel):
         image_path = folder_paths.get_annotated_filepath(image)
         i = node_helpers.pillow(Image.open, image_path)
@@ -1846,6 +1918,7 @@ class ImageInvert:
 
     RETURN_TYPES = ("IMAGE",)
     FUNCTION = "invert"
+    BATCH_LIST_INPUTS = ("image",)
 
     CATEGORY = "image"
 
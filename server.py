@@ -1,13 +1,18 @@
 import os
 import sys
 import asyncio
+import threading
 import traceback
 import time
+import functools
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import nodes
 import folder_paths
 import execution
-from comfy_execution.jobs import JobStatus, get_job, get_all_jobs
+from comfy_execution.jobs import JobStatus, get_job, get_all_jobs, get_job_store, get_job_store_executor
 import uuid
 import urllib
 import json
@@ -28,6 +33,7 @@ import mimetypes
 from comfy.cli_args import args
 import comfy.utils
 import comfy.model_management
+import comfy.model_index
 from comfy_api import feature_flags
 import node_helpers
 from comfyui_version import __version__
@@ -60,6 +66,145 @@ async def send_socket_catch_exception(function, message):
     except (aiohttp.ClientError, aiohttp.ClientPayloadError, ConnectionResetError, BrokenPipeError, ConnectionError) as err:
         logging.warning("send error: {}".format(err))
 
+# Seconds to wait for more progress/status updates before sending, so they can be coalesced
+WS_COALESCE_WINDOW = 0.05
+# Messages buffered per websocket before messages for a slow client are dropped
+WS_SEND_BUFFER_SIZE = 128
+
+# Events that are superseded by a newer event of the same kind, these can be dropped
+DROPPABLE_WS_EVENTS = frozenset({
+    "status",
+    "progress",
+    "progress_state",
+    BinaryEventTypes.PREVIEW_IMAGE,
+    BinaryEventTypes.UNENCODED_PREVIEW_IMAGE,
+    BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA,
+})
+
+
+def ws_coalesce_key(event, data, sid):
+    """Key under which a pending event is replaced by a newer one, None if it is never replaced."""
+    if event == "status":
+        return (event, sid)
+    if event == "progress":
+        return (event, sid, data.get("prompt_id"), data.get("node"))
+    if event == "progress_state":
+        return (event, sid, data.get("prompt_id"))
+    if event == BinaryEventTypes.UNENCODED_PREVIEW_IMAGE:
+        return (event, sid)
+    if event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA:
+        metadata = data[1] or {}
+        return (event, sid, metadata.get("prompt_id"), metadata.get("node_id"))
+    return None
+
+
+def coalesce_ws_messages(messages):
+    """Drop messages that are followed by a newer message with the same coalesce key."""
+    last = {}
+    for i, msg in enumerate(messages):
+        key = ws_coalesce_key(*msg)
+        if key is not None:
+            last[key] = i
+    return [msg for i, msg in enumerate(messages) if last.get(ws_coalesce_key(*msg), i) == i]
+
+
+class WebSocketWriter:
+    """
+    Sends messages to a websocket from a bounded buffer, so a slow client does not hold
+    up the others. When the buffer is full the oldest droppable message is discarded, a
+    client that cannot even keep up with the other messages is disconnected.
+    """
+
+    def __init__(self, ws, max_size=WS_SEND_BUFFER_SIZE):
+        self.ws = ws
+        self.max_size = max_size
+        self.buffer = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, message, droppable=False):
+        if self.closed:
+            return
+        if len(self.buffer) >= self.max_size:
+            index = next((i for i, (_, d) in enumerate(self.buffer) if d), None)
+            if index is not None:
+                del self.buffer[index]
+            elif droppable:
+                return
+            else:
+                logging.warning("websocket client is not reading messages, disconnecting")
+                self.close()
+                asyncio.create_task(self.ws.close())
+                return
+        self.buffer.append((message, droppable))
+        self.ready.set()
+
+    async def _run(self):
+        while True:
+            await self.ready.wait()
+            while self.buffer:
+                message, _ = self.buffer.popleft()
+                if isinstance(message, str):
+                    await send_socket_catch_exception(self.ws.send_str, message)
+                else:
+                    await send_socket_catch_exception(self.ws.send_bytes, message)
+            self.ready.clear()
+
+    def close(self):
+        self.closed = True
+        self.buffer.clear()
+        self.task.cancel()
+
+# (format, quality) for each --preview-format
+PREVIEW_FORMATS = {
+    "jpeg": ("JPEG", 95),
+    "jpeg-low": ("JPEG", 60),
+    "webp": ("WEBP", 80),
+}
+
+# Number of rendered /view?preview= images kept in memory
+VIEW_PREVIEW_CACHE_SIZE = 64
+# Number of (client, node) pairs whose last sent preview is remembered
+PREVIEW_SEQUENCE_KEYS = 1024
+
+
+def encode_preview_image(image_data, allow_webp=False):
+    """
+    Resize and encode a sampler preview, returns (image_format, bytes).
+
+    This runs on the preview thread pool, not on the event loop.
+    """
+    image_type, image, max_size = image_data[:3]
+    if max_size is not None and (not args.preview_downscale_only or max(image.size) > max_size):
+        if hasattr(Image, 'Resampling'):
+            resampling = Image.Resampling.BILINEAR
+        else:
+            resampling = Image.Resampling.LANCZOS
+
+        image = ImageOps.contain(image, (max_size, max_size), resampling)
+
+    quality = 95
+    if image_type == "JPEG":
+        image_type, quality = PREVIEW_FORMATS[args.preview_format]
+        if image_type == "WEBP" and not allow_webp:
+            image_type, quality = PREVIEW_FORMATS["jpeg"]
+
+    bytesIO = BytesIO()
+    image.save(bytesIO, format=image_type, quality=quality, compress_level=1)
+    return image_type, bytesIO.getvalue()
+
+
+@functools.lru_cache(maxsize=VIEW_PREVIEW_CACHE_SIZE)
+def render_view_preview(file, mtime_ns, image_format, quality, channel):
+    """Encode the /view?preview= version of an image, mtime_ns keeps stale renders from being served."""
+    with Image.open(file) as img:
+        if image_format in ['jpeg'] or channel == 'rgb':
+            img = img.convert("RGB")
+        buffer = BytesIO()
+        img.save(buffer, format=image_format, quality=quality)
+        return buffer.getvalue()
+
 # Track deprecated paths that have been warned about to only warn once per file
 _deprecated_paths_warned = set()
 
@@ -190,7 +335,22 @@ def create_block_external_middleware():
     return block_external_middleware
 
 
+def _prompt_worker_state(name):
+    # Each prompt worker thread sees the values it set itself. Other threads (the event loop)
+    # see whatever was set last, which is the behaviour of a single worker.
+    def getter(self):
+        return getattr(self._worker_state, name, getattr(self, "_last_" + name))
+
+    def setter(self, value):
+        setattr(self._worker_state, name, value)
+        setattr(self, "_last_" + name, value)
+    return property(getter, setter)
+
 class PromptServer():
+    client_id = _prompt_worker_state("client_id")
+    last_node_id = _prompt_worker_state("last_node_id")
+    last_prompt_id = _prompt_worker_state("last_prompt_id")
+
     def __init__(self, loop):
         PromptServer.instance = self
 
@@ -207,6 +367,13 @@ class PromptServer():
         self.prompt_queue = execution.PromptQueue(self)
         self.loop = loop
         self.messages = asyncio.Queue()
+        # A status message is computed on the event loop once per coalesce window after queue changes
+        self.queue_status_pending = False
+        self.preview_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="comfy_preview")
+        # Previews are encoded concurrently, one that finishes after a newer preview of the same
+        # node for the same client is dropped instead of being sent out of order
+        self.preview_sequence = itertools.count()
+        self.preview_sent = {}
         self.client_session:Optional[aiohttp.ClientSession] = None
         self.number = 0
 
@@ -229,6 +396,7 @@ class PromptServer():
         self.app = web.Application(client_max_size=max_upload_size, middlewares=middlewares)
         self.sockets = dict()
         self.sockets_metadata = dict()
+        self.socket_writers = dict()
         self.web_root = (
             FrontendManager.init_frontend(args.front_end_version)
             if args.front_end_root is None
@@ -237,8 +405,10 @@ class PromptServer():
         logging.info(f"[Prompt Server] web root: {self.web_root}")
         routes = web.RouteTableDef()
         self.routes = routes
-        self.last_node_id = None
-        self.client_id = None
+        self._worker_state = threading.local()
+        self._last_client_id = None
+        self._last_last_node_id = None
+        self._last_last_prompt_id = None
 
         self.on_prompt_handlers = []
 
@@ -250,11 +420,16 @@ class PromptServer():
             if sid:
                 # Reusing existing session, remove old
                 self.sockets.pop(sid, None)
+                old_writer = self.socket_writers.pop(sid, None)
+                if old_writer is not None:
+                    old_writer.close()
             else:
                 sid = uuid.uuid4().hex
 
             # Store WebSocket for backward compatibility
             self.sockets[sid] = ws
+            writer = WebSocketWriter(ws)
+            self.socket_writers[sid] = writer
             # Store metadata separately
             self.sockets_metadata[sid] = {"feature_flags": {}}
 
@@ -298,6 +473,9 @@ class PromptServer():
                         except Exception as e:
                             logging.error(f"Error processing WebSocket message: {e}")
             finally:
+                writer.close()
+                if self.socket_writers.get(sid) is writer:
+                    self.socket_writers.pop(sid)
                 self.sockets.pop(sid, None)
                 self.sockets_metadata.pop(sid, None)
             return ws
@@ -499,26 +677,31 @@ class PromptServer():
                 filename = os.path.basename(filename)
                 file = os.path.join(output_dir, filename)
 
+                # --async-image-save may still be writing it
+                pending = nodes.pending_image_save(file)
+                if pending is not None:
+                    try:
+                        await asyncio.wrap_future(pending)
+                    except Exception:
+                        pass
+
                 if os.path.isfile(file):
                     if 'preview' in request.rel_url.query:
-                        with Image.open(file) as img:
-                            preview_info = request.rel_url.query['preview'].split(';')
-                            image_format = preview_info[0]
-                            if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
-                                image_format = 'webp'
+                        preview_info = request.rel_url.query['preview'].split(';')
+                        image_format = preview_info[0]
+                        if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
+                            image_format = 'webp'
 
-                            quality = 90
-                            if preview_info[-1].isdigit():
-                                quality = int(preview_info[-1])
+                        quality = 90
+                        if preview_info[-1].isdigit():
+                            quality = int(preview_info[-1])
 
-                            buffer = BytesIO()
-                            if image_format in ['jpeg'] or request.rel_url.query.get('channel', '') == 'rgb':
-                                img = img.convert("RGB")
-                            img.save(buffer, format=image_format, quality=quality)
-                            buffer.seek(0)
+                        body = await asyncio.get_running_loop().run_in_executor(
+                            self.preview_executor, render_view_preview, file, os.stat(file).st_mtime_ns,
+                            image_format, quality, request.rel_url.query.get('channel', ''))
 
-                            return web.Response(body=buffer.read(), content_type=f'image/{image_format}',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
+                        return web.Response(body=body, content_type=f'image/{image_format}',
+                                            headers={"Content-Disposition": f"filename=\"{filename}\""})
 
                     if 'channel' not in request.rel_url.query:
                         channel = 'rgba'
@@ -589,13 +772,10 @@ class PromptServer():
             safetensors_path = folder_paths.get_full_path(folder_name, filename)
             if safetensors_path is None:
                 return web.Response(status=404)
-            out = comfy.utils.safetensors_header(safetensors_path, max_size=1024*1024)
-            if out is None:
-                return web.Response(status=404)
-            dt = json.loads(out)
-            if not "__metadata__" in dt:
+            metadata = comfy.model_index.get_model_index().get_metadata(safetensors_path)
+            if metadata is None:
                 return web.Response(status=404)
-            return web.json_response(dt["__metadata__"])
+            return web.json_response(metadata)
 
         @routes.get("/system_stats")
         async def system_stats(request):
@@ -771,20 +951,26 @@ class PromptServer():
                         status=400
                     )
 
+            job_store = get_job_store()
             running, queued = self.prompt_queue.get_current_queue_volatile()
-            history = self.prompt_queue.get_history()
+            history = self.prompt_queue.get_history() if job_store is None else {}
 
             running = _remove_sensitive_from_queue(running)
             queued = _remove_sensitive_from_queue(queued)
 
-            jobs, total = get_all_jobs(
-                running, queued, history,
-                status_filter=status_filter,
-                workflow_id=workflow_id,
-                sort_by=sort_by,
-                sort_order=sort_order,
-                limit=limit,
-                offset=offset
+            jobs, total = await asyncio.get_running_loop().run_in_executor(
+                get_job_store_executor(),
+                functools.partial(
+                    get_all_jobs,
+                    running, queued, history,
+                    status_filter=status_filter,
+                    workflow_id=workflow_id,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                    limit=limit,
+                    offset=offset,
+                    job_store=job_store
+                )
             )
 
             has_more = (offset + len(jobs)) < total
@@ -815,7 +1001,10 @@ class PromptServer():
             running = _remove_sensitive_from_queue(running)
             queued = _remove_sensitive_from_queue(queued)
 
-            job = get_job(job_id, running, queued, history)
+            job = await asyncio.get_running_loop().run_in_executor(
+                get_job_store_executor(),
+                functools.partial(get_job, job_id, running, queued, history, job_store=get_job_store())
+            )
             if job is None:
                 return web.json_response(
                     {"error": "Job not found"},
@@ -913,8 +1102,7 @@ class PromptServer():
             if "delete" in json_data:
                 to_delete = json_data['delete']
                 for id_to_delete in to_delete:
-                    delete_func = lambda a: a[1] == id_to_delete
-                    self.prompt_queue.delete_queue_item(delete_func)
+                    self.prompt_queue.delete_queue_item_by_id(id_to_delete)
 
             return web.Response(status=200)
 
@@ -940,7 +1128,7 @@ class PromptServer():
                         break
 
                 if should_interrupt:
-                    nodes.interrupt_processing()
+                    nodes.interrupt_processing(prompt_id=prompt_id)
                 else:
                     logging.info(f"Prompt {prompt_id} is not currently running, skipping interrupt")
             else:
@@ -1068,43 +1256,37 @@ class PromptServer():
         message.extend(data)
         return message
 
-    async def send_image(self, image_data, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
+    def _preview_is_latest(self, key, sequence):
+        if self.preview_sent.get(key, -1) > sequence:
+            return False
+        if key not in self.preview_sent and len(self.preview_sent) >= PREVIEW_SEQUENCE_KEYS:
+            self.preview_sent.clear()
+        self.preview_sent[key] = sequence
+        return True
 
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
+    async def send_image(self, image_data, sid=None):
+        sequence = next(self.preview_sequence)
+        image_type, preview_bytes = await asyncio.get_running_loop().run_in_executor(
+            self.preview_executor, encode_preview_image, image_data)
+        if not self._preview_is_latest((sid, None), sequence):
+            return
         type_num = 1
         if image_type == "JPEG":
             type_num = 1
         elif image_type == "PNG":
             type_num = 2
 
-        bytesIO = BytesIO()
         header = struct.pack(">I", type_num)
-        bytesIO.write(header)
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        preview_bytes = bytesIO.getvalue()
-        await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE, preview_bytes, sid=sid)
+        await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE, header + preview_bytes, sid=sid)
 
     async def send_image_with_metadata(self, image_data, metadata=None, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
+        sequence = next(self.preview_sequence)
+        image_type, image_bytes = await asyncio.get_running_loop().run_in_executor(
+            self.preview_executor, functools.partial(encode_preview_image, image_data, allow_webp=True))
+        if not self._preview_is_latest((sid, (metadata or {}).get("node_id")), sequence):
+            return
 
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-
-        mimetype = "image/png" if image_type == "PNG" else "image/jpeg"
+        mimetype = "image/{}".format(image_type.lower())
 
         # Prepare metadata
         if metadata is None:
@@ -1112,15 +1294,9 @@ class PromptServer():
         metadata["image_type"] = mimetype
 
         # Serialize metadata as JSON
-        import json
         metadata_json = json.dumps(metadata).encode('utf-8')
         metadata_length = len(metadata_json)
 
-        # Prepare image data
-        bytesIO = BytesIO()
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        image_bytes = bytesIO.getvalue()
-
         # Combine metadata and image
         combined_data = bytearray()
         combined_data.extend(struct.pack(">I", metadata_length))
@@ -1129,37 +1305,49 @@ class PromptServer():
 
         await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, combined_data, sid=sid)
 
+    def _write_message(self, message, sid, droppable):
+        # The message is encoded once and buffered for each socket
+        if sid is None:
+            writers = list(self.socket_writers.values())
+            for writer in writers:
+                writer.put(message, droppable)
+        elif sid in self.socket_writers:
+            self.socket_writers[sid].put(message, droppable)
+
     async def send_bytes(self, event, data, sid=None):
         message = self.encode_bytes(event, data)
-
-        if sid is None:
-            sockets = list(self.sockets.values())
-            for ws in sockets:
-                await send_socket_catch_exception(ws.send_bytes, message)
-        elif sid in self.sockets:
-            await send_socket_catch_exception(self.sockets[sid].send_bytes, message)
+        self._write_message(message, sid, event in DROPPABLE_WS_EVENTS)
 
     async def send_json(self, event, data, sid=None):
-        message = {"type": event, "data": data}
-
-        if sid is None:
-            sockets = list(self.sockets.values())
-            for ws in sockets:
-                await send_socket_catch_exception(ws.send_json, message)
-        elif sid in self.sockets:
-            await send_socket_catch_exception(self.sockets[sid].send_json, message)
+        message = json.dumps({"type": event, "data": data})
+        self._write_message(message, sid, event in DROPPABLE_WS_EVENTS)
 
     def send_sync(self, event, data, sid=None):
         self.loop.call_soon_threadsafe(
             self.messages.put_nowait, (event, data, sid))
 
     def queue_updated(self):
-        self.send_sync("status", { "status": self.get_queue_info() })
+        # Called under the queue mutex on every change, the status itself is computed later
+        if self.queue_status_pending:
+            return
+        self.queue_status_pending = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, WS_COALESCE_WINDOW, self._send_queue_status)
+
+    def _send_queue_status(self):
+        self.queue_status_pending = False
+        self.messages.put_nowait(("status", { "status": self.get_queue_info() }, None))
 
     async def publish_loop(self):
         while True:
             msg = await self.messages.get()
-            await self.send(*msg)
+            if ws_coalesce_key(*msg) is not None and not self.messages.empty():
+                # Give a burst of progress updates the chance to replace each other
+                await asyncio.sleep(WS_COALESCE_WINDOW)
+            messages = [msg]
+            while not self.messages.empty():
+                messages.append(self.messages.get_nowait())
+            for msg in coalesce_ws_messages(messages):
+                await self.send(*msg)
 
     async def start(self, address, port, verbose=True, call_on_start=None):
         await self.start_multi_address([(address, port)], call_on_start=call_on_start)
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import db, job_store
+from app.database.models import Base
+from comfy_execution.jobs import (
+    JobStatus,
+    delete_history_items,
+    get_all_jobs,
+    get_job,
+    get_job_store,
+    get_job_store_executor,
+    history_item_to_job_record,
+    save_history_item,
+)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    monkeypatch.setattr(db, "_DB_AVAILABLE", True)
+    yield get_job_store()
+    engine.dispose()
+
+
+def make_queue_item(number, create_time, workflow_id="wf"):
+    extra_data = {"create_time": create_time, "extra_pnginfo": {"workflow": {"id": workflow_id}}}
+    return (number, "prompt-{}".format(number), {"1": {}}, extra_data, ["1"])
+
+
+def make_history_item(number, create_time, failed=False, duration=1, workflow_id="wf"):
+    messages = [
+        ("execution_start", {"timestamp": create_time}),
+        ("execution_error" if failed else "execution_success", {"timestamp": create_time + duration}),
+    ]
+    return {
+        "prompt": make_queue_item(number, create_time, workflow_id),
+        "outputs": {"9": {"images": [{"filename": "a.png", "type": "output"}]}},
+        "status": {"status_str": "error" if failed else "success", "completed": not failed, "messages": messages},
+        "meta": {},
+    }
+
+
+def test_get_job_store_requires_session(monkeypatch):
+    monkeypatch.setattr(db, "Session", None)
+    assert get_job_store() is None
+
+
+def test_get_job_from_store(store):
+    item = make_history_item(3, 1000)
+    job_store.save_job("prompt-3", history_item_to_job_record("prompt-3", item))
+    job = get_job("prompt-3", [], [], {}, job_store=store)
+    assert job["status"] == JobStatus.COMPLETED
+    assert job["outputs_count"] == 1
+    assert job["outputs"] == item["outputs"]
+    assert job["workflow"]["extra_data"]["create_time"] == 1000
+    assert get_job("missing", [], [], {}, job_store=store) is None
+
+
+def test_save_replaces_and_delete(store):
+    job_store.save_job("prompt-1", history_item_to_job_record("prompt-1", make_history_item(1, 10)))
+    job_store.save_job("prompt-1", history_item_to_job_record("prompt-1", make_history_item(1, 10, failed=True)))
+    assert job_store.count_jobs(JobStatus.ALL) == 1
+    assert job_store.get_job_record("prompt-1")["status"] == JobStatus.FAILED
+    job_store.delete_job("prompt-1")
+    assert job_store.count_jobs(JobStatus.ALL) == 0
+
+
+@pytest.mark.parametrize("sort_by", ["created_at", "execution_duration"])
+@pytest.mark.parametrize("sort_order", ["asc", "desc"])
+def test_pages_match_in_memory_listing(store, sort_by, sort_order):
+    rng = random.Random(0)
+    history = {}
+    for number in range(40):
+        item = make_history_item(number, rng.randint(0, 20), failed=rng.random() < 0.3,
+                                 duration=rng.randint(0, 5), workflow_id=rng.choice(["a", "b"]))
+        history[item["prompt"][1]] = item
+        job_store.save_job(item["prompt"][1], history_item_to_job_record(item["prompt"][1], item))
+    running = [make_queue_item(40, rng.randint(0, 20))]
+    queued = [make_queue_item(n, rng.randint(0, 20), rng.choice(["a", "b"])) for n in range(41, 50)]
+
+    for status_filter in [None, [JobStatus.FAILED, JobStatus.PENDING]]:
+        for workflow_id in [None, "a"]:
+            for offset, limit in [(0, None), (0, 7), (5, 7), (12, 5), (30, 30), (60, 3)]:
+                kwargs = dict(status_filter=status_filter, workflow_id=workflow_id, sort_by=sort_by,
+                              sort_order=sort_order, limit=limit, offset=offset)
+                expected = get_all_jobs(running, queued, history, **kwargs)
+                assert get_all_jobs(running, queued, {}, job_store=store, **kwargs) == expected
+
+
+def test_history_writes_run_in_order_on_the_job_store_thread(store):
+    for number in range(3):
+        save_history_item("prompt-{}".format(number), make_history_item(number, 10))
+    delete_history_items("prompt-1")
+    get_job_store_executor().submit(lambda: None).result()
+    assert job_store.count_jobs(JobStatus.ALL) == 2
+    assert job_store.get_job_record("prompt-1") is None
+    delete_history_items()
+    get_job_store_executor().submit(lambda: None).result()
+    assert job_store.count_jobs(JobStatus.ALL) == 0
@@ -0,0 +1,101 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+import pytest_asyncio
+import torch
+from aiohttp import web
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+# Import the top level utils package before comfy/ ends up at the front of sys.path
+import utils.install_util  # noqa: F401
+from comfy_api_nodes.util import sessions
+from comfy_api_nodes.util.download_helpers import download_url_as_bytesio, download_urls_as_bytesio
+from comfy_api_nodes.util.upload_helpers import upload_file
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def server():
+    peers = set()
+    uploads = {}
+
+    async def handler(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.Response(body=request.match_info["name"].encode("utf-8"))
+
+    async def upload_handler(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        uploads[request.match_info["name"]] = (await request.read(), request.headers.get("Content-Type"))
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get("/files/{name}", handler)
+    app.router.add_put("/files/{name}", upload_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    yield "http://127.0.0.1:{}".format(port), peers, uploads
+    await sessions.close_session()
+    await runner.cleanup()
+
+
+async def test_requests_reuse_the_connection(server):
+    base_url, peers, _ = server
+    for name in ["a", "b", "c"]:
+        out = await download_url_as_bytesio("{}/files/{}".format(base_url, name))
+        assert out.read() == name.encode("utf-8")
+    assert len(peers) == 1
+    assert sessions.get_session() is sessions.get_session()
+
+
+async def test_bulk_download_keeps_order(server):
+    base_url, _, _ = server
+    names = [str(i) for i in range(10)]
+    out = await download_urls_as_bytesio(["{}/files/{}".format(base_url, name) for name in names], max_concurrency=3)
+    assert [b.read().decode("utf-8") for b in out] == names
+
+
+async def test_uploads_use_the_pooled_session(server):
+    base_url, peers, uploads = server
+    await upload_file(None, "{}/files/a.png".format(base_url), BytesIO(b"image a"), content_type="image/png")
+    await upload_file(None, "{}/files/b.bin".format(base_url), BytesIO(b"data b"))
+    assert uploads == {"a.png": (b"image a", "image/png"), "b.bin": (b"data b", None)}
+    assert len(peers) == 1
+
+
+async def test_gather_bounded_limits_concurrency():
+    running = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - i % 5))
+        running -= 1
+        return i
+
+    assert await sessions.gather_bounded((work(i) for i in range(10)), 3) == list(range(10))
+    assert peak == 3
+
+
+async def test_gather_bounded_cancels_the_rest_on_error():
+    finished = []
+
+    async def work(i):
+        if i == 1:
+            raise ValueError("failed")
+        await asyncio.sleep(0.05)
+        finished.append(i)
+
+    with pytest.raises(ValueError):
+        await sessions.gather_bounded([work(i) for i in range(6)], 2)
+    await asyncio.sleep(0.1)
+    assert finished == []
@@ -237,3 +237,98 @@ def test_duration_consistency(video_components):
     manual_duration = float(components.images.shape[0] / components.frame_rate)
 
     assert duration == pytest.approx(manual_duration)
+
+
+def frame_values(images):
+    return [round(float(x) * 255 / 25) for x in images[:, 0, 0, 0]]
+
+
+def test_video_from_file_frame_range():
+    """Only the selected frames are decoded, in order"""
+    file_path = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
+    try:
+        # Small keyframe interval so the range can seek past the first keyframe
+        with av.open(file_path, mode="w") as container:
+            stream = container.add_stream("h264", rate=30, options={"g": "8"})
+            stream.width = 16
+            stream.height = 16
+            stream.pix_fmt = "yuv420p"
+            for i in range(10):
+                img = torch.full((16, 16, 3), i * 25, dtype=torch.uint8).numpy()
+                container.mux(stream.encode(av.VideoFrame.from_ndarray(img, format="rgb24").reformat(format="yuv420p")))
+            container.mux(stream.encode(None))
+
+        video = VideoFromFile(file_path)
+        full = video.get_components()
+        assert frame_values(full.images) == list(range(10))
+
+        components = video.get_components_range(3, 9, 2)
+        assert frame_values(components.images) == [3, 5, 7]
+        assert components.frame_rate == Fraction(15)
+        assert torch.equal(components.images, full.images[3:9:2])
+
+        chunks = list(video.iter_frames(start_frame=1, chunk_size=4))
+        assert [c.shape[0] for c in chunks] == [4, 4, 1]
+        assert torch.equal(torch.cat(chunks), full.images[1:])
+    finally:
+        os.unlink(file_path)
+
+
+def test_video_from_components_range():
+    """Default range implementation slices the images and trims the audio"""
+    images = torch.rand(30, 2, 2, 3)
+    audio = AudioInput({"waveform": torch.rand(1, 2, 1000), "sample_rate": 100})
+    video = VideoFromComponents(VideoComponents(images=images, audio=audio, frame_rate=Fraction(10)))
+    components = video.get_components_range(10, 20)
+    assert torch.equal(components.images, images[10:20])
+    assert torch.equal(components.audio["waveform"], audio["waveform"][..., 100:200])
+    assert video.get_components_range(include_audio=False).audio is None
+
+
+def test_video_from_file_variable_frame_rate_range():
+    """Frames get the same index whether or not decoding starts at the first frame"""
+    file_path = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False).name
+    try:
+        with av.open(file_path, mode="w") as container:
+            stream = container.add_stream("h264", rate=30, options={"g": "4"})
+            stream.width = 16
+            stream.height = 16
+            stream.pix_fmt = "yuv420p"
+            stream.codec_context.time_base = Fraction(1, 30)
+            for i, pts in enumerate([0, 1, 2, 6, 7, 8, 15, 16, 17, 18, 25, 26]):
+                img = torch.full((16, 16, 3), i * 20, dtype=torch.uint8).numpy()
+                frame = av.VideoFrame.from_ndarray(img, format="rgb24").reformat(format="yuv420p")
+                frame.pts = pts
+                frame.time_base = Fraction(1, 30)
+                container.mux(stream.encode(frame))
+            container.mux(stream.encode(None))
+
+        video = VideoFromFile(file_path)
+        full = video.get_components().images
+        for split in range(1, 12):
+            head = video.get_components_range(0, split).images
+            tail = video.get_components_range(split).images
+            assert torch.equal(torch.cat([head, tail]), full)
+    finally:
+        os.unlink(file_path)
+
+
+def test_video_from_components_ram_usage_counts_cpu_tensors_only():
+    images = torch.zeros(2, 4, 4, 3)
+    audio = AudioInput({"waveform": torch.zeros(1, 2, 100, device="meta"), "sample_rate": 100})
+    video = VideoFromComponents(VideoComponents(images=images, audio=audio, frame_rate=Fraction(10)))
+    assert video.get_ram_usage() == images.nbytes
+
+
+def test_video_from_file_frame_buffer_is_chunked(monkeypatch):
+    """A bad frame count estimate doesn't allocate more than a chunk of frames, and chunks are joined in order"""
+    import comfy_api.latest._input_impl.video_types as video_types
+    file_path = create_test_video(width=16, height=16, frames=3)
+    try:
+        video = VideoFromFile(file_path)
+        expected = video.get_components().images
+        monkeypatch.setattr(video_types, "FRAME_BUFFER_CHUNK_BYTES", 16 * 16 * 3)
+        monkeypatch.setattr(VideoFromFile, "_estimate_selected_frames", lambda *args: 10**6)
+        assert torch.equal(video.get_components().images, expected)
+    finally:
+        os.unlink(file_path)
@@ -0,0 +1,109 @@
+import uuid
+
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.ldm.flux.model
+import comfy.ldm.wan.model
+import comfy.model_patcher
+import comfy.ops
+
+# Mock nodes module to prevent CUDA initialization during import
+mock_nodes = MagicMock()
+mock_nodes.MAX_RESOLUTION = 16384
+
+with patch.dict('sys.modules', {'nodes': mock_nodes, 'server': MagicMock()}):
+    from comfy_extras.nodes_easycache import BlockCacheHolder, BlockCacheNode, blockcache_block_keys, blockcache_forward_wrapper
+
+
+def init_weights(model):
+    torch.manual_seed(0)
+    for p in model.parameters():
+        torch.nn.init.normal_(p, std=0.1)
+    return model
+
+
+def wan_model():
+    model = comfy.ldm.wan.model.WanModel(in_dim=4, out_dim=4, dim=32, ffn_dim=64, freq_dim=16, text_dim=16, num_heads=2, num_layers=4,
+                                         text_len=8, operations=comfy.ops.disable_weight_init)
+    inputs = (torch.randn(1, 4, 2, 8, 8), torch.tensor([500.0]), torch.randn(1, 8, 16))
+    return init_weights(model), inputs, {}
+
+
+def flux_model():
+    model = comfy.ldm.flux.model.Flux(in_channels=4, out_channels=4, vec_in_dim=8, context_in_dim=16, hidden_size=32, mlp_ratio=2.0, num_heads=2,
+                                      depth=2, depth_single_blocks=2, axes_dim=[4, 6, 6], theta=10000, patch_size=2, qkv_bias=True,
+                                      guidance_embed=False, txt_ids_dims=[], operations=comfy.ops.disable_weight_init)
+    inputs = (torch.randn(1, 4, 8, 8), torch.tensor([0.5]), torch.randn(1, 8, 16))
+    return init_weights(model), inputs, {"y": torch.randn(1, 8)}
+
+
+def add_blockcache(diffusion_model, reuse_threshold):
+    container = torch.nn.Module()
+    container.diffusion_model = diffusion_model
+    patcher = comfy.model_patcher.ModelPatcher(container, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    patched = BlockCacheNode.execute(patcher, reuse_threshold, 0.0, 1.0, 0, False, False)[0]
+    transformer_options = comfy.model_patcher.create_model_options_clone(patched.model_options)["transformer_options"]
+    blockcache = transformer_options["blockcache"].clone()
+    blockcache.start_t = 1e9
+    blockcache.end_t = -1.0
+    transformer_options["blockcache"] = blockcache
+    transformer_options["sigmas"] = torch.tensor([0.5])
+    transformer_options["uuids"] = [uuid.uuid4()]
+    return transformer_options
+
+
+def run(diffusion_model, inputs, extra, transformer_options):
+    executor = lambda *a, **k: diffusion_model(*a, **k)
+    with torch.no_grad():
+        return blockcache_forward_wrapper(executor, *inputs, transformer_options=transformer_options, **extra)
+
+
+@pytest.mark.parametrize("make_model", [wan_model, flux_model])
+def test_skipped_blocks_reuse_the_cached_residual(make_model):
+    diffusion_model, inputs, extra = make_model()
+    with torch.no_grad():
+        expected = diffusion_model(*inputs, **extra)
+    transformer_options = add_blockcache(diffusion_model, 0.5)
+    blockcache = transformer_options["blockcache"]
+    blocks = len(blockcache.block_keys)
+    assert torch.allclose(run(diffusion_model, inputs, extra, transformer_options), expected, atol=1e-5)
+    assert blockcache.total_blocks_skipped == 0
+    # same input, the first block residual didn't change at all
+    assert torch.allclose(run(diffusion_model, inputs, extra, transformer_options), expected, atol=1e-5)
+    assert blockcache.total_blocks_skipped == blocks - 1
+    assert blockcache.total_blocks == blocks * 2
+
+
+def test_changed_inputs_run_every_block():
+    diffusion_model, inputs, extra = wan_model()
+    transformer_options = add_blockcache(diffusion_model, 0.01)
+    run(diffusion_model, inputs, extra, transformer_options)
+    other = (torch.randn_like(inputs[0]),) + inputs[1:]
+    with torch.no_grad():
+        expected = diffusion_model(*other, **extra)
+    assert torch.allclose(run(diffusion_model, other, extra, transformer_options), expected, atol=1e-5)
+    assert transformer_options["blockcache"].total_blocks_skipped == 0
+
+
+def test_cache_is_bounded():
+    blockcache = BlockCacheHolder(0.1, 0.0, 1.0, [], False, max_cache_mb=1)
+    residual = torch.zeros(256, 256)  # 256 KB
+    for key in range(3):
+        blockcache.store(key, residual, residual)
+    assert list(blockcache.cache.keys()) == [1, 2]
+    assert blockcache.cache_bytes == 4 * residual.nbytes
+    # too large to cache at all
+    blockcache.store(3, torch.zeros(1024, 1024), residual)
+    assert 3 not in blockcache.cache
+
+
+def test_unsupported_models():
+    assert blockcache_block_keys(torch.nn.Linear(4, 4)) is None
+    assert blockcache_block_keys(wan_model()[0]) == [("double_block", i) for i in range(4)]
+    assert blockcache_block_keys(flux_model()[0]) == [("double_block", 0), ("double_block", 1), ("single_block", 0), ("single_block", 1)]
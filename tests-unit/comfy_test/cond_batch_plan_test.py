@@ -0,0 +1,87 @@
+import uuid
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.conds
+import comfy.samplers
+from comfy.samplers import CondBatchPlan
+
+
+class Patcher:
+    def prepare_state(self, timestep):
+        pass
+
+    def apply_hooks(self, hooks):
+        return {}
+
+
+class Model:
+    def __init__(self):
+        self.current_patcher = Patcher()
+        self.memory_calls = 0
+        self.batch_sizes = []
+
+    def memory_required(self, input_shape, cond_shapes=None):
+        self.memory_calls += 1
+        return 0
+
+    def apply_model(self, x, t, c_crossattn=None, transformer_options=None):
+        self.batch_sizes.append(x.shape[0])
+        return x * 0.5 + c_crossattn.mean(dim=(1, 2)).reshape(-1, 1, 1, 1)
+
+
+def make_cond(value, **extra):
+    cond = {"model_conds": {"c_crossattn": comfy.conds.CONDCrossAttn(torch.full((1, 4, 8), value))}, "uuid": uuid.uuid4()}
+    cond.update(extra)
+    return cond
+
+
+def run_steps(model, conds, model_options, steps=3):
+    x = torch.randn(1, 4, 8, 8, generator=torch.Generator().manual_seed(0))
+    outs = []
+    for t in range(steps):
+        timestep = torch.tensor([float(steps - t)])
+        outs.append(comfy.samplers._calc_cond_batch(model, conds, x, timestep, model_options))
+    return outs
+
+
+def test_plan_matches_unplanned_results():
+    conds = [[make_cond(1.0), make_cond(2.0, area=(4, 4, 0, 0), strength=0.5)], [make_cond(-1.0)]]
+    expected = run_steps(Model(), conds, {})
+    model = Model()
+    plan = CondBatchPlan()
+    run_steps(model, conds, {"cond_batch_plan": plan}, steps=1)
+    planned_calls = model.memory_calls
+    out = run_steps(model, conds, {"cond_batch_plan": plan})
+    for e, o in zip(expected, out):
+        for a, b in zip(e, o):
+            assert torch.allclose(a, b)
+    # the area cond can't be batched with the others, that's two batches planned once
+    assert planned_calls == 2
+    assert model.memory_calls == planned_calls
+
+
+def test_accumulators_are_reused():
+    plan = CondBatchPlan()
+    model = Model()
+    x = torch.zeros(1, 4, 8, 8)
+    conds = [[make_cond(1.0)], [make_cond(2.0)]]
+    first = comfy.samplers._calc_cond_batch(model, conds, x, torch.tensor([1.0]), {"cond_batch_plan": plan})
+    buffers = list(plan.accumulators.values())[0]
+    second = comfy.samplers._calc_cond_batch(model, conds, x, torch.tensor([0.5]), {"cond_batch_plan": plan})
+    assert list(plan.accumulators.values())[0][0][0] is buffers[0][0]
+    # results are not the reused buffers
+    assert first[0] is not buffers[0][0] and torch.equal(first[0], second[0])
+
+
+def test_plan_follows_active_conds():
+    model = Model()
+    conds = [[make_cond(1.0), make_cond(2.0, timestep_start=1.5)], [make_cond(-1.0)]]
+    run_steps(model, conds, {"cond_batch_plan": CondBatchPlan()}, steps=3)
+    # the second cond only starts at the last step, which needs a new plan
+    assert model.memory_calls == 2
+    assert model.batch_sizes == [2, 2, 3]
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.conditioning_cache
+import comfy.model_patcher
+import comfy.sd
+from comfy.conditioning_cache import ConditioningCache
+
+
+class TextEncoder(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.proj = torch.nn.Linear(4, 8)
+        self.calls = 0
+        self.layer = None
+
+    def reset_clip_options(self):
+        self.layer = None
+
+    def set_clip_options(self, options):
+        self.layer = options.get("layer", self.layer)
+
+    def encode_token_weights(self, tokens):
+        self.calls += 1
+        x = torch.tensor([[float(t) for t, w in tokens["l"][0]]])
+        cond = self.proj(x.repeat(1, 4)[:, :4])
+        return cond.unsqueeze(0), cond, {"attention_mask": torch.ones(1, 4), "layer": self.layer}
+
+
+def make_clip(source=None):
+    clip = comfy.sd.CLIP(no_init=True)
+    clip.cond_stage_model = TextEncoder()
+    clip.patcher = comfy.model_patcher.ModelPatcher(clip.cond_stage_model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    clip.layer_idx = None
+    clip.tokenizer = None
+    clip.tokenizer_options = {}
+    clip.use_clip_schedule = False
+    clip.apply_hooks_to_conds = None
+    if source is not None:
+        comfy.conditioning_cache.conditioning_cache.set_model_source(clip.cond_stage_model, [source])
+    return clip
+
+
+TOKENS = {"l": [[(1, 1.0), (2, 1.0), (3, 1.0), (4, 1.0)]]}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ConditioningCache(1024 ** 2)
+    monkeypatch.setattr(comfy.conditioning_cache, "conditioning_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "text_encoder.safetensors")
+    with open(path, "wb") as f:
+        f.write(b"weights")
+    return path
+
+
+def test_same_tokens_are_encoded_once(cache, source):
+    clip = make_clip(source)
+    first = clip.encode_from_tokens_scheduled(TOKENS)
+    second = clip.encode_from_tokens_scheduled(TOKENS)
+    assert clip.cond_stage_model.calls == 1
+    assert torch.equal(first[0][0], second[0][0])
+    assert torch.equal(second[0][1]["pooled_output"], first[0][1]["pooled_output"])
+    assert "cond" not in second[0][1]
+
+    cond, pooled = clip.encode_from_tokens(TOKENS, return_pooled=True)
+    assert clip.cond_stage_model.calls == 1
+    assert torch.equal(cond, first[0][0])
+
+    clip.encode_from_tokens({"l": [[(1, 1.0), (2, 1.2), (3, 1.0), (4, 1.0)]]})
+    assert clip.cond_stage_model.calls == 2
+
+
+def test_layer_and_patches_are_part_of_the_key(cache, source):
+    clip = make_clip(source)
+    clip.encode_from_tokens(TOKENS)
+
+    other = clip.clone()
+    other.clip_layer(-2)
+    assert other.encode_from_tokens(TOKENS, return_dict=True)["layer"] == -2
+    assert clip.cond_stage_model.calls == 2
+
+    patched = clip.clone()
+    patched.add_patches({"proj.weight": ("diff", (torch.ones(8, 4),))}, 0.5)
+    patched.encode_from_tokens(TOKENS)
+    assert clip.cond_stage_model.calls == 3
+    patched.encode_from_tokens(TOKENS)
+    clip.encode_from_tokens(TOKENS)
+    assert clip.cond_stage_model.calls == 3
+
+
+def test_models_are_keyed_by_their_source_files(cache, source):
+    first = make_clip(source)
+    second = make_clip(source)
+    assert cache.make_key(first, TOKENS, False) == cache.make_key(second, TOKENS, False)
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = make_clip(source)
+    assert cache.make_key(third, TOKENS, False) != cache.make_key(first, TOKENS, False)
+
+    # the weights no longer match the file
+    first.load_sd(first.cond_stage_model.state_dict(), full_model=True)
+    assert cache.make_key(first, TOKENS, False) is None
+
+
+def test_models_without_source_are_not_cached(cache):
+    clip = make_clip()
+    assert cache.make_key(clip, TOKENS, False) is None
+    clip.encode_from_tokens(TOKENS)
+    clip.encode_from_tokens(TOKENS)
+    assert clip.cond_stage_model.calls == 2
+
+
+def test_hooks_are_not_cached(cache, source):
+    clip = make_clip(source)
+    clip.patcher.object_patches["proj"] = torch.nn.Identity()
+    assert cache.make_key(clip, TOKENS, False) is None
+
+
+def test_disk_entries_are_shared(tmp_path, monkeypatch, source):
+    directory = str(tmp_path / "conditioning")
+    cache = ConditioningCache(1024 ** 2, directory, 1024 ** 2)
+    monkeypatch.setattr(comfy.conditioning_cache, "conditioning_cache", cache)
+    clip = make_clip(source)
+    clip.add_patches({"proj.weight": ("diff", (torch.ones(8, 4),))}, 0.5)
+    expected = clip.encode_from_tokens(TOKENS, return_dict=True)
+    cache.flush()
+
+    # A fresh process loading the same file and LoRA
+    monkeypatch.setattr(comfy.conditioning_cache, "conditioning_cache", ConditioningCache(0, directory, 1024 ** 2))
+    other = make_clip(source)
+    other.add_patches({"proj.weight": ("diff", (torch.ones(8, 4),))}, 0.5)
+    other.cond_stage_model.load_state_dict(clip.cond_stage_model.state_dict())
+    out = other.encode_from_tokens(TOKENS, return_dict=True)
+    assert other.cond_stage_model.calls == 0
+    assert torch.equal(out["cond"], expected["cond"])
+    assert torch.equal(out["attention_mask"], expected["attention_mask"])
+    assert out["layer"] is None
@@ -0,0 +1,99 @@
+import uuid
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.conds
+import comfy.context_windows
+import comfy.samplers
+
+
+class Patcher:
+    def prepare_state(self, timestep):
+        pass
+
+    def apply_hooks(self, hooks):
+        return {}
+
+
+class VideoModel:
+    def __init__(self):
+        self.current_patcher = Patcher()
+        self.batch_sizes = []
+        self.windows = []
+
+    def memory_required(self, input_shape, cond_shapes=None):
+        return 0
+
+    def apply_model(self, x, t, c_crossattn=None, concat=None, transformer_options=None):
+        self.batch_sizes.append(x.shape[0])
+        window = transformer_options.get("context_window")
+        windows = transformer_options.get("context_windows", [window])
+        self.windows.append([w.index_list for w in windows])
+        return x * 0.5 + concat * 0.25 + c_crossattn.mean(dim=(1, 2)).reshape(-1, 1, 1, 1, 1)
+
+
+def make_cond(value, frames):
+    concat = torch.arange(frames, dtype=torch.float32).reshape(1, 1, frames, 1, 1).expand(1, 4, frames, 4, 4) * value
+    return [{"model_conds": {"c_crossattn": comfy.conds.CONDCrossAttn(torch.full((1, 4, 8), value)),
+                             "concat": comfy.conds.CONDNoiseShape(concat.clone())},
+             "uuid": uuid.uuid4()}]
+
+
+def make_handler(window_batch_size):
+    return comfy.context_windows.IndexListContextHandler(
+        context_schedule=comfy.context_windows.get_matching_context_schedule(comfy.context_windows.ContextSchedules.STATIC_STANDARD),
+        fuse_method=comfy.context_windows.get_matching_fuse_method(comfy.context_windows.ContextFuseMethods.PYRAMID),
+        context_length=4, context_overlap=1, dim=2, window_batch_size=window_batch_size)
+
+
+def run(handler, steps=2):
+    frames = 13
+    x = torch.randn(1, 4, frames, 4, 4, generator=torch.Generator().manual_seed(0))
+    conds = [make_cond(1.0, frames), make_cond(-1.0, frames)]
+    sigmas = torch.tensor([2.0, 1.0, 0.0])
+    model_options = {"transformer_options": {"sample_sigmas": sigmas}}
+    model = VideoModel()
+    outs = []
+    for step in range(steps):
+        outs.append(handler.execute(comfy.samplers._calc_cond_batch_outer, model, conds, x, sigmas[step:step + 1], model_options))
+    return outs, model, model_options
+
+
+def test_batched_windows_match_serial():
+    serial, serial_model, _ = run(make_handler(1))
+    batched, batched_model, _ = run(make_handler(3))
+    for s, b in zip(serial, batched):
+        for a, c in zip(s, b):
+            assert torch.equal(a, c)
+    # 4 windows of 4 frames, cond and uncond batched together
+    assert serial_model.batch_sizes == [2] * 8
+    assert batched_model.batch_sizes == [6, 2] * 2
+
+
+def test_resized_conds_are_reused():
+    handler = make_handler(1)
+    calls = []
+    get_resized_cond = handler.get_resized_cond
+    handler.get_resized_cond = lambda *a, **k: calls.append(1) or get_resized_cond(*a, **k)
+    _, _, model_options = run(handler, steps=2)
+    # 4 windows times 2 conds, resized on the first step only
+    assert len(calls) == 8
+    assert len(model_options["context_window_conds"]) == 8
+
+
+def test_batched_forward_lists_all_of_its_windows():
+    _, serial_model, _ = run(make_handler(1), steps=1)
+    _, batched_model, _ = run(make_handler(3), steps=1)
+    assert all(len(w) == 1 for w in serial_model.windows)
+    assert batched_model.windows == [[w[0] for w in serial_model.windows[:3]], serial_model.windows[3]]
+
+
+def test_windows_on_other_devices_are_not_batched():
+    handler = make_handler(3)
+    x = torch.zeros(1, 4, 13, 4, 4)
+    windows = list(enumerate(handler.get_context_windows(None, x, {})))[:3]
+    assert handler.evaluate_context_windows_batched(None, None, x, [], None, windows, {}, device=torch.device("cpu")) is None
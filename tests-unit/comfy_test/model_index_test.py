@@ -0,0 +1,57 @@
+import os
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_index
+import comfy.utils
+from comfy.model_index import ModelIndex
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = str(tmp_path / "model.safetensors")
+    sd = {
+        "text_model.encoder.layers.0.mlp.fc1.weight": torch.zeros(8, 4, dtype=torch.float16),
+        "text_model.final_layer_norm.bias": torch.zeros(4),
+    }
+    comfy.utils.save_torch_file(sd, path, metadata={"modelspec.title": "test"})
+    return path
+
+
+def test_index_reads_header(tmp_path, model_file):
+    index = ModelIndex(str(tmp_path / "index"))
+    entry = index.get(model_file)
+    assert entry["metadata"] == {"modelspec.title": "test"}
+    assert entry["tensors"]["text_model.encoder.layers.0.mlp.fc1.weight"] == ["F16", [8, 4]]
+
+
+def test_index_is_persisted(tmp_path, model_file, monkeypatch):
+    ModelIndex(str(tmp_path / "index")).get(model_file)
+    assert len(os.listdir(tmp_path / "index")) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("header read again")
+    monkeypatch.setattr(comfy.model_index, "read_safetensors_index", fail)
+    assert ModelIndex(str(tmp_path / "index")).get_metadata(model_file) == {"modelspec.title": "test"}
+
+
+def test_changed_file_is_reindexed(tmp_path, model_file):
+    index = ModelIndex(str(tmp_path / "index"))
+    index.get(model_file)
+    comfy.utils.save_torch_file({"a": torch.zeros(3)}, model_file)
+    stat = os.stat(model_file)
+    os.utime(model_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert list(index.get(model_file)["tensors"]) == ["a"]
+    assert ModelIndex(str(tmp_path / "index")).get_metadata(model_file) is None
+
+
+def test_non_safetensors_files_are_not_indexed(tmp_path):
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"not a safetensors file")
+    assert ModelIndex(None).get(str(path)) is None
+
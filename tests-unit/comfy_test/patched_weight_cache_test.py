@@ -0,0 +1,120 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.lora
+import comfy.model_patcher
+import comfy.patched_weights
+from comfy.patched_weights import PatchedWeightCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = PatchedWeightCache(1024 ** 2)
+    monkeypatch.setattr(comfy.patched_weights, "patched_weight_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def merges(monkeypatch):
+    calls = []
+    calculate_weight = comfy.lora.calculate_weight
+
+    def counting(patches, weight, key, *args, **kwargs):
+        calls.append(key)
+        return calculate_weight(patches, weight, key, *args, **kwargs)
+
+    monkeypatch.setattr(comfy.lora, "calculate_weight", counting)
+    return calls
+
+
+def make_patcher(model):
+    return comfy.model_patcher.ModelPatcher(model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+
+
+def patch_and_restore(patcher, key="weight"):
+    patcher.patch_weight_to_device(key, device_to=torch.device("cpu"))
+    out = patcher.model.weight.detach().clone()
+    patcher.unpatch_model(unpatch_weights=True)
+    return out
+
+
+def test_same_patches_hit_the_cache(cache, merges):
+    model = torch.nn.Linear(4, 4, bias=False)
+    base = model.weight.detach().clone()
+    diff = torch.ones(4, 4)
+    patcher = make_patcher(model)
+    patcher.add_patches({"weight": ("diff", (diff,))}, 0.5)
+
+    first = patch_and_restore(patcher)
+    assert torch.equal(model.weight, base)
+    second = patch_and_restore(patcher)
+    assert merges == ["weight"]
+    assert torch.equal(first, second)
+    assert torch.allclose(second, base + 0.5)
+
+
+def test_strength_change_misses(cache, merges):
+    model = torch.nn.Linear(4, 4, bias=False)
+    diff = torch.ones(4, 4)
+    patcher = make_patcher(model)
+    patcher.add_patches({"weight": ("diff", (diff,))}, 0.5)
+    patch_and_restore(patcher)
+
+    other = make_patcher(model)
+    other.add_patches({"weight": ("diff", (diff,))}, 0.25)
+    out = patch_and_restore(other)
+    assert merges == ["weight", "weight"]
+    assert torch.allclose(out, model.weight + 0.25)
+
+
+def test_patches_with_functions_are_not_cached(cache):
+    model = torch.nn.Linear(4, 4, bias=False)
+    assert cache.make_key(model, "weight", model.weight, [(1.0, torch.ones(4), 1.0, None, None)], True) is not None
+    assert cache.make_key(model, "weight", model.weight, [(1.0, torch.ones(4), 1.0, None, lambda w: w)], True) is None
+
+
+def test_size_is_bounded(cache):
+    model = torch.nn.Module()
+    weights = [torch.zeros(200 * 1024) for _ in range(3)] # 800KB each once patched
+    for i, w in enumerate(weights):
+        key = cache.make_key(model, "w{}".format(i), w, [(1.0, torch.ones(1), 1.0, None, None)], True)
+        cache.put(key, model, w + 1)
+    assert len(cache.entries) == 1
+    assert cache.size <= cache.max_size
+
+
+def test_entries_go_with_the_model(cache):
+    model = torch.nn.Linear(4, 4, bias=False)
+    key = cache.make_key(model, "weight", model.weight, [(1.0, torch.ones(4), 1.0, None, None)], True)
+    cache.put(key, model, model.weight + 1)
+    assert len(cache.entries) == 1
+    del model
+    assert len(cache.entries) == 0
+    assert cache.size == 0
+
+
+def test_patch_tensors_count_toward_the_size(cache):
+    model = torch.nn.Module()
+    lora = torch.zeros(64 * 1024) # 256KB, shared by both entries
+    for name in ["a", "b"]:
+        weight = torch.zeros(1024)
+        cache.put(cache.make_key(model, name, weight, [(1.0, lora, 1.0, None, None)], True), model, weight + 1)
+    assert cache.size == 2 * 4096 + lora.nbytes
+    cache.clear()
+    assert cache.size == 0
+    assert cache.ref_counts == {}
+
+
+def test_models_larger_than_the_cache_are_skipped(cache, merges):
+    model = torch.nn.Linear(1024, 1024, bias=False) # 4MB
+    patcher = make_patcher(model)
+    patcher.add_patches({"weight": ("diff", (torch.ones(1024, 1024),))}, 0.5)
+    assert patcher.patched_weights_size() == model.weight.nbytes
+    patch_and_restore(patcher)
+    patch_and_restore(patcher)
+    assert merges == ["weight", "weight"]
+    assert len(cache.entries) == 0
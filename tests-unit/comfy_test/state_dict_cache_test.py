@@ -0,0 +1,97 @@
+import gc
+import os
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.utils
+from comfy.utils import StateDictCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = StateDictCache(1024 ** 3)
+    monkeypatch.setattr(comfy.utils, "state_dict_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def lora_file(tmp_path):
+    path = str(tmp_path / "lora.safetensors")
+    comfy.utils.save_torch_file({"a": torch.ones(4), "b": torch.zeros(2, 2)}, path, metadata={"name": "test"})
+    return path
+
+
+def count_loads(monkeypatch):
+    calls = []
+    load = comfy.utils._load_torch_file
+    def counting(*args):
+        calls.append(args[0])
+        return load(*args)
+    monkeypatch.setattr(comfy.utils, "_load_torch_file", counting)
+    return calls
+
+
+def test_cached_loads_share_tensors(cache, lora_file, monkeypatch):
+    calls = count_loads(monkeypatch)
+    first = comfy.utils.load_torch_file(lora_file, safe_load=True, cache=True)
+    second, metadata = comfy.utils.load_torch_file(lora_file, safe_load=True, cache=True, return_metadata=True)
+    assert len(calls) == 1
+    assert metadata == {"name": "test"}
+    assert first is not second
+    assert first["a"] is second["a"]
+    # Callers own their dict
+    del first["a"]
+    assert "a" in second
+    assert cache.ram_usage() == 4 * 4 + 4 * 4
+
+
+def test_uncached_loads_read_the_file(cache, lora_file, monkeypatch):
+    calls = count_loads(monkeypatch)
+    comfy.utils.load_torch_file(lora_file, safe_load=True)
+    comfy.utils.load_torch_file(lora_file, safe_load=True)
+    assert len(calls) == 2
+    assert cache.ram_usage() == 0
+
+
+def test_changed_file_is_reloaded(cache, lora_file, monkeypatch):
+    calls = count_loads(monkeypatch)
+    sd = comfy.utils.load_torch_file(lora_file, cache=True)
+    del sd
+    gc.collect()
+    comfy.utils.save_torch_file({"a": torch.full((8,), 2.0)}, lora_file)
+    stat = os.stat(lora_file)
+    os.utime(lora_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    sd = comfy.utils.load_torch_file(lora_file, cache=True)
+    assert len(calls) == 2
+    assert sd["a"].shape == (8,)
+    # The old version was dropped
+    assert len(cache.entries) == 1
+
+
+def test_referenced_entries_are_not_trimmed(cache, lora_file):
+    sd = comfy.utils.load_torch_file(lora_file, cache=True)
+    assert cache.trim() == 0
+    assert len(cache.entries) == 1
+    del sd
+    gc.collect()
+    assert cache.trim() == 32
+    assert len(cache.entries) == 0
+
+
+def test_cache_stays_within_max_size(cache, tmp_path):
+    cache.max_size = 40
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / "lora{}.safetensors".format(i))
+        comfy.utils.save_torch_file({"w": torch.ones(4)}, path)
+        paths.append(path)
+    for path in paths:
+        comfy.utils.load_torch_file(path, cache=True)
+        gc.collect()
+    assert cache.ram_usage() <= 40
+    assert [k[0] for k in cache.entries] == [os.path.realpath(p) for p in paths[1:]]
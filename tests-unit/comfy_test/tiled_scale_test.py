@@ -0,0 +1,88 @@
+import types
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_management
+import comfy.sd
+import comfy.utils
+
+
+def upscale(x):
+    return torch.nn.functional.interpolate(x, scale_factor=2, mode="nearest")
+
+
+class CountingFunction:
+    def __init__(self, function):
+        self.function = function
+        self.calls = []
+
+    def __call__(self, x):
+        self.calls.append(x.shape[0])
+        return self.function(x)
+
+
+class Progress:
+    def __init__(self):
+        self.count = 0
+
+    def update(self, value):
+        self.count += value
+
+
+def test_tiles_blend_to_the_untiled_result():
+    x = torch.rand(2, 3, 100, 150)
+    out = comfy.utils.tiled_scale(x, upscale, 64, 64, 8, upscale_amount=2)
+    assert torch.allclose(out, upscale(x), atol=1e-6)
+
+
+def test_tile_batches_match_single_tiles():
+    x = torch.rand(3, 3, 100, 150)
+    conv = torch.nn.Conv2d(3, 3, 3, padding=1)
+    function = lambda a: conv(upscale(a))
+    single = comfy.utils.tiled_scale(x, function, 64, 64, 8, upscale_amount=2)
+    counting = CountingFunction(function)
+    pbar = Progress()
+    batched = comfy.utils.tiled_scale(x, counting, 64, 64, 8, upscale_amount=2, tile_batch_size=4, pbar=pbar)
+    assert torch.allclose(single, batched, atol=1e-5)
+    assert max(counting.calls) == 4
+    assert sum(counting.calls) == pbar.count == x.shape[0] * comfy.utils.get_tiled_scale_steps(150, 100, 64, 64, 8)
+
+
+def test_single_tile_inputs_are_batched():
+    x = torch.rand(5, 3, 32, 32)
+    counting = CountingFunction(upscale)
+    out = comfy.utils.tiled_scale(x, counting, 64, 64, 8, upscale_amount=2, tile_batch_size=2)
+    assert counting.calls == [2, 2, 1]
+    assert torch.equal(out, upscale(x))
+
+
+def test_multidim_tiles():
+    x = torch.rand(1, 2, 5, 40, 50)
+    out = comfy.utils.tiled_scale_multidim(x, lambda a: a * 2, tile=(3, 16, 16), overlap=(1, 4, 4), upscale_amount=1, out_channels=2, tile_batch_size=8)
+    assert torch.allclose(out, x * 2, atol=1e-6)
+
+
+def test_vae_tile_batches_are_halved_on_oom(monkeypatch):
+    calls = []
+
+    def decode(a):
+        calls.append(a.shape[0])
+        if a.shape[0] > 2:
+            raise comfy.model_management.OOM_EXCEPTION("out of memory")
+        return upscale(a)
+
+    monkeypatch.setattr(comfy.model_management, "get_free_memory", lambda device: 32 * 1024)
+    vae = types.SimpleNamespace(first_stage_model=types.SimpleNamespace(decode=decode), vae_dtype=torch.float32, device=torch.device("cpu"),
+                                output_device=torch.device("cpu"), upscale_ratio=2, process_output=lambda x: x,
+                                memory_used_decode=lambda shape, dtype: 1024)
+    vae.tile_batch_size = lambda memory_used: comfy.sd.VAE.tile_batch_size(vae, memory_used)
+    assert vae.tile_batch_size(1024) == 16
+    x = torch.rand(1, 3, 64, 64)
+    out = comfy.sd.VAE.decode_tiled_(vae, x, tile_x=16, tile_y=16, overlap=4)
+    assert torch.allclose(out, upscale(x), atol=1e-6)
+    assert calls[0] == 16
+    assert max(calls[-10:]) == 2
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.sd1_clip
+import comfy.utils
+from comfy.sd1_clip import EmbeddingCache, SDTokenizer
+
+
+@pytest.fixture
+def embedding_cache(monkeypatch):
+    cache = EmbeddingCache()
+    monkeypatch.setattr(comfy.sd1_clip, "embedding_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def file_loads(monkeypatch):
+    calls = []
+    load_embed_file = comfy.sd1_clip.load_embed_file
+
+    def counting(embed_path, *args, **kwargs):
+        calls.append(os.path.basename(embed_path))
+        return load_embed_file(embed_path, *args, **kwargs)
+
+    monkeypatch.setattr(comfy.sd1_clip, "load_embed_file", counting)
+    return calls
+
+
+def save_embed(path, value, size=768):
+    comfy.utils.save_torch_file({"emb_params": torch.full((1, size), value)}, path)
+
+
+def test_tokenize_is_cached():
+    tokenizer = SDTokenizer()
+    calls = []
+    hf_tokenizer = tokenizer.tokenizer
+    tokenizer.tokenizer = lambda word: calls.append(word) or hf_tokenizer(word)
+
+    first = tokenizer.tokenize_with_weights("a (red:1.2) cat")
+    count = len(calls)
+    assert count > 0
+    first[0].append("changed")
+
+    second = tokenizer.tokenize_with_weights("a (red:1.2) cat")
+    assert len(calls) == count
+    assert "changed" not in second[0]
+    assert len(second[0]) == tokenizer.max_length
+
+    # weighted segments are shared between prompts
+    tokenizer.tokenize_with_weights("a (red:1.2) dog")
+    assert calls[count:] == [" dog"]
+    assert tokenizer.tokenize_with_weights("a (red:1.2) cat", return_word_ids=True)[0][2][2] == 2
+
+
+def test_embeddings_are_cached(tmp_path, embedding_cache, file_loads):
+    save_embed(str(tmp_path / "style.safetensors"), 1.0)
+    first = comfy.sd1_clip.load_embed("style", str(tmp_path), 768)
+    second = comfy.sd1_clip.load_embed("style", str(tmp_path), 768)
+    assert file_loads == ["style.safetensors"]
+    assert torch.equal(first, second)
+    assert comfy.sd1_clip.load_embed("missing", str(tmp_path), 768) is None
+
+
+def test_embedding_changes_are_picked_up(tmp_path, embedding_cache, file_loads):
+    path = str(tmp_path / "style.safetensors")
+    save_embed(path, 1.0)
+    assert comfy.sd1_clip.load_embed("style", str(tmp_path), 768)[0, 0] == 1.0
+
+    save_embed(path, 2.0, size=1024)
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+    assert comfy.sd1_clip.load_embed("style", str(tmp_path), 1024)[0, 0] == 2.0
+
+    os.makedirs(str(tmp_path / "sub"))
+    save_embed(str(tmp_path / "sub" / "new.safetensors"), 3.0)
+    assert comfy.sd1_clip.load_embed("new", str(tmp_path), 768)[0, 0] == 3.0
@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from comfy_execution.caching import (
+    CacheEntry,
+    DiskCache,
+    NotPersistable,
+    Unhashable,
+    stable_signature_digest,
+    to_hashable,
+)
+
+
+def make_key(seed):
+    return to_hashable([["KSampler", False, ("seed", seed), ("model", ("ANCESTOR", 0, 0))]])
+
+
+class TestStableSignatureDigest:
+    def test_same_signature_same_digest(self):
+        assert stable_signature_digest(make_key(1)) == stable_signature_digest(make_key(1))
+
+    def test_different_signature_different_digest(self):
+        assert stable_signature_digest(make_key(1)) != stable_signature_digest(make_key(2))
+
+    def test_bool_and_int_differ(self):
+        assert stable_signature_digest(to_hashable([True])) != stable_signature_digest(to_hashable([1]))
+
+    def test_nan_is_not_persistable(self):
+        with pytest.raises(NotPersistable):
+            stable_signature_digest(to_hashable(["LoadImage", float("NaN")]))
+
+    def test_unhashable_is_not_persistable(self):
+        with pytest.raises(NotPersistable):
+            stable_signature_digest(frozenset([(0, Unhashable())]))
+
+
+class TestDiskCache:
+    def test_roundtrip_latent_and_conditioning(self, tmp_path):
+        cache = DiskCache(str(tmp_path), 1024**3)
+        samples = torch.randn(1, 4, 8, 8)
+        cond = [[torch.randn(1, 77, 16), {"pooled_output": torch.randn(1, 16), "strength": 0.5}]]
+        entry = CacheEntry(ui=None, outputs=[[{"samples": samples}], [cond]])
+        cache.store(make_key(1), entry)
+        cache.flush()
+
+        # A fresh instance simulates a new process sharing the directory
+        loaded = DiskCache(str(tmp_path), 1024**3).load(make_key(1))
+        assert loaded is not None
+        assert torch.equal(loaded.outputs[0][0]["samples"], samples)
+        loaded_cond = loaded.outputs[1][0]
+        assert torch.equal(loaded_cond[0][0], cond[0][0])
+        assert torch.equal(loaded_cond[0][1]["pooled_output"], cond[0][1]["pooled_output"])
+        assert loaded_cond[0][1]["strength"] == 0.5
+
+    def test_miss_returns_none(self, tmp_path):
+        cache = DiskCache(str(tmp_path), 1024**3)
+        assert cache.load(make_key(1)) is None
+
+    def test_unserializable_outputs_are_skipped(self, tmp_path):
+        cache = DiskCache(str(tmp_path), 1024**3)
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[object()]]))
+        cache.store(make_key(2), CacheEntry(ui=None, outputs=[["only text"]]))
+        cache.store(make_key(3), CacheEntry(ui={"images": []}, outputs=[[torch.zeros(2)]]))
+        cache.flush()
+        assert os.listdir(tmp_path) == []
+
+    def test_shared_tensor_is_stored(self, tmp_path):
+        cache = DiskCache(str(tmp_path), 1024**3)
+        base = torch.randn(4, 4)
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[base], [base[:2]]]))
+        cache.flush()
+        loaded = cache.load(make_key(1))
+        assert torch.equal(loaded.outputs[0][0], base)
+        assert torch.equal(loaded.outputs[1][0], base[:2])
+
+    def test_eviction_keeps_directory_bounded(self, tmp_path):
+        tensor = torch.zeros(1024)
+        cache = DiskCache(str(tmp_path), 1024**3)
+        cache.store(make_key(0), CacheEntry(ui=None, outputs=[[tensor]]))
+        cache.flush()
+        entry_size = cache.total_size
+
+        cache = DiskCache(str(tmp_path), entry_size * 2)
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[tensor]]))
+        cache.flush()
+        assert cache.load(make_key(0)) is not None
+        cache.store(make_key(2), CacheEntry(ui=None, outputs=[[tensor]]))
+        cache.flush()
+
+        assert cache.total_size <= entry_size * 2
+        assert len(os.listdir(tmp_path)) == 2
+        # key 1 was the least recently used entry
+        assert cache.load(make_key(1)) is None
+        assert cache.load(make_key(0)) is not None
+        assert cache.load(make_key(2)) is not None
+
+    def test_entries_too_large_for_the_cache_are_not_written(self, tmp_path):
+        cache = DiskCache(str(tmp_path), 4096)
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[torch.zeros(1024)]]))
+        cache.flush()
+        assert os.listdir(tmp_path) == []
+        assert cache.total_size == 0
+
+    def test_store_does_not_wait_for_the_write(self, tmp_path, monkeypatch):
+        import comfy.utils
+        started = []
+        save_torch_file = comfy.utils.save_torch_file
+
+        def slow_save(*args, **kwargs):
+            started.append(True)
+            time.sleep(0.2)
+            return save_torch_file(*args, **kwargs)
+
+        monkeypatch.setattr(comfy.utils, "save_torch_file", slow_save)
+        cache = DiskCache(str(tmp_path), 1024**3)
+        start = time.perf_counter()
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[torch.zeros(4)]]))
+        # queued once even if stored again before the write lands
+        cache.store(make_key(1), CacheEntry(ui=None, outputs=[[torch.zeros(4)]]))
+        assert time.perf_counter() - start < 0.2
+        cache.flush()
+        assert len(started) == 1
+        assert cache.load(make_key(1)) is not None
+
+    def test_stale_temporary_files_are_removed(self, tmp_path):
+        stale = tmp_path / "stale.safetensors.1.tmp"
+        recent = tmp_path / "recent.safetensors.2.tmp"
+        stale.write_bytes(b"x")
+        recent.write_bytes(b"x")
+        old = time.time() - 2 * 3600
+        os.utime(stale, (old, old))
+        DiskCache(str(tmp_path), 1024**3)
+        assert sorted(os.listdir(tmp_path)) == ["recent.safetensors.2.tmp"]
@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+from unittest.mock import MagicMock
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from execution import PromptExecutor
+
+current_prompt = contextvars.ContextVar("current_prompt", default=None)
+
+
+@pytest.fixture
+def executor():
+    e = PromptExecutor(MagicMock())
+    yield e
+    if e.loop is not None:
+        e.loop.close()
+
+
+def run_prompts(executor, bodies):
+    for number, body in enumerate(bodies):
+        async def execute_async(prompt, prompt_id, extra_data={}, execute_outputs=[], body=body):
+            await body()
+        executor.execute_async = execute_async
+        executor.execute({}, "prompt-{}".format(number))
+
+
+def test_prompts_share_one_loop(executor):
+    loops = []
+
+    async def body():
+        loops.append(asyncio.get_running_loop())
+
+    run_prompts(executor, [body, body])
+    assert loops[0] is loops[1]
+    assert loops[0] is executor.loop
+    assert not executor.loop.is_closed()
+
+
+def test_loop_is_not_left_as_current_loop(executor):
+    async def body():
+        pass
+
+    run_prompts(executor, [body])
+    with pytest.raises(RuntimeError):
+        asyncio.get_event_loop()
+
+
+def test_leftover_tasks_are_cancelled_before_next_prompt(executor):
+    events = []
+
+    async def leftover():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def first():
+        asyncio.create_task(leftover())
+        await asyncio.sleep(0)
+
+    async def second():
+        events.append("second")
+        assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task()] == []
+
+    run_prompts(executor, [first, second])
+    assert events == ["cancelled", "second"]
+
+
+def test_context_set_in_a_prompt_does_not_leak(executor):
+    seen = []
+
+    async def first():
+        current_prompt.set("first")
+        seen.append(current_prompt.get())
+
+    async def second():
+        seen.append(current_prompt.get())
+
+    run_prompts(executor, [first, second])
+    assert seen == ["first", None]
+
+
+def test_failed_prompt_still_cleans_up(executor):
+    events = []
+
+    async def leftover():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def failing():
+        asyncio.create_task(leftover())
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        run_prompts(executor, [failing])
+    assert events == ["cancelled"]
+    with pytest.raises(RuntimeError):
+        asyncio.get_event_loop()
+
+    async def body():
+        events.append("next")
+
+    run_prompts(executor, [body])
+    assert events == ["cancelled", "next"]
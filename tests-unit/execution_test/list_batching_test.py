@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+from comfy_execution.list_batching import split, split_outputs, stack, stack_list_inputs
+
+
+class Invert:
+    BATCH_LIST_INPUTS = ("image",)
+    FUNCTION = "invert"
+
+    def __init__(self):
+        self.calls = 0
+
+    def invert(self, image, scale):
+        self.calls += 1
+        return (1.0 - image * scale,)
+
+
+def run(obj, input_data_all):
+    return asyncio.run(execution._async_map_node_over_list("prompt", "1", obj, input_data_all, obj.FUNCTION))
+
+
+def test_stack_and_split_tensors():
+    values = [torch.zeros(1, 4, 4, 3), torch.ones(2, 4, 4, 3)]
+    stacked = stack(values, [1, 2])
+    assert stacked.shape[0] == 3
+    parts = split(stacked, [1, 2])
+    assert [p.shape[0] for p in parts] == [1, 2]
+    assert torch.equal(parts[1], values[1])
+
+
+def test_split_keeps_rows_per_element():
+    # e.g. a video latent decoding to several frames per batch item
+    parts = split(torch.arange(6), [1, 2])
+    assert [p.tolist() for p in parts] == [[0, 1], [2, 3, 4, 5]]
+    assert split(torch.arange(4), [1, 2]) is None
+
+
+def test_stack_and_split_latents():
+    values = [{"samples": torch.zeros(1, 4, 8, 8)}, {"samples": torch.ones(1, 4, 8, 8)}]
+    stacked = stack(values, [1, 1])
+    assert stacked["samples"].shape[0] == 2
+    parts = split(stacked, [1, 1])
+    assert torch.equal(parts[1]["samples"], values[1]["samples"])
+    # latents with other keys are not stacked
+    assert stack([{"samples": torch.zeros(1, 4, 8, 8), "noise_mask": torch.ones(1)}] * 2, [1, 1]) is None
+
+
+def test_stack_and_split_conditioning():
+    values = [[[torch.zeros(1, 77, 8), {"pooled_output": torch.zeros(1, 8), "strength": 1.0}]],
+              [[torch.ones(1, 77, 8), {"pooled_output": torch.ones(1, 8), "strength": 1.0}]]]
+    stacked = stack(values, [1, 1])
+    assert stacked[0][0].shape[0] == 2
+    assert stacked[0][1]["pooled_output"].shape[0] == 2
+    parts = split(stacked, [1, 1])
+    assert torch.equal(parts[1][0][0], values[1][0][0])
+    assert torch.equal(parts[1][0][1]["pooled_output"], values[1][0][1]["pooled_output"])
+    assert parts[1][0][1]["strength"] == 1.0
+    # different options can't share one batch
+    values[1][0][1]["strength"] = 0.5
+    assert stack(values, [1, 1]) is None
+
+
+def test_stack_list_inputs_requires_same_other_inputs():
+    images = [torch.zeros(1, 2, 2, 3), torch.ones(1, 2, 2, 3)]
+    inputs, sizes = stack_list_inputs({"image": images, "scale": [1.0]}, ("image",), 2)
+    assert sizes == [1, 1]
+    assert inputs["scale"] == 1.0
+    assert stack_list_inputs({"image": images, "scale": [1.0, 0.5]}, ("image",), 2) is None
+
+
+def test_split_outputs_repeats_unbatched_values():
+    assert split_outputs((torch.zeros(3), "text"), [1, 2])[1][1] == "text"
+    assert split_outputs(None, [1, 2]) is None
+
+
+def test_list_inputs_run_as_one_batch():
+    obj = Invert()
+    images = [torch.zeros(1, 2, 2, 3), torch.full((2, 2, 2, 3), 0.5)]
+    results = run(obj, {"image": images, "scale": [1.0]})
+    assert obj.calls == 1
+    assert len(results) == 2
+    assert torch.equal(results[0][0], torch.ones(1, 2, 2, 3))
+    assert torch.equal(results[1][0], torch.full((2, 2, 2, 3), 0.5))
+
+
+def test_falls_back_to_per_element_calls():
+    obj = Invert()
+    images = [torch.zeros(1, 2, 2, 3), torch.zeros(1, 2, 2, 3)]
+    results = run(obj, {"image": images, "scale": [1.0, 0.5]})
+    assert obj.calls == 2
+    assert torch.equal(results[1][0], torch.ones(1, 2, 2, 3))
+
+
+class Summarize(Invert):
+    def invert(self, image, scale):
+        self.calls += 1
+        return (image.sum(dim=0, keepdim=True),)
+
+
+class InvertToList(Invert):
+    OUTPUT_IS_LIST = (True,)
+
+
+def test_unsplittable_output_is_an_error():
+    obj = Summarize()
+    images = [torch.zeros(1, 2, 2, 3), torch.zeros(2, 2, 2, 3)]
+    with pytest.raises(RuntimeError, match="could not be split"):
+        run(obj, {"image": images, "scale": [1.0]})
+    # not run again per element
+    assert obj.calls == 1
+
+
+def test_list_outputs_are_not_batched():
+    obj = InvertToList()
+    images = [torch.zeros(1, 2, 2, 3), torch.zeros(1, 2, 2, 3)]
+    run(obj, {"image": images, "scale": [1.0]})
+    assert obj.calls == 2
@@ -0,0 +1,145 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_management as mm
+from comfy.model_patcher import ModelPatcher
+from comfy_execution.model_prefetch import ModelPrefetcher, get_models, get_node_models
+
+
+def make_patcher():
+    return ModelPatcher(torch.nn.Linear(2, 2), torch.device("cpu"), torch.device("cpu"))
+
+
+class FakeLoadedModel:
+    def __init__(self, model, unloaded):
+        self.model = model
+        self.device = torch.device("cpu")
+        self.currently_used = True
+        self.unloaded = unloaded
+
+    def is_dead(self):
+        return False
+
+    def model_offloaded_memory(self):
+        return 0
+
+    def model_memory(self):
+        return 1
+
+    def model_unload(self, memory_to_free=None):
+        self.unloaded.append(self.model)
+        return True
+
+
+def make_execution_list(models):
+    # Loader "1" outputs a MODEL and a VAE-like object, "2" and "3" are pending and use one each
+    vae = SimpleNamespace(patcher=models[1])
+    entry = SimpleNamespace(outputs=[[models[0]], [vae]])
+    prompt = {
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": 0}},
+        "3": {"class_type": "VAEDecode", "inputs": {"vae": ["1", 1], "samples": ["2", 0]}},
+    }
+    return SimpleNamespace(
+        dynprompt=SimpleNamespace(get_node=lambda node_id: prompt[node_id]),
+        execution_cache={"2": {"1": entry}, "3": {"1": entry, "2": None}},
+        pendingNodes={"2": True, "3": True},
+        get_ready_nodes=lambda: ["2"],
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_hints():
+    yield
+    mm.set_models_needed_later([])
+
+
+def test_get_models():
+    patcher = make_patcher()
+    assert get_models(patcher) == [patcher]
+    assert get_models(SimpleNamespace(patcher=patcher)) == [patcher]
+    assert get_models(torch.zeros(1)) == []
+
+
+def test_plan_collects_models_of_pending_nodes():
+    models = [make_patcher(), make_patcher()]
+    execution_list = make_execution_list(models)
+    assert get_node_models(execution_list, "3") == [models[1]]
+    current, later = ModelPrefetcher().plan(execution_list, "2")
+    assert current == [models[0]]
+    assert later == [models[1]]
+
+
+def test_hints_follow_the_running_node():
+    models = [make_patcher(), make_patcher()]
+    prefetcher = ModelPrefetcher()
+    prefetcher.before_node(make_execution_list(models), "2")
+    assert mm.is_model_needed_later(models[1])
+    assert mm.is_model_needed_later(models[1].clone())
+    assert not mm.is_model_needed_later(models[0])
+    prefetcher.finish()
+    assert not mm.is_model_needed_later(models[1])
+
+
+def test_free_memory_unloads_models_needed_later_last(monkeypatch):
+    models = [make_patcher(), make_patcher()]
+    unloaded = []
+    monkeypatch.setattr(mm, "current_loaded_models", [FakeLoadedModel(m, unloaded) for m in models])
+    monkeypatch.setattr(mm, "DISABLE_SMART_MEMORY", False)
+    monkeypatch.setattr(mm, "get_free_memory", lambda dev=None, torch_free_too=False: (10, 10) if torch_free_too else 10 * len(unloaded))
+    mm.set_models_needed_later([models[1]])
+    mm.free_memory(5, torch.device("cpu"))
+    assert unloaded == [models[0]]
+
+    unloaded.clear()
+    monkeypatch.setattr(mm, "current_loaded_models", [FakeLoadedModel(m, unloaded) for m in models])
+    mm.set_models_needed_later([models[0]])
+    mm.free_memory(5, torch.device("cpu"))
+    assert unloaded == [models[1]]
+
+
+def test_prefetch_skips_cpu_models():
+    assert mm.prefetch_models([make_patcher()]) == 0
+
+
+def test_wait_cancels_prefetch_of_unfinished_node():
+    models = [make_patcher(), make_patcher()]
+    prefetcher = ModelPrefetcher(enabled=True)
+    # models[0] is never loaded, so the prefetch is still waiting for the node when it's done
+    prefetcher.before_node(make_execution_list(models), "2")
+    assert prefetcher.future is not None
+    prefetcher.wait()
+    assert prefetcher.future is None
+    assert not mm.is_model_loaded(models[1])
+
+
+def test_prefetch_moves_weights_without_the_load_lock(monkeypatch):
+    model = make_patcher()
+    monkeypatch.setattr(mm, "current_loaded_models", [])
+    monkeypatch.setattr(mm, "is_device_cpu", lambda device: False)
+    monkeypatch.setattr(mm, "vram_state", mm.VRAMState.NORMAL_VRAM)
+    monkeypatch.setattr(mm, "get_total_memory", lambda device=None, torch_total_too=False: 100 * 1024**3)
+    monkeypatch.setattr(mm, "get_free_memory", lambda device=None, torch_free_too=False: 100 * 1024**3)
+    during_load = []
+
+    def model_load(self, lowvram_model_memory=0, force_patch_weights=False):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(mm.model_load_lock.acquire(timeout=5) and mm.model_load_lock.release() is None))
+        thread.start()
+        thread.join()
+        during_load.append((result, list(mm.prefetching_models), list(mm.current_loaded_models)))
+
+    monkeypatch.setattr(mm.LoadedModel, "model_load", model_load)
+    assert mm.prefetch_models([model]) == 1
+    lock_taken, prefetching, loaded = during_load[0]
+    assert lock_taken == [True]
+    assert [m.model for m in prefetching] == [model]
+    assert loaded == []
+    assert [m.model for m in mm.current_loaded_models] == [model]
+    assert mm.prefetching_models == []
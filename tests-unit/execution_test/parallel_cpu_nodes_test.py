@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+from comfy_execution.utils import get_executing_context
+
+
+class ThreadSafeNode:
+    FUNCTION = "run"
+    THREAD_SAFE = True
+
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+
+    def run(self, value):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        context = get_executing_context()
+        return (value, threading.current_thread().name, torch.is_inference_mode_enabled(), context.node_id)
+
+
+class PlainNode(ThreadSafeNode):
+    THREAD_SAFE = False
+
+
+@pytest.fixture
+def parallel_pool(monkeypatch):
+    monkeypatch.setattr(args, "parallel_cpu_nodes", 2)
+    yield
+    if execution._cpu_node_pool is not None:
+        execution._cpu_node_pool.shutdown()
+        execution._cpu_node_pool = None
+
+
+def run_node(obj, unique_id="1", **inputs):
+    return execution._async_map_node_over_list("prompt", unique_id, obj, {k: [v] for k, v in inputs.items()}, obj.FUNCTION, allow_threading=True)
+
+
+def test_disabled_by_default():
+    async def main():
+        results = await run_node(ThreadSafeNode(), value=1)
+        return await execution.resolve_map_node_over_list_results(results)
+    [(value, thread_name, _, _)] = asyncio.run(main())
+    assert value == 1
+    assert thread_name == threading.current_thread().name
+
+
+def test_thread_safe_node_runs_on_pool(parallel_pool):
+    async def main():
+        with torch.inference_mode():
+            results = await run_node(ThreadSafeNode(), unique_id="7", value=3)
+        assert isinstance(results[0], asyncio.Task)
+        return await execution.resolve_map_node_over_list_results(results)
+    [(value, thread_name, inference_mode, node_id)] = asyncio.run(main())
+    assert value == 3
+    assert thread_name.startswith("comfy_cpu_node")
+    assert inference_mode
+    assert node_id == "7"
+
+
+def test_other_nodes_stay_on_executor_thread(parallel_pool):
+    async def main():
+        results = await run_node(PlainNode(), value=1)
+        assert not isinstance(results[0], asyncio.Task)
+        return results
+    [(_, thread_name, _, _)] = asyncio.run(main())
+    assert thread_name == threading.current_thread().name
+
+
+def test_independent_nodes_overlap(parallel_pool):
+    # Both nodes block on the barrier, so this only completes if they run concurrently
+    barrier = threading.Barrier(2)
+    async def main():
+        first = await run_node(ThreadSafeNode(barrier), unique_id="1", value=1)
+        second = await run_node(ThreadSafeNode(barrier), unique_id="2", value=2)
+        return await execution.resolve_map_node_over_list_results(first + second)
+    results = asyncio.run(main())
+    assert [r[0] for r in results] == [1, 2]
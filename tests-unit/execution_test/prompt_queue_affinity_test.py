@@ -0,0 +1,120 @@
+import contextvars
+from unittest.mock import MagicMock
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_management as mm
+import execution
+from execution import PromptQueue, get_prompt_model_files
+
+
+def make_prompt(ckpt_name, seed=0):
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt_name}},
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": seed, "sampler_name": "euler"}},
+    }
+
+
+def make_queue(*ckpt_names):
+    q = PromptQueue(MagicMock())
+    for number, ckpt_name in enumerate(ckpt_names):
+        q.put((number, "prompt-{}".format(number), make_prompt(ckpt_name), {}, ["2"], {}))
+    return q
+
+
+def test_get_prompt_model_files():
+    prompt = make_prompt("sdxl.safetensors")
+    prompt["3"] = {"class_type": "LoraLoader", "inputs": {"lora_name": "style.SAFETENSORS", "strength_model": 1.0}}
+    prompt["4"] = {"class_type": "CLIPTextEncode", "inputs": {"text": "a photo"}}
+    assert get_prompt_model_files(prompt) == {"sdxl.safetensors", "style.SAFETENSORS"}
+
+
+def test_get_without_affinity_is_fifo():
+    q = make_queue("a.safetensors", "b.safetensors")
+    item, _ = q.get(timeout=0)
+    assert item[1] == "prompt-0"
+
+
+def test_affinity_prefers_resident_models():
+    q = make_queue("a.safetensors", "b.safetensors", "a.safetensors")
+    item, _ = q.get(timeout=0, affinity={"b.safetensors"})
+    assert item[1] == "prompt-1"
+    # The remaining prompts keep their order
+    assert [q.get(timeout=0)[0][1] for _ in range(2)] == ["prompt-0", "prompt-2"]
+
+
+def test_affinity_falls_back_to_queue_head():
+    q = make_queue("a.safetensors", "b.safetensors")
+    item, _ = q.get(timeout=0, affinity={"c.safetensors"})
+    assert item[1] == "prompt-0"
+
+
+def test_affinity_only_looks_at_front_of_queue():
+    names = ["a.safetensors"] * execution.PROMPT_AFFINITY_WINDOW + ["b.safetensors"]
+    q = make_queue(*names)
+    item, _ = q.get(timeout=0, affinity={"b.safetensors"})
+    assert item[1] == "prompt-0"
+
+
+def test_running_items_are_tracked_per_worker():
+    q = make_queue("a.safetensors", "b.safetensors")
+    first = q.get(timeout=0, affinity={"b.safetensors"})
+    second = q.get(timeout=0, affinity={"a.safetensors"})
+    running, queued = q.get_current_queue()
+    assert sorted(x[1] for x in running) == ["prompt-0", "prompt-1"]
+    assert queued == []
+    q.task_done(first[1], {}, None)
+    q.task_done(second[1], {}, None)
+    assert q.get_tasks_remaining() == 0
+
+
+def test_flags_reach_every_worker():
+    q = make_queue()
+    q.register_worker(0)
+    q.register_worker(1)
+    q.set_flag("unload_models", True)
+    assert q.get_flags(worker=0) == {"unload_models": True}
+    assert q.get_flags(worker=0) == {}
+    assert q.get_flags(worker=1) == {"unload_models": True}
+
+
+def test_interrupts_are_scoped_to_their_prompt():
+    def start(prompt_id):
+        ctx = contextvars.copy_context()
+        ctx.run(mm.set_interrupt_prompt, prompt_id)
+        return ctx
+
+    first, second = start("prompt-0"), start("prompt-1")
+    try:
+        mm.interrupt_current_processing(prompt_id="prompt-0")
+        assert first.run(mm.processing_interrupted)
+        assert not second.run(mm.processing_interrupted)
+        # a worker clearing its own flag doesn't clear the other one
+        second.run(mm.interrupt_current_processing, False)
+        with pytest.raises(mm.InterruptProcessingException):
+            first.run(mm.throw_exception_if_processing_interrupted)
+        # without a prompt id, every running prompt is interrupted
+        mm.interrupt_current_processing()
+        assert first.run(mm.processing_interrupted) and second.run(mm.processing_interrupted)
+    finally:
+        first.run(mm.set_interrupt_prompt, None)
+        second.run(mm.set_interrupt_prompt, None)
+        mm.interrupt_current_processing(False)
+
+
+def test_idle_interrupt_is_cleared_when_a_prompt_starts():
+    mm.interrupt_current_processing()
+    assert mm.processing_interrupted()
+    ctx = contextvars.copy_context()
+    ctx.run(mm.set_interrupt_prompt, "prompt-0")
+    try:
+        assert not mm.processing_interrupted()
+        assert not ctx.run(mm.processing_interrupted)
+        mm.throw_exception_if_processing_interrupted()
+    finally:
+        ctx.run(mm.set_interrupt_prompt, None)
@@ -0,0 +1,144 @@
+from unittest.mock import MagicMock
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+from execution import PromptQueue
+
+
+def make_item(number):
+    return (number, "prompt-{}".format(number), {}, {}, [], {})
+
+
+def make_queue(count):
+    q = PromptQueue(MagicMock())
+    for number in range(count):
+        q.put(make_item(number))
+    return q
+
+
+def run_all(q):
+    while q.get_tasks_remaining() > 0:
+        _, task_id = q.get(timeout=0)
+        q.task_done(task_id, {}, None)
+
+
+class TestQueue:
+    def test_delete_by_id_skips_item(self):
+        q = make_queue(4)
+        assert q.delete_queue_item_by_id("prompt-1")
+        assert not q.delete_queue_item_by_id("prompt-1")
+        assert q.get_tasks_remaining() == 3
+        assert [q.get(timeout=0)[0][1] for _ in range(3)] == ["prompt-0", "prompt-2", "prompt-3"]
+        assert q.get(timeout=0) is None
+
+    def test_delete_with_predicate(self):
+        q = make_queue(3)
+        assert q.delete_queue_item(lambda x: x[0] == 2)
+        assert not q.delete_queue_item(lambda x: x[0] == 2)
+        _, queued = q.get_current_queue()
+        assert [x[1] for x in queued] == ["prompt-0", "prompt-1"]
+
+    def test_heap_is_compacted(self):
+        q = make_queue(100)
+        for number in range(90):
+            q.delete_queue_item_by_id("prompt-{}".format(number))
+        assert len(q.queue) < 100
+        assert q.get_tasks_remaining() == 10
+        assert q.get(timeout=0)[0][1] == "prompt-90"
+
+    def test_snapshot_is_reused_until_change(self):
+        q = make_queue(3)
+        _, first = q.get_current_queue()
+        _, second = q.get_current_queue_volatile()
+        assert first == second
+        assert q._queue_snapshot is not None
+        q.put(make_item(3))
+        assert q._queue_snapshot is None
+        _, queued = q.get_current_queue()
+        assert len(queued) == 4
+
+    def test_queue_lists_share_snapshot_items(self):
+        q = make_queue(2)
+        _, queued = q.get_current_queue()
+        _, shared = q.get_current_queue_volatile()
+        assert queued[0] is q._get_queue_snapshot()[0]
+        assert shared[0] is queued[0]
+        queued.pop()
+        assert len(q.get_current_queue()[1]) == 2
+
+
+class TestHistory:
+    def test_paging(self):
+        q = make_queue(10)
+        run_all(q)
+        assert list(q.get_history(max_items=3, offset=2)) == ["prompt-2", "prompt-3", "prompt-4"]
+        # A negative offset pages from the end
+        assert list(q.get_history(max_items=2)) == ["prompt-8", "prompt-9"]
+        assert list(q.get_history(offset=8)) == ["prompt-8", "prompt-9"]
+        assert len(q.get_history()) == 10
+
+    def test_paging_after_delete(self):
+        q = make_queue(6)
+        run_all(q)
+        q.delete_history_item("prompt-1")
+        q.delete_history_item("prompt-3")
+        assert list(q.get_history(max_items=2, offset=1)) == ["prompt-2", "prompt-4"]
+        assert "prompt-1" not in q.get_history()
+
+    def test_paging_skips_deleted_slots_without_compacting(self):
+        q = make_queue(10)
+        run_all(q)
+        for number in (1, 6, 8):
+            q.delete_history_item("prompt-{}".format(number))
+        order = q.history_order
+        assert list(q.get_history(max_items=3, offset=1)) == ["prompt-2", "prompt-3", "prompt-4"]
+        assert list(q.get_history(max_items=3)) == ["prompt-5", "prompt-7", "prompt-9"]
+        assert list(q.get_history(offset=5)) == ["prompt-7", "prompt-9"]
+        assert list(q.get_history(max_items=20, offset=0)) == ["prompt-0", "prompt-2", "prompt-3", "prompt-4", "prompt-5", "prompt-7", "prompt-9"]
+        assert q.history_order is order
+        assert q.history_deleted == 3
+
+        # Compacted once half of the slots are dead
+        for number in (0, 2, 3):
+            q.delete_history_item("prompt-{}".format(number))
+        assert q.history_deleted == 0
+        assert q.history_order == ["prompt-4", "prompt-5", "prompt-7", "prompt-9"]
+
+    def test_history_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(execution, "MAXIMUM_HISTORY_SIZE", 5)
+        q = make_queue(20)
+        q.delete_queue_item_by_id("prompt-17")
+        run_all(q)
+        q.delete_history_item("prompt-18")
+        assert list(q.get_history()) == ["prompt-14", "prompt-15", "prompt-16", "prompt-19"]
+        q.put(make_item(20))
+        run_all(q)
+        assert list(q.get_history(max_items=10, offset=0)) == ["prompt-14", "prompt-15", "prompt-16", "prompt-19", "prompt-20"]
+
+    def test_prompt_id_lookup_is_a_copy(self):
+        q = make_queue(1)
+        run_all(q)
+        item = q.get_history(prompt_id="prompt-0")["prompt-0"]
+        item["outputs"]["1"] = "changed"
+        assert q.get_history(prompt_id="prompt-0")["prompt-0"]["outputs"] == {}
+
+    def test_full_history_is_a_copy(self):
+        q = make_queue(2)
+        run_all(q)
+        history = q.get_history()
+        del history["prompt-0"]
+        assert list(q.get_history()) == ["prompt-0", "prompt-1"]
+
+    def test_wipe(self):
+        q = make_queue(3)
+        run_all(q)
+        q.wipe_history()
+        assert q.get_history() == {}
+        q.put(make_item(3))
+        run_all(q)
+        assert list(q.get_history(max_items=1, offset=0)) == ["prompt-3"]
@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from comfy_execution import caching
+from comfy_execution.caching import CacheEntry, RAMPressureCache, scan_ram_usage
+
+
+def make_cache():
+    cache = RAMPressureCache(None)
+    cache.cache_key_set = SimpleNamespace(get_data_key=lambda node_id: node_id)
+    cache.initialized = True
+    return cache
+
+
+def entry(*outputs):
+    return CacheEntry(ui=None, outputs=[[o] for o in outputs])
+
+
+class FakeModel:
+    def __init__(self, inner, size):
+        self.model = inner
+        self.size = size
+
+    def get_ram_usage(self):
+        return self.size
+
+
+class TestScanRamUsage:
+    def test_views_share_storage(self):
+        base = torch.zeros(256, dtype=torch.float32)
+        resources = scan_ram_usage([[base], [base[:10]], [{"samples": base[10:]}]])
+        assert len(resources) == 1
+        assert list(resources.values())[0][0] == 1024
+
+    def test_conditioning_and_latents_are_walked(self):
+        cond = [[torch.zeros(4), {"pooled_output": torch.zeros(8)}]]
+        latent = {"samples": torch.zeros(16)}
+        resources = scan_ram_usage([[cond], [latent]])
+        assert sorted(nbytes for nbytes, _ in resources.values()) == [16, 32, 64]
+
+    def test_model_clones_counted_once(self):
+        inner = object()
+        resources = scan_ram_usage([[FakeModel(inner, 100)], [FakeModel(inner, 100)]])
+        assert len(resources) == 1
+
+
+class TestRAMPressureCache:
+    def test_shared_tensor_freed_only_with_last_reference(self):
+        cache = make_cache()
+        shared = torch.zeros(1024, dtype=torch.uint8)
+        cache.set("a", entry(shared))
+        cache.set("b", entry(shared[:10]))
+        assert len(cache.resources) == 1
+        assert cache._release("a") == 0
+        assert cache._release("b") == 1024
+        assert cache.resources == {}
+
+    def test_resetting_same_value_does_not_double_count(self):
+        cache = make_cache()
+        value = entry(torch.zeros(1024, dtype=torch.uint8))
+        cache.set("a", value)
+        cache.set("a", value)
+        assert list(cache.resources.values()) == [[1024, 1]]
+
+    def test_eviction_order_prefers_large_and_old(self):
+        cache = make_cache()
+        cache.generation = 1
+        cache.set("small", entry(torch.zeros(10, dtype=torch.uint8)))
+        cache.set("large", entry(torch.zeros(10**6, dtype=torch.uint8)))
+        cache.generation = 40
+        cache.set("new_small", entry(torch.zeros(10, dtype=torch.uint8)))
+        assert cache._pop_eviction_candidate() == "large"
+        assert cache._pop_eviction_candidate() == "small"
+        assert cache._pop_eviction_candidate() == "new_small"
+        assert cache._pop_eviction_candidate() is None
+
+    def test_touch_in_new_generation_reprioritizes(self):
+        cache = make_cache()
+        cache.generation = 1
+        cache.set("a", entry(torch.zeros(100, dtype=torch.uint8)))
+        cache.set("b", entry(torch.zeros(100, dtype=torch.uint8)))
+        cache.generation = 10
+        cache.get("a")
+        assert cache._pop_eviction_candidate() == "b"
+        assert cache._pop_eviction_candidate() == "a"
+        assert cache._pop_eviction_candidate() is None
+
+    def test_touch_refreshes_timestamp_tie_break(self):
+        cache = make_cache()
+        clock = iter(range(100))
+        with patch.object(caching.time, "time", lambda: next(clock)):
+            cache.set("a", entry(torch.zeros(100, dtype=torch.uint8)))
+            cache.set("b", entry(torch.zeros(100, dtype=torch.uint8)))
+            cache.get("a")
+        assert cache._pop_eviction_candidate() == "a"
+        assert cache._pop_eviction_candidate() == "b"
+        assert cache._pop_eviction_candidate() is None
+
+    def test_poll_evicts_until_headroom(self):
+        cache = make_cache()
+        for i in range(4):
+            cache.set(str(i), entry(torch.zeros(1024, dtype=torch.uint8)))
+
+        available = [1.0]
+        def virtual_memory():
+            return SimpleNamespace(available=available[0] * (1024**3))
+        def release(key):
+            available[0] += 1.0
+            return 1024**3
+        with patch.object(caching.psutil, "virtual_memory", virtual_memory), patch.object(cache, "_release", side_effect=release):
+            cache.poll(ram_headroom=2.5)
+        assert len(cache.cache) == 2
+        assert available[0] == 3.0
+
+    def test_poll_noop_with_headroom(self):
+        cache = make_cache()
+        cache.set("a", entry(torch.zeros(16)))
+        with patch.object(caching.psutil, "virtual_memory", return_value=SimpleNamespace(available=64 * (1024**3))):
+            cache.poll(ram_headroom=4.0)
+        assert "a" in cache.cache
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+import nodes
+
+
+class CountingLoader:
+    FILES = ["a.safetensors"]
+    calls = 0
+    RETURN_TYPES = ("MODEL",)
+    FUNCTION = "load"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        cls.calls += 1
+        return {"required": {"name": (list(cls.FILES),), "seed": ("INT", {"min": 0, "max": 10})}}
+
+
+class CountingOutput:
+    OUTPUT_NODE = True
+    RETURN_TYPES = ()
+    FUNCTION = "run"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"model": ("MODEL",)}}
+
+
+@pytest.fixture(autouse=True)
+def test_nodes(monkeypatch):
+    CountingLoader.FILES = ["a.safetensors"]
+    CountingLoader.calls = 0
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "CountingLoader", CountingLoader)
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "CountingOutput", CountingOutput)
+    monkeypatch.setattr(execution, "_validation_schemas", {})
+
+
+def validate(name="a.safetensors", seed=1):
+    prompt = {
+        "1": {"class_type": "CountingLoader", "inputs": {"name": name, "seed": seed}},
+        "2": {"class_type": "CountingOutput", "inputs": {"model": ["1", 0]}},
+    }
+    return asyncio.run(execution.validate_prompt("p", prompt, None))
+
+
+def test_schema_reused_across_prompts():
+    assert validate(seed=1)[0]
+    assert validate(seed=2)[0]
+    assert CountingLoader.calls == 1
+
+
+def test_cached_schema_still_checks_values():
+    assert validate()[0]
+    valid, _, _, node_errors = validate(seed=11)
+    assert not valid
+    assert node_errors["1"]["errors"][0]["type"] == "value_bigger_than_max"
+
+
+def test_new_combo_value_refreshes_schema():
+    assert validate()[0]
+    CountingLoader.FILES = ["a.safetensors", "b.safetensors"]
+    assert validate(name="b.safetensors")[0]
+    assert CountingLoader.calls == 2
+
+
+def test_missing_combo_value_is_an_error():
+    assert validate()[0]
+    valid, _, _, node_errors = validate(name="c.safetensors")
+    assert not valid
+    assert node_errors["1"]["errors"][0]["type"] == "value_not_in_list"
+
+
+def test_schema_expires(monkeypatch):
+    assert validate()[0]
+    monkeypatch.setattr(execution, "VALIDATION_SCHEMA_TTL", 0)
+    CountingLoader.FILES = []
+    assert not validate()[0]
+
+
+class CheckedLoader:
+    RETURN_TYPES = ("MODEL",)
+    FUNCTION = "load"
+    checks = []
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"path": ("STRING", {}), "seed": ("INT", {"min": 0, "max": 10})}}
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, path):
+        cls.checks.append(path)
+        return path.endswith(".safetensors") or "bad path"
+
+
+def validate_checked(monkeypatch, path, seed=1):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "CheckedLoader", CheckedLoader)
+    prompt = {
+        "1": {"class_type": "CheckedLoader", "inputs": {"path": path, "seed": seed}},
+        "2": {"class_type": "CountingOutput", "inputs": {"model": ["1", 0]}},
+    }
+    return asyncio.run(execution.validate_prompt("p", prompt, None))
+
+
+def test_passing_custom_validation_is_cached(monkeypatch):
+    CheckedLoader.checks = []
+    assert validate_checked(monkeypatch, "a.safetensors", seed=1)[0]
+    assert validate_checked(monkeypatch, "a.safetensors", seed=2)[0]
+    assert validate_checked(monkeypatch, "b.safetensors")[0]
+    assert CheckedLoader.checks == ["a.safetensors", "b.safetensors"]
+
+
+def test_failing_custom_validation_runs_every_time(monkeypatch):
+    CheckedLoader.checks = []
+    for _ in range(2):
+        valid, _, _, node_errors = validate_checked(monkeypatch, "a.txt")
+        assert not valid
+        assert node_errors["1"]["errors"][0]["type"] == "custom_validation_failed"
+    assert CheckedLoader.checks == ["a.txt", "a.txt"]
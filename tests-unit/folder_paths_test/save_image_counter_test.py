@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths
+import nodes
+from comfy_execution.utils import CurrentNodeContext
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "save_image_counters", {})
+    return str(tmp_path)
+
+
+@pytest.fixture
+def listdir_calls(monkeypatch):
+    calls = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: calls.append(path) or listdir(path))
+    return calls
+
+
+def test_reserved_counters_list_the_folder_once(output_dir, listdir_calls):
+    os.makedirs(os.path.join(output_dir, "sub"))
+    for name in ["img_00007_.png", "img_00003_.png", "other_00020_.png"]:
+        open(os.path.join(output_dir, "sub", name), "w").close()
+
+    counters = [folder_paths.get_save_image_path("sub/img", output_dir, count=count)[2] for count in (2, 1, 3)]
+    assert counters == [8, 10, 11]
+    assert folder_paths.get_save_image_path("sub/other", output_dir, count=1)[2] == 21
+    assert len(listdir_calls) == 2
+    # without count the folder is always listed, and the reserved counters are skipped
+    assert folder_paths.get_save_image_path("sub/img", output_dir)[2] == 14
+    assert len(listdir_calls) == 3
+    assert folder_paths.get_save_image_path("sub/img", output_dir, count=1)[2] == 15
+
+
+def test_forgotten_counters_are_scanned_again(output_dir, listdir_calls):
+    full_output_folder, filename, counter, _, _ = folder_paths.get_save_image_path("img", output_dir, count=1)
+    assert counter == 1
+    open(os.path.join(full_output_folder, "img_00005_.png"), "w").close()
+    folder_paths.forget_save_image_counter(full_output_folder, filename)
+    assert folder_paths.get_save_image_path("img", output_dir, count=1)[2] == 6
+
+
+def make_node(output_dir):
+    node = nodes.SaveImage()
+    node.output_dir = output_dir
+    return node
+
+
+@pytest.mark.parametrize("async_save", [False, True])
+def test_save_images(output_dir, monkeypatch, async_save):
+    monkeypatch.setattr(args, "async_image_save", async_save)
+    images = torch.rand(3, 8, 8, 3)
+    node = make_node(output_dir)
+    out = node.save_images(images, "img", prompt={"1": {"class_type": "SaveImage"}})["ui"]["images"]
+    out += node.save_images(images[:1], "img")["ui"]["images"]
+    nodes.wait_for_image_saves()
+    assert [r["filename"] for r in out] == ["img_00001_.png", "img_00002_.png", "img_00003_.png", "img_00004_.png"]
+    for i, r in enumerate(out[:3]):
+        with Image.open(os.path.join(output_dir, r["filename"])) as img:
+            assert img.size == (8, 8)
+            assert img.text["prompt"] == '{"1": {"class_type": "SaveImage"}}'
+            assert np.array_equal(np.array(img), np.clip(255. * images[i].numpy(), 0, 255).astype(np.uint8))
+
+
+def test_save_images_skips_files_written_by_others(output_dir):
+    node = make_node(output_dir)
+    node.save_images(torch.rand(1, 8, 8, 3), "img")
+    # written without reserving a counter
+    open(os.path.join(output_dir, "img_00002_.png"), "w").close()
+    out = node.save_images(torch.rand(2, 8, 8, 3), "img")["ui"]["images"]
+    assert [r["filename"] for r in out] == ["img_00003_.png", "img_00004_.png"]
+
+
+def test_async_saves_are_tracked_per_prompt(output_dir, monkeypatch):
+    monkeypatch.setattr(args, "async_image_save", True)
+    save_png = nodes.save_png
+
+    def failing_save_png(image, path, *args):
+        if "broken" in path:
+            raise OSError("disk full")
+        save_png(image, path, *args)
+
+    monkeypatch.setattr(nodes, "save_png", failing_save_png)
+    node = make_node(output_dir)
+    with CurrentNodeContext("prompt-1", "9"):
+        node.save_images(torch.rand(1, 8, 8, 3), "img")
+    with CurrentNodeContext("prompt-2", "3"):
+        node.save_images(torch.rand(1, 8, 8, 3), "broken")
+    assert nodes.wait_for_image_saves("prompt-1") is None
+    node_id, path, e = nodes.wait_for_image_saves("prompt-2")
+    assert node_id == "3"
+    assert path.endswith("broken_00001_.png")
+    assert str(e) == "disk full"
+    # already waited for
+    assert nodes.wait_for_image_saves("prompt-2") is None
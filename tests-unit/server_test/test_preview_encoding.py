@@ -0,0 +1,111 @@
+"""Tests for sampler preview encoding and the /view preview cache"""
+
+import asyncio
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+import torch
+from PIL import Image
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+# Import the top level utils package before nodes puts comfy/ at the front of sys.path
+import utils.install_util  # noqa: F401
+import server
+from server import PromptServer, encode_preview_image, render_view_preview
+
+
+@pytest.fixture
+def preview_args(monkeypatch):
+    monkeypatch.setattr(args, "preview_format", "jpeg")
+    monkeypatch.setattr(args, "preview_downscale_only", False)
+    return args
+
+
+def decode(data):
+    return Image.open(BytesIO(data))
+
+
+def test_default_is_jpeg_scaled_to_max_size(preview_args):
+    image_type, data = encode_preview_image(("JPEG", Image.new("RGB", (64, 32)), 128))
+    assert image_type == "JPEG"
+    assert decode(data).format == "JPEG"
+    assert decode(data).size == (128, 64)
+
+
+def test_downscale_only(preview_args):
+    preview_args.preview_downscale_only = True
+    _, data = encode_preview_image(("JPEG", Image.new("RGB", (64, 32)), 128))
+    assert decode(data).size == (64, 32)
+    _, data = encode_preview_image(("JPEG", Image.new("RGB", (512, 256)), 128))
+    assert decode(data).size == (128, 64)
+
+
+def test_webp_needs_client_support(preview_args):
+    preview_args.preview_format = "webp"
+    image = Image.new("RGB", (64, 64))
+    assert encode_preview_image(("JPEG", image, None))[0] == "JPEG"
+    image_type, data = encode_preview_image(("JPEG", image, None), allow_webp=True)
+    assert image_type == "WEBP"
+    assert decode(data).format == "WEBP"
+
+
+def test_png_previews_keep_format(preview_args):
+    preview_args.preview_format = "jpeg-low"
+    assert encode_preview_image(("PNG", Image.new("RGB", (8, 8)), None))[0] == "PNG"
+
+
+def test_view_preview_is_cached_by_mtime(tmp_path):
+    file = str(tmp_path / "image.png")
+    Image.new("RGB", (16, 16), "red").save(file)
+    mtime = os.stat(file).st_mtime_ns
+    render_view_preview.cache_clear()
+    first = render_view_preview(file, mtime, "webp", 90, "")
+    assert render_view_preview(file, mtime, "webp", 90, "") is first
+    assert render_view_preview.cache_info().hits == 1
+
+    Image.new("RGB", (16, 16), "blue").save(file)
+    os.utime(file, ns=(mtime + 10**9, mtime + 10**9))
+    updated = render_view_preview(file, os.stat(file).st_mtime_ns, "webp", 90, "")
+    assert decode(updated).convert("RGB").getpixel((0, 0))[2] > 200
+
+
+def test_previews_finishing_out_of_order_are_dropped(preview_args, monkeypatch):
+    first_started = threading.Event()
+    release_first = threading.Event()
+
+    def slow_first_encode(image_data, allow_webp=False):
+        if image_data[1].size == (1, 1):
+            first_started.set()
+            release_first.wait()
+        return "JPEG", bytes([image_data[1].size[0]])
+
+    monkeypatch.setattr(server, "encode_preview_image", slow_first_encode)
+    instance = PromptServer.__new__(PromptServer)
+    instance.preview_executor = ThreadPoolExecutor(max_workers=2)
+    instance.preview_sequence = itertools.count()
+    instance.preview_sent = {}
+    sent = []
+
+    async def send_bytes(event, data, sid=None):
+        sent.append((sid, data[-1]))
+    instance.send_bytes = send_bytes
+
+    async def run():
+        old = asyncio.create_task(instance.send_image(("JPEG", Image.new("RGB", (1, 1)), None), sid="a"))
+        await asyncio.get_running_loop().run_in_executor(None, first_started.wait)
+        other_client = asyncio.create_task(instance.send_image(("JPEG", Image.new("RGB", (3, 3)), None), sid="b"))
+        await instance.send_image(("JPEG", Image.new("RGB", (2, 2)), None), sid="a")
+        release_first.set()
+        await old
+        await other_client
+
+    asyncio.run(run())
+    instance.preview_executor.shutdown()
+    assert sorted(sent) == [("a", 2), ("b", 3)]
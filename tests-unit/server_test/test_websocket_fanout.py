@@ -0,0 +1,157 @@
+"""Tests for coalescing and buffering of websocket messages"""
+
+import asyncio
+import threading
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+# Import the top level utils package before nodes puts comfy/ at the front of sys.path
+import utils.install_util  # noqa: F401
+from protocol import BinaryEventTypes
+import server
+from server import PromptServer, WebSocketWriter, coalesce_ws_messages
+
+
+class FakeWebSocket:
+    def __init__(self, block=False):
+        self.sent = []
+        self.closed = False
+        self.unblocked = asyncio.Event()
+        if not block:
+            self.unblocked.set()
+
+    async def send_str(self, message):
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.unblocked.wait()
+        self.sent.append(bytes(message))
+
+    async def close(self):
+        self.closed = True
+
+
+def progress(value, node="1", sid="a"):
+    return ("progress", {"value": value, "max": 10, "prompt_id": "p", "node": node}, sid)
+
+
+def test_coalesce_keeps_latest_update_in_order():
+    messages = [
+        progress(1),
+        ("status", {"status": {"exec_info": {"queue_remaining": 2}}}, None),
+        progress(1, node="2"),
+        ("executing", {"node": "2"}, "a"),
+        progress(2),
+        ("status", {"status": {"exec_info": {"queue_remaining": 1}}}, None),
+        (BinaryEventTypes.TEXT, b"text", "a"),
+    ]
+    assert coalesce_ws_messages(messages) == [messages[2], messages[3], messages[4], messages[5], messages[6]]
+
+
+def test_coalesce_is_per_client():
+    messages = [progress(1, sid="a"), progress(1, sid="b"), progress(2, sid="a")]
+    assert coalesce_ws_messages(messages) == [messages[1], messages[2]]
+
+
+@pytest.mark.asyncio
+async def test_writer_sends_in_order():
+    ws = FakeWebSocket()
+    writer = WebSocketWriter(ws)
+    writer.put("one")
+    writer.put(b"two")
+    writer.put("three", droppable=True)
+    await asyncio.sleep(0.01)
+    assert ws.sent == ["one", b"two", "three"]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_oldest_droppable():
+    ws = FakeWebSocket(block=True)
+    writer = WebSocketWriter(ws, max_size=3)
+    await asyncio.sleep(0)
+    writer.put("executing")
+    await asyncio.sleep(0)
+    writer.put("progress 1", droppable=True)
+    writer.put("progress 2", droppable=True)
+    writer.put("executed")
+    writer.put("progress 3", droppable=True)
+    ws.unblocked.set()
+    await asyncio.sleep(0.01)
+    # The first message was already being sent when the buffer filled up
+    assert ws.sent == ["executing", "progress 2", "executed", "progress 3"]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_is_disconnected():
+    ws = FakeWebSocket(block=True)
+    writer = WebSocketWriter(ws, max_size=2)
+    await asyncio.sleep(0)
+    for i in range(4):
+        writer.put("executed {}".format(i))
+    await asyncio.sleep(0)
+    assert ws.closed
+    assert writer.closed
+
+
+class FakePromptQueue:
+    def __init__(self):
+        self.calls = 0
+
+    def get_tasks_remaining(self):
+        self.calls += 1
+        return 3
+
+
+def make_server():
+    instance = PromptServer.__new__(PromptServer)
+    instance.loop = asyncio.get_running_loop()
+    instance.messages = asyncio.Queue()
+    instance.queue_status_pending = False
+    instance.prompt_queue = FakePromptQueue()
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_queue_status_is_computed_once_per_window():
+    instance = make_server()
+    workers = [threading.Thread(target=lambda: [instance.queue_updated() for _ in range(50)]) for _ in range(2)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert instance.prompt_queue.calls == 0
+    await asyncio.sleep(server.WS_COALESCE_WINDOW * 3)
+    assert instance.prompt_queue.calls == 1
+    assert instance.messages.get_nowait() == ("status", {"status": {"exec_info": {"queue_remaining": 3}}}, None)
+    assert instance.messages.empty()
+
+    # a change after the status was computed sends another one
+    instance.queue_updated()
+    await asyncio.sleep(server.WS_COALESCE_WINDOW * 3)
+    assert instance.prompt_queue.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_lone_progress_update_is_not_delayed(monkeypatch):
+    monkeypatch.setattr(server, "WS_COALESCE_WINDOW", 10)
+    instance = make_server()
+    sent = []
+
+    async def send(*msg):
+        sent.append(msg)
+    instance.send = send
+    task = asyncio.create_task(instance.publish_loop())
+    try:
+        instance.messages.put_nowait(progress(1))
+        await asyncio.sleep(0.05)
+        assert sent == [progress(1)]
+    finally:
+        task.cancel()
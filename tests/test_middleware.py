@@ -1,5 +1,5 @@
 import unittest
-from middleware.workflow_patcher import patch_workflow
+from middleware.workflow_patcher import compile_workflow, patch_workflow, patch_workflow_batch
 
 class TestWorkflowPatcher(unittest.TestCase):
     def test_patch_existing_node(self):
@@ -54,5 +54,47 @@ class TestWorkflowPatcher(unittest.TestCase):
         self.assertEqual(result["3"]["inputs"]["seed"], 100)
         self.assertNotIn("99", result)
 
+
+class TestWorkflowTemplate(unittest.TestCase):
+    def make_workflow(self):
+        return {
+            "3": {"class_type": "KSampler", "inputs": {"seed": 100, "model": ["4", 0]}},
+            "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "a.safetensors"}},
+            "5": {"class_type": "LoadImage", "inputs": {"image": "x" * 1000}, "_meta": {"title": "Image"}},
+        }
+
+    def test_matches_patch_workflow(self):
+        workflow = self.make_workflow()
+        params = {"3": {"seed": 200, "denoise": 0.5}, "99": {"seed": 1}}
+        self.assertEqual(compile_workflow(workflow).patch(params), patch_workflow(workflow, params))
+        self.assertEqual(patch_workflow(compile_workflow(workflow), params), patch_workflow(workflow, params))
+
+    def test_prompts_share_untouched_values(self):
+        template = compile_workflow(self.make_workflow())
+        first = template.patch({"3": {"seed": 1}})
+        second = template.patch({"3": {"seed": 2}})
+        self.assertIs(first["5"]["inputs"]["image"], second["5"]["inputs"]["image"])
+        self.assertIs(first["5"]["_meta"], second["5"]["_meta"])
+        self.assertEqual(first["3"]["inputs"]["seed"], 1)
+        self.assertEqual(second["3"]["inputs"]["seed"], 2)
+
+    def test_template_is_isolated(self):
+        workflow = self.make_workflow()
+        template = compile_workflow(workflow)
+        workflow["3"]["inputs"]["seed"] = 5
+        prompt = template.patch({})
+        # Validation normalizes inputs in place, that must not reach the template
+        prompt["4"]["inputs"]["ckpt_name"] = "b.safetensors"
+        self.assertEqual(template.patch({})["3"]["inputs"]["seed"], 100)
+        self.assertEqual(template.patch({})["4"]["inputs"]["ckpt_name"], "a.safetensors")
+
+    def test_batch(self):
+        workflow = self.make_workflow()
+        param_sets = [{"3": {"seed": seed}} for seed in range(3)]
+        prompts = patch_workflow_batch(workflow, param_sets)
+        self.assertEqual([p["3"]["inputs"]["seed"] for p in prompts], [0, 1, 2])
+        self.assertEqual(prompts, [patch_workflow(workflow, p) for p in param_sets])
+
+
 if __name__ == '__main__':
     unittest.main()